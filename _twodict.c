@@ -0,0 +1,992 @@
+/*
+ * C accelerator for the twodict module.
+ *
+ * Implements TwoWayOrderedDictBase, a drop-in replacement for the pure
+ * Python _PyTwoWayOrderedDictBase class of twodict.py. The storage layout is
+ * exactly the same: the key:value AND value:key pairs live in the dict
+ * storage, the insertion order is kept in a cyclic doubly linked list of
+ * [prev, key, next] Python lists (_items) and the nodes are mapped to their
+ * keys in a plain dict (_items_map). So the rest of twodict.py (views,
+ * popitem, subclasses) works on top of both implementations unchanged.
+ *
+ * Subclasses may override the _remove_mapped_key, _append_key & _iterate
+ * hooks, in that case the C code calls the Python methods instead of the
+ * native implementations (_iterate_values & _iterate_items then read the
+ * keys from the overridden _iterate).
+ */
+
+#define PY_SSIZE_T_CLEAN
+#include <Python.h>
+#include <structmember.h>
+
+/* Indexes of the linked list nodes [prev, key, next] */
+#define PREV 0
+#define KEY 1
+#define NEXT 2
+
+typedef struct {
+    PyDictObject dict;
+    PyObject *items;        /* Root node of the cyclic doubly linked list */
+    PyObject *items_map;    /* Map keys into linked list nodes */
+} TwoDictObject;
+
+/* What the iterators return */
+#define ITER_KEYS 0
+#define ITER_VALUES 1
+#define ITER_ITEMS 2
+
+typedef struct {
+    PyObject_HEAD
+    PyObject *root;         /* NULL once the iterator is exhausted */
+    PyObject *node;         /* Last node returned */
+    PyObject *source;       /* Keys iterator of an overridden _iterate */
+    PyObject *mapping;      /* Dict storage to read the values from */
+    PyObject *result;       /* Last (key, value) tuple, reused if possible */
+    int index;              /* PREV or NEXT */
+    int kind;               /* ITER_KEYS, ITER_VALUES or ITER_ITEMS */
+} TwoDictIterObject;
+
+static PyTypeObject TwoDict_Type;
+static PyTypeObject TwoDictIter_Type;
+
+static PyObject *str_remove_mapped_key;
+static PyObject *str_append_key;
+static PyObject *str_iterate;
+static PyObject *str_reverse;
+
+/* Method descriptors of TwoDict_Type, used to detect overridden hooks */
+static PyObject *default_remove_mapped_key;
+static PyObject *default_append_key;
+static PyObject *default_iterate;
+
+
+/********** Helpers **********/
+
+static int
+check_state(TwoDictObject *self)
+{
+    if (self->items == NULL || self->items_map == NULL) {
+        PyErr_SetString(PyExc_AttributeError,
+                        "linked list is not initialized, call clear() first");
+        return -1;
+    }
+
+    if (!PyDict_Check(self->items_map)) {
+        PyErr_SetString(PyExc_TypeError, "_items_map must be a dict");
+        return -1;
+    }
+
+    return 0;
+}
+
+/* Return a borrowed reference to node[index] */
+static PyObject *
+get_link(PyObject *node, Py_ssize_t index)
+{
+    if (!PyList_Check(node) || PyList_GET_SIZE(node) != 3) {
+        PyErr_SetString(PyExc_TypeError, "corrupted linked list node");
+        return NULL;
+    }
+
+    return PyList_GET_ITEM(node, index);
+}
+
+/* Set node[index] = value without stealing the reference of value */
+static int
+set_link(PyObject *node, Py_ssize_t index, PyObject *value)
+{
+    if (get_link(node, index) == NULL) {
+        return -1;
+    }
+
+    Py_INCREF(value);
+    return PyList_SetItem(node, index, value);
+}
+
+/* Return 1 if the type of self does not override the given hook */
+static int
+is_default(PyObject *self, PyObject *name, PyObject *descr)
+{
+    PyObject *attr;
+    int result;
+
+    if (Py_TYPE(self) == &TwoDict_Type) {
+        return 1;
+    }
+
+    attr = PyObject_GetAttr((PyObject *)Py_TYPE(self), name);
+
+    if (attr == NULL) {
+        return -1;
+    }
+
+    result = attr == descr;
+    Py_DECREF(attr);
+
+    return result;
+}
+
+/* Same as "a != b" in Python (no identity shortcut) */
+static int
+not_equal(PyObject *a, PyObject *b)
+{
+    PyObject *result = PyObject_RichCompare(a, b, Py_NE);
+    int truth;
+
+    if (result == NULL) {
+        return -1;
+    }
+
+    truth = PyObject_IsTrue(result);
+    Py_DECREF(result);
+
+    return truth;
+}
+
+static void
+set_key_error(PyObject *key)
+{
+    PyObject *tup = PyTuple_Pack(1, key);
+
+    if (tup != NULL) {
+        PyErr_SetObject(PyExc_KeyError, tup);
+        Py_DECREF(tup);
+    }
+}
+
+
+/********** Linked list operations **********/
+
+static int
+remove_mapped_key(TwoDictObject *self, PyObject *key)
+{
+    PyObject *node, *prev, *next;
+    int result = -1;
+
+    node = PyDict_GetItemWithError(self->items_map, key);
+
+    if (node == NULL) {
+        return PyErr_Occurred() ? -1 : 0;
+    }
+
+    Py_INCREF(node);
+
+    if (PyDict_DelItem(self->items_map, key) < 0) {
+        goto done;
+    }
+
+    if ((prev = get_link(node, PREV)) == NULL || (next = get_link(node, NEXT)) == NULL) {
+        goto done;
+    }
+
+    /* The removed node keeps its links, same as the pure Python version */
+    if (set_link(prev, NEXT, next) < 0 || set_link(next, PREV, prev) < 0) {
+        goto done;
+    }
+
+    result = 0;
+
+done:
+    Py_DECREF(node);
+    return result;
+}
+
+static int
+append_key(TwoDictObject *self, PyObject *key)
+{
+    PyObject *root = self->items, *last, *node;
+
+    if ((last = get_link(root, PREV)) == NULL) {
+        return -1;
+    }
+
+    if ((node = PyList_New(3)) == NULL) {
+        return -1;
+    }
+
+    Py_INCREF(last);
+    PyList_SET_ITEM(node, PREV, last);
+    Py_INCREF(key);
+    PyList_SET_ITEM(node, KEY, key);
+    Py_INCREF(root);
+    PyList_SET_ITEM(node, NEXT, root);
+
+    if (PyDict_SetItem(self->items_map, key, node) < 0 ||
+            set_link(last, NEXT, node) < 0 ||
+            set_link(root, PREV, node) < 0) {
+        Py_DECREF(node);
+        return -1;
+    }
+
+    Py_DECREF(node);
+    return 0;
+}
+
+static int
+call_remove_mapped_key(TwoDictObject *self, PyObject *key)
+{
+    PyObject *result;
+    int native = is_default((PyObject *)self, str_remove_mapped_key, default_remove_mapped_key);
+
+    if (native < 0) {
+        return -1;
+    }
+
+    if (native) {
+        return remove_mapped_key(self, key);
+    }
+
+    result = PyObject_CallMethodObjArgs((PyObject *)self, str_remove_mapped_key, key, NULL);
+
+    if (result == NULL) {
+        return -1;
+    }
+
+    Py_DECREF(result);
+    return 0;
+}
+
+static int
+call_append_key(TwoDictObject *self, PyObject *key)
+{
+    PyObject *result;
+    int native = is_default((PyObject *)self, str_append_key, default_append_key);
+
+    if (native < 0) {
+        return -1;
+    }
+
+    if (native) {
+        return append_key(self, key);
+    }
+
+    result = PyObject_CallMethodObjArgs((PyObject *)self, str_append_key, key, NULL);
+
+    if (result == NULL) {
+        return -1;
+    }
+
+    Py_DECREF(result);
+    return 0;
+}
+
+
+/********** Iterator **********/
+
+static PyObject *
+iter_alloc(TwoDictObject *self, int kind)
+{
+    TwoDictIterObject *it = PyObject_GC_New(TwoDictIterObject, &TwoDictIter_Type);
+
+    if (it == NULL) {
+        return NULL;
+    }
+
+    it->root = NULL;
+    it->node = NULL;
+    it->source = NULL;
+    it->result = NULL;
+    it->index = NEXT;
+    it->kind = kind;
+
+    if (kind == ITER_KEYS) {
+        it->mapping = NULL;
+    }
+    else {
+        Py_INCREF(self);
+        it->mapping = (PyObject *)self;
+    }
+
+    return (PyObject *)it;
+}
+
+/* Iterator that walks the native linked list */
+static PyObject *
+iter_new(TwoDictObject *self, int reverse, int kind)
+{
+    TwoDictIterObject *it;
+
+    if (check_state(self) < 0) {
+        return NULL;
+    }
+
+    if ((it = (TwoDictIterObject *)iter_alloc(self, kind)) == NULL) {
+        return NULL;
+    }
+
+    Py_INCREF(self->items);
+    it->root = self->items;
+    Py_INCREF(self->items);
+    it->node = self->items;
+    it->index = reverse ? PREV : NEXT;
+
+    PyObject_GC_Track(it);
+    return (PyObject *)it;
+}
+
+static PyObject *
+call_iterate(TwoDictObject *self, int reverse)
+{
+    PyObject *method, *args, *kwargs, *result;
+    int native = is_default((PyObject *)self, str_iterate, default_iterate);
+
+    if (native < 0) {
+        return NULL;
+    }
+
+    if (native) {
+        return iter_new(self, reverse, ITER_KEYS);
+    }
+
+    if (!reverse) {
+        return PyObject_CallMethodObjArgs((PyObject *)self, str_iterate, NULL);
+    }
+
+    if ((method = PyObject_GetAttr((PyObject *)self, str_iterate)) == NULL) {
+        return NULL;
+    }
+
+    args = PyTuple_New(0);
+    kwargs = PyDict_New();
+    result = NULL;
+
+    if (args != NULL && kwargs != NULL && PyDict_SetItem(kwargs, str_reverse, Py_True) == 0) {
+        result = PyObject_Call(method, args, kwargs);
+    }
+
+    Py_XDECREF(args);
+    Py_XDECREF(kwargs);
+    Py_DECREF(method);
+
+    return result;
+}
+
+/* Values or items iterator, on top of the keys of an overridden _iterate */
+static PyObject *
+iter_view_new(TwoDictObject *self, int reverse, int kind)
+{
+    TwoDictIterObject *it;
+    PyObject *keys, *source;
+    int native = is_default((PyObject *)self, str_iterate, default_iterate);
+
+    if (native < 0) {
+        return NULL;
+    }
+
+    if (native) {
+        return iter_new(self, reverse, kind);
+    }
+
+    if ((keys = call_iterate(self, reverse)) == NULL) {
+        return NULL;
+    }
+
+    source = PyObject_GetIter(keys);
+    Py_DECREF(keys);
+
+    if (source == NULL) {
+        return NULL;
+    }
+
+    if ((it = (TwoDictIterObject *)iter_alloc(self, kind)) == NULL) {
+        Py_DECREF(source);
+        return NULL;
+    }
+
+    it->source = source;
+
+    PyObject_GC_Track(it);
+    return (PyObject *)it;
+}
+
+static void
+iter_dealloc(TwoDictIterObject *it)
+{
+    PyObject_GC_UnTrack(it);
+    Py_XDECREF(it->root);
+    Py_XDECREF(it->node);
+    Py_XDECREF(it->source);
+    Py_XDECREF(it->mapping);
+    Py_XDECREF(it->result);
+    PyObject_GC_Del(it);
+}
+
+static int
+iter_traverse(TwoDictIterObject *it, visitproc visit, void *arg)
+{
+    Py_VISIT(it->root);
+    Py_VISIT(it->node);
+    Py_VISIT(it->source);
+    Py_VISIT(it->mapping);
+    Py_VISIT(it->result);
+    return 0;
+}
+
+/* Return a new reference to the next key */
+static PyObject *
+iter_next_key(TwoDictIterObject *it)
+{
+    PyObject *next, *key;
+
+    if (it->source != NULL) {
+        if ((key = PyIter_Next(it->source)) == NULL) {
+            Py_CLEAR(it->source);
+        }
+
+        return key;
+    }
+
+    if (it->root == NULL) {
+        return NULL;
+    }
+
+    if ((next = get_link(it->node, it->index)) == NULL) {
+        return NULL;
+    }
+
+    if (next == it->root) {
+        /* Exhausted iterators never restart, same as generators */
+        Py_CLEAR(it->root);
+        Py_CLEAR(it->node);
+        return NULL;
+    }
+
+    if ((key = get_link(next, KEY)) == NULL) {
+        return NULL;
+    }
+
+    Py_INCREF(next);
+    Py_SETREF(it->node, next);
+
+    Py_INCREF(key);
+    return key;
+}
+
+static PyObject *
+iter_next(TwoDictIterObject *it)
+{
+    PyObject *key, *value, *result;
+
+    if ((key = iter_next_key(it)) == NULL || it->kind == ITER_KEYS) {
+        return key;
+    }
+
+    /* Read the storage directly, no __getitem__ dispatch */
+    if ((value = PyDict_GetItemWithError(it->mapping, key)) == NULL) {
+        if (!PyErr_Occurred()) {
+            PyErr_SetObject(PyExc_KeyError, key);
+        }
+
+        Py_DECREF(key);
+        return NULL;
+    }
+
+    Py_INCREF(value);
+
+    if (it->kind == ITER_VALUES) {
+        Py_DECREF(key);
+        return value;
+    }
+
+    result = it->result;
+
+#if PY_VERSION_HEX >= 0x03090000
+    /* Nobody else holds the previous tuple, reuse it like dict.items() does */
+    if (result != NULL && Py_REFCNT(result) == 1) {
+        PyObject *old_key = PyTuple_GET_ITEM(result, 0);
+        PyObject *old_value = PyTuple_GET_ITEM(result, 1);
+
+        PyTuple_SET_ITEM(result, 0, key);
+        PyTuple_SET_ITEM(result, 1, value);
+        Py_INCREF(result);
+        Py_DECREF(old_key);
+        Py_DECREF(old_value);
+
+        /* The collector might have untracked the tuple */
+        if (!PyObject_GC_IsTracked(result)) {
+            PyObject_GC_Track(result);
+        }
+
+        return result;
+    }
+#endif
+
+    if ((result = PyTuple_New(2)) == NULL) {
+        Py_DECREF(key);
+        Py_DECREF(value);
+        return NULL;
+    }
+
+    PyTuple_SET_ITEM(result, 0, key);
+    PyTuple_SET_ITEM(result, 1, value);
+
+    Py_INCREF(result);
+    Py_XSETREF(it->result, result);
+
+    return result;
+}
+
+static PyTypeObject TwoDictIter_Type = {
+    PyVarObject_HEAD_INIT(NULL, 0)
+    .tp_name = "_twodict.TwoWayOrderedDictIterator",
+    .tp_basicsize = sizeof(TwoDictIterObject),
+    .tp_dealloc = (destructor)iter_dealloc,
+    .tp_flags = Py_TPFLAGS_DEFAULT | Py_TPFLAGS_HAVE_GC,
+    .tp_traverse = (traverseproc)iter_traverse,
+    .tp_iter = PyObject_SelfIter,
+    .tp_iternext = (iternextfunc)iter_next,
+};
+
+
+/********** TwoWayOrderedDictBase **********/
+
+static int
+twodict_setitem(TwoDictObject *self, PyObject *key, PyObject *value)
+{
+    PyObject *obj = (PyObject *)self, *mapped;
+    int result;
+
+    if (check_state(self) < 0) {
+        return -1;
+    }
+
+    mapped = PyDict_GetItemWithError(obj, key);
+
+    if (mapped == NULL && PyErr_Occurred()) {
+        return -1;
+    }
+
+    if (mapped != NULL) {
+        Py_INCREF(mapped);
+
+        /* For example {'a': 'a'} and we do d['a'] = 2, keep the order of 'a' */
+        result = not_equal(key, mapped);
+
+        if (result < 0 || (result && call_remove_mapped_key(self, mapped) < 0) ||
+                PyDict_DelItem(obj, mapped) < 0) {
+            Py_DECREF(mapped);
+            return -1;
+        }
+
+        Py_DECREF(mapped);
+    }
+
+    mapped = PyDict_GetItemWithError(obj, value);
+
+    if (mapped == NULL && PyErr_Occurred()) {
+        return -1;
+    }
+
+    if (mapped != NULL) {
+        Py_INCREF(mapped);
+
+        /* Don't remove value from the linked list when value == key */
+        result = not_equal(key, value);
+
+        if (result < 0 || (result && call_remove_mapped_key(self, value) < 0) ||
+                call_remove_mapped_key(self, mapped) < 0) {
+            Py_DECREF(mapped);
+            return -1;
+        }
+
+        /* The first del might have already removed it
+         * For example {'a': 1, 1: 'a'} and we do d['a'] = 'a' */
+        result = PyDict_Contains(obj, mapped);
+
+        if (result < 0 || (result && PyDict_DelItem(obj, mapped) < 0)) {
+            Py_DECREF(mapped);
+            return -1;
+        }
+
+        Py_DECREF(mapped);
+    }
+
+    result = PyDict_Contains(self->items_map, key);
+
+    if (result < 0 || (!result && call_append_key(self, key) < 0)) {
+        return -1;
+    }
+
+    if (PyDict_SetItem(obj, key, value) < 0 || PyDict_SetItem(obj, value, key) < 0) {
+        return -1;
+    }
+
+    return 0;
+}
+
+static int
+twodict_delitem(TwoDictObject *self, PyObject *key)
+{
+    PyObject *obj = (PyObject *)self, *value;
+    int result;
+
+    if (check_state(self) < 0) {
+        return -1;
+    }
+
+    value = PyDict_GetItemWithError(obj, key);
+
+    if (value == NULL) {
+        if (!PyErr_Occurred()) {
+            set_key_error(key);
+        }
+
+        return -1;
+    }
+
+    Py_INCREF(value);
+
+    if (call_remove_mapped_key(self, value) < 0 || call_remove_mapped_key(self, key) < 0 ||
+            PyDict_DelItem(obj, value) < 0) {
+        Py_DECREF(value);
+        return -1;
+    }
+
+    Py_DECREF(value);
+
+    /* Cases like {'a': 'a'} where we have only one copy instead of {'a': 1, 1: 'a'} */
+    result = PyDict_Contains(obj, key);
+
+    if (result < 0 || (result && PyDict_DelItem(obj, key) < 0)) {
+        return -1;
+    }
+
+    return 0;
+}
+
+static int
+twodict_ass_sub(TwoDictObject *self, PyObject *key, PyObject *value)
+{
+    if (value == NULL) {
+        return twodict_delitem(self, key);
+    }
+
+    return twodict_setitem(self, key, value);
+}
+
+static Py_ssize_t
+twodict_length(TwoDictObject *self)
+{
+    if (check_state(self) < 0) {
+        return -1;
+    }
+
+    return PyDict_GET_SIZE(self->items_map);
+}
+
+static PyObject *
+twodict_iter(TwoDictObject *self)
+{
+    return call_iterate(self, 0);
+}
+
+static PyObject *
+twodict_reversed(TwoDictObject *self, PyObject *unused)
+{
+    return call_iterate(self, 1);
+}
+
+static PyObject *
+twodict_iterate(TwoDictObject *self, PyObject *args, PyObject *kwargs)
+{
+    static char *kwlist[] = {"reverse", NULL};
+    int reverse = 0;
+
+    if (!PyArg_ParseTupleAndKeywords(args, kwargs, "|p:_iterate", kwlist, &reverse)) {
+        return NULL;
+    }
+
+    return iter_new(self, reverse, ITER_KEYS);
+}
+
+static PyObject *
+twodict_iterate_values(TwoDictObject *self, PyObject *args, PyObject *kwargs)
+{
+    static char *kwlist[] = {"reverse", NULL};
+    int reverse = 0;
+
+    if (!PyArg_ParseTupleAndKeywords(args, kwargs, "|p:_iterate_values", kwlist, &reverse)) {
+        return NULL;
+    }
+
+    return iter_view_new(self, reverse, ITER_VALUES);
+}
+
+static PyObject *
+twodict_iterate_items(TwoDictObject *self, PyObject *args, PyObject *kwargs)
+{
+    static char *kwlist[] = {"reverse", NULL};
+    int reverse = 0;
+
+    if (!PyArg_ParseTupleAndKeywords(args, kwargs, "|p:_iterate_items", kwlist, &reverse)) {
+        return NULL;
+    }
+
+    return iter_view_new(self, reverse, ITER_ITEMS);
+}
+
+static PyObject *
+twodict_append_key(TwoDictObject *self, PyObject *key)
+{
+    if (check_state(self) < 0 || append_key(self, key) < 0) {
+        return NULL;
+    }
+
+    Py_RETURN_NONE;
+}
+
+static PyObject *
+twodict_extend_keys(TwoDictObject *self, PyObject *keys)
+{
+    PyObject *iterator, *key;
+    int failed = 0;
+
+    if (check_state(self) < 0 || (iterator = PyObject_GetIter(keys)) == NULL) {
+        failed = 1;
+    }
+    else {
+        while ((key = PyIter_Next(iterator)) != NULL) {
+            failed = append_key(self, key) < 0;
+            Py_DECREF(key);
+
+            if (failed) {
+                break;
+            }
+        }
+
+        Py_DECREF(iterator);
+        failed = failed || PyErr_Occurred() != NULL;
+    }
+
+    if (failed) {
+        return NULL;
+    }
+
+    Py_RETURN_NONE;
+}
+
+static PyObject *
+twodict_end_key(TwoDictObject *self, PyObject *args, PyObject *kwargs)
+{
+    static char *kwlist[] = {"last", NULL};
+    PyObject *node, *key;
+    int last = 1;
+
+    if (!PyArg_ParseTupleAndKeywords(args, kwargs, "|p:_end_key", kwlist, &last)) {
+        return NULL;
+    }
+
+    if (check_state(self) < 0 ||
+            (node = get_link(self->items, last ? PREV : NEXT)) == NULL ||
+            (key = get_link(node, KEY)) == NULL) {
+        return NULL;
+    }
+
+    Py_INCREF(key);
+    return key;
+}
+
+static PyObject *
+twodict_remove_mapped_key(TwoDictObject *self, PyObject *key)
+{
+    if (check_state(self) < 0 || remove_mapped_key(self, key) < 0) {
+        return NULL;
+    }
+
+    Py_RETURN_NONE;
+}
+
+static int
+reset_state(TwoDictObject *self)
+{
+    PyObject *root, *items_map;
+
+    if ((root = PyList_New(3)) == NULL) {
+        return -1;
+    }
+
+    /* Cycled double linked list [previous, key, next] */
+    Py_INCREF(root);
+    PyList_SET_ITEM(root, PREV, root);
+    Py_INCREF(Py_None);
+    PyList_SET_ITEM(root, KEY, Py_None);
+    Py_INCREF(root);
+    PyList_SET_ITEM(root, NEXT, root);
+
+    if ((items_map = PyDict_New()) == NULL) {
+        Py_DECREF(root);
+        return -1;
+    }
+
+    Py_XSETREF(self->items, root);
+    Py_XSETREF(self->items_map, items_map);
+    PyDict_Clear((PyObject *)self);
+
+    return 0;
+}
+
+static PyObject *
+twodict_clear(TwoDictObject *self, PyObject *unused)
+{
+    if (reset_state(self) < 0) {
+        return NULL;
+    }
+
+    Py_RETURN_NONE;
+}
+
+static int
+twodict_init(TwoDictObject *self, PyObject *args, PyObject *kwargs)
+{
+    if (PyTuple_GET_SIZE(args) || (kwargs != NULL && PyDict_GET_SIZE(kwargs))) {
+        PyErr_SetString(PyExc_TypeError, "TwoWayOrderedDictBase() takes no arguments");
+        return -1;
+    }
+
+    return reset_state(self);
+}
+
+static int
+twodict_traverse(TwoDictObject *self, visitproc visit, void *arg)
+{
+    Py_VISIT(self->items);
+    Py_VISIT(self->items_map);
+    return PyDict_Type.tp_traverse((PyObject *)self, visit, arg);
+}
+
+static int
+twodict_tp_clear(TwoDictObject *self)
+{
+    Py_CLEAR(self->items);
+    Py_CLEAR(self->items_map);
+    return PyDict_Type.tp_clear((PyObject *)self);
+}
+
+static void
+twodict_dealloc(TwoDictObject *self)
+{
+    PyObject_GC_UnTrack(self);
+    Py_CLEAR(self->items);
+    Py_CLEAR(self->items_map);
+    PyDict_Type.tp_dealloc((PyObject *)self);
+}
+
+static PyMethodDef twodict_methods[] = {
+    {"__reversed__", (PyCFunction)twodict_reversed, METH_NOARGS, NULL},
+    {"_iterate", (PyCFunction)(void (*)(void))twodict_iterate, METH_VARARGS | METH_KEYWORDS,
+     "Iterate over the dictionary keys."},
+    {"_iterate_values", (PyCFunction)(void (*)(void))twodict_iterate_values, METH_VARARGS | METH_KEYWORDS,
+     "Iterate over the dictionary values."},
+    {"_iterate_items", (PyCFunction)(void (*)(void))twodict_iterate_items, METH_VARARGS | METH_KEYWORDS,
+     "Iterate over the (key, value) pairs of the dictionary."},
+    {"_append_key", (PyCFunction)twodict_append_key, METH_O,
+     "Append the given key at the end of the linked list."},
+    {"_extend_keys", (PyCFunction)twodict_extend_keys, METH_O,
+     "Append all the given keys at the end of the linked list."},
+    {"_end_key", (PyCFunction)(void (*)(void))twodict_end_key, METH_VARARGS | METH_KEYWORDS,
+     "Return the last (or the first if last is False) key of the linked list."},
+    {"_remove_mapped_key", (PyCFunction)twodict_remove_mapped_key, METH_O,
+     "Remove the given key both from the linked list and the items map."},
+    {"clear", (PyCFunction)twodict_clear, METH_NOARGS, NULL},
+    {NULL, NULL}
+};
+
+static PyMemberDef twodict_members[] = {
+    {"_items", T_OBJECT_EX, offsetof(TwoDictObject, items), 0, NULL},
+    {"_items_map", T_OBJECT_EX, offsetof(TwoDictObject, items_map), 0, NULL},
+    {NULL}
+};
+
+static PyMappingMethods twodict_as_mapping = {
+    .mp_length = (lenfunc)twodict_length,
+    .mp_ass_subscript = (objobjargproc)twodict_ass_sub,
+};
+
+static PyTypeObject TwoDict_Type = {
+    PyVarObject_HEAD_INIT(NULL, 0)
+    .tp_name = "_twodict.TwoWayOrderedDictBase",
+    .tp_doc = "C storage core of the TwoWayOrderedDict.",
+    .tp_basicsize = sizeof(TwoDictObject),
+    .tp_dealloc = (destructor)twodict_dealloc,
+    .tp_as_mapping = &twodict_as_mapping,
+    .tp_flags = Py_TPFLAGS_DEFAULT | Py_TPFLAGS_BASETYPE | Py_TPFLAGS_HAVE_GC,
+    .tp_traverse = (traverseproc)twodict_traverse,
+    .tp_clear = (inquiry)twodict_tp_clear,
+    .tp_iter = (getiterfunc)twodict_iter,
+    .tp_methods = twodict_methods,
+    .tp_members = twodict_members,
+    .tp_init = (initproc)twodict_init,
+};
+
+
+/********** Module **********/
+
+static struct PyModuleDef twodict_module = {
+    PyModuleDef_HEAD_INIT,
+    .m_name = "_twodict",
+    .m_doc = "C accelerator for the twodict module.",
+    .m_size = -1,
+};
+
+static int
+set_class_constant(const char *name, long value)
+{
+    PyObject *obj = PyLong_FromLong(value);
+    int result;
+
+    if (obj == NULL) {
+        return -1;
+    }
+
+    /* Static types don't accept setattr, write to the type dict directly */
+    result = PyDict_SetItemString(TwoDict_Type.tp_dict, name, obj);
+    Py_DECREF(obj);
+    PyType_Modified(&TwoDict_Type);
+
+    return result;
+}
+
+PyMODINIT_FUNC
+PyInit__twodict(void)
+{
+    PyObject *module;
+
+    TwoDict_Type.tp_base = &PyDict_Type;
+
+    if (PyType_Ready(&TwoDict_Type) < 0 || PyType_Ready(&TwoDictIter_Type) < 0) {
+        return NULL;
+    }
+
+    if ((str_remove_mapped_key = PyUnicode_InternFromString("_remove_mapped_key")) == NULL ||
+            (str_append_key = PyUnicode_InternFromString("_append_key")) == NULL ||
+            (str_iterate = PyUnicode_InternFromString("_iterate")) == NULL ||
+            (str_reverse = PyUnicode_InternFromString("reverse")) == NULL) {
+        return NULL;
+    }
+
+    if ((default_remove_mapped_key = PyObject_GetAttr((PyObject *)&TwoDict_Type, str_remove_mapped_key)) == NULL ||
+            (default_append_key = PyObject_GetAttr((PyObject *)&TwoDict_Type, str_append_key)) == NULL ||
+            (default_iterate = PyObject_GetAttr((PyObject *)&TwoDict_Type, str_iterate)) == NULL) {
+        return NULL;
+    }
+
+    /* Same class attributes as the pure Python implementation */
+    if (set_class_constant("_PREV", PREV) < 0 || set_class_constant("_KEY", KEY) < 0 ||
+            set_class_constant("_NEXT", NEXT) < 0) {
+        return NULL;
+    }
+
+    if ((module = PyModule_Create(&twodict_module)) == NULL) {
+        return NULL;
+    }
+
+    Py_INCREF(&TwoDict_Type);
+
+    if (PyModule_AddObject(module, "TwoWayOrderedDictBase", (PyObject *)&TwoDict_Type) < 0) {
+        Py_DECREF(&TwoDict_Type);
+        Py_DECREF(module);
+        return NULL;
+    }
+
+    return module;
+}
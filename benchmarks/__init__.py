@@ -0,0 +1,11 @@
+"""Benchmark suite for the twodict module.
+
+Run all the benchmarks and save the results::
+
+    $ python -m benchmarks run -o results.json
+
+Compare two runs and flag the regressions::
+
+    $ python -m benchmarks compare old.json new.json
+
+"""
@@ -0,0 +1,113 @@
+"""Command line entry point of the benchmark suite."""
+
+import sys
+import argparse
+
+import twodict
+
+from . import eventloop, runner, shared, stream, threads
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(prog="python -m benchmarks",
+                                     description="TwoWayOrderedDict benchmark suite")
+    subparsers = parser.add_subparsers(dest="command")
+
+    run_parser = subparsers.add_parser("run", help="run the benchmarks")
+    run_parser.add_argument("-s", "--sizes", type=int, nargs="+", default=runner.DEFAULT_SIZES,
+                            help="dictionary sizes (default: %(default)s), up to 10000000")
+    run_parser.add_argument("-r", "--repeat", type=int, default=5,
+                            help="samples per benchmark, the fastest is kept (default: %(default)s)")
+    run_parser.add_argument("-b", "--bench", nargs="+", metavar="NAME",
+                            help="run only the given benchmarks ('memory' for the memory usage)")
+    run_parser.add_argument("-c", "--class", dest="cls", default="TwoWayOrderedDict",
+                            help="twodict class to benchmark (default: %(default)s)")
+    run_parser.add_argument("-o", "--output", help="save the results as JSON")
+
+    threads_parser = subparsers.add_parser("threads", help="measure the ConcurrentTwoWayOrderedDict throughput")
+    threads_parser.add_argument("-t", "--threads", type=int, nargs="+", default=threads.DEFAULT_THREADS,
+                                help="number of threads (default: %(default)s)")
+    threads_parser.add_argument("-s", "--size", type=int, default=100000,
+                                help="dictionary size (default: %(default)s)")
+    threads_parser.add_argument("-w", "--write-ratio", type=float, default=0.1,
+                                help="fraction of assignments (default: %(default)s)")
+    threads_parser.add_argument("-o", "--output", help="save the results as JSON")
+
+    shared_parser = subparsers.add_parser("shared", help="compare the SharedTwoWayOrderedDict with pickled copies")
+    shared_parser.add_argument("-w", "--workers", type=int, default=4,
+                               help="number of worker processes (default: %(default)s)")
+    shared_parser.add_argument("-s", "--size", type=int, default=100000,
+                               help="dictionary size (default: %(default)s)")
+
+    async_parser = subparsers.add_parser("async", help="measure the event loop stalls of the AsyncTwoWayOrderedDict")
+    async_parser.add_argument("-s", "--size", type=int, default=1000000,
+                              help="number of pairs added (default: %(default)s)")
+    async_parser.add_argument("-c", "--chunk-size", type=int, default=1000,
+                              help="items per chunk (default: %(default)s)")
+
+    stream_parser = subparsers.add_parser("stream", help="compare from_pairs_stream() with reading the lines first")
+    stream_parser.add_argument("-s", "--size", type=int, default=1000000,
+                               help="number of lines (default: %(default)s)")
+
+    compare_parser = subparsers.add_parser("compare", help="compare two saved runs")
+    compare_parser.add_argument("old", help="JSON results of the baseline run")
+    compare_parser.add_argument("new", help="JSON results of the current run")
+    compare_parser.add_argument("-t", "--threshold", type=float, default=0.1,
+                                help="relative change flagged as regression (default: %(default)s)")
+
+    args = parser.parse_args(argv)
+
+    if args.command is None:
+        parser.error("expected one of the commands: run, threads, shared, async, stream, compare")
+
+    return args
+
+
+def log(message):
+    sys.stdout.write(message + "\n")
+    sys.stdout.flush()
+
+
+def main(argv=None):
+    args = parse_args(sys.argv[1:] if argv is None else argv)
+
+    if args.command == "run":
+        results = runner.run_benchmarks(args.sizes, args.repeat, args.bench,
+                                        getattr(twodict, args.cls), log)
+
+        if args.output:
+            runner.save(results, args.output)
+
+        return 0
+
+    if args.command == "threads":
+        results = threads.run_threads(args.threads, args.size, write_ratio=args.write_ratio, log=log)
+
+        if args.output:
+            runner.save({"results": {"threads": results}}, args.output)
+
+        return 0
+
+    if args.command == "shared":
+        shared.run_shared(args.workers, args.size, log=log)
+        return 0
+
+    if args.command == "async":
+        eventloop.run_eventloop(args.size, args.chunk_size, log=log)
+        return 0
+
+    if args.command == "stream":
+        stream.run_stream(args.size, log=log)
+        return 0
+
+    report = runner.compare(runner.load(args.old), runner.load(args.new), args.threshold)
+
+    for name, size, metric, old_value, new_value, ratio, status in report:
+        log("{0:<24} {1:>10} {2:<16} {3:>12.4g} {4:>12.4g} {5:>7.2f}x  {6}".format(
+            name, size, metric, old_value, new_value, ratio, status))
+
+    return 1 if any(entry[-1] == "REGRESSION" for entry in report) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
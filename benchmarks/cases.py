@@ -0,0 +1,228 @@
+"""Contains the benchmark cases for the TwoWayOrderedDict.
+
+Every case is a (setup, run) pair of functions. setup(cls, size) builds the
+state that will be passed to run(state), only run() is timed. run() must
+return the number of operations it performed so that the results can be
+reported per operation.
+
+The __setitem__ cases follow the collision table of the test suite: the key
+that gets assigned already exists as a key, as a value or as both.
+
+"""
+
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+
+
+def make_pairs(size):
+    """Return size (str, int) pairs with no collisions between them."""
+    return [("k{0}".format(index), index) for index in range(size)]
+
+
+def _filled(cls, size):
+    return cls(make_pairs(size))
+
+
+########## Initialization ##########
+
+def setup_init(cls, size):
+    return cls, make_pairs(size)
+
+
+def run_init_list(state):
+    cls, pairs = state
+    cls(pairs)
+    return len(pairs)
+
+
+def setup_init_dict(cls, size):
+    return cls, dict(make_pairs(size))
+
+
+def run_init_dict(state):
+    cls, data = state
+    cls(data)
+    return len(data)
+
+
+def run_init_kwargs(state):
+    cls, data = state
+    cls(**data)
+    return len(data)
+
+
+########## __setitem__ ##########
+
+def setup_setitem_new(cls, size):
+    return cls(), make_pairs(size)
+
+
+def run_setitem(state):
+    tdict, pairs = state
+
+    for key, value in pairs:
+        tdict[key] = value
+
+    return len(pairs)
+
+
+def setup_setitem_key_as_key(cls, size):
+    return _filled(cls, size), [(key, -value - 1) for key, value in make_pairs(size)]
+
+
+def setup_setitem_key_as_value(cls, size):
+    # tdict[1] = x where 1 is already the value of 'k1'
+    return _filled(cls, size), [(value, -value - 1) for _, value in make_pairs(size)]
+
+
+def setup_setitem_key_as_both(cls, size):
+    # Items like {'k1': 'k1'}
+    pairs = [(key, key) for key, _ in make_pairs(size)]
+    return cls(pairs), [(key, index) for index, (key, _) in enumerate(pairs)]
+
+
+########## Removal ##########
+
+def setup_remove(cls, size):
+    return _filled(cls, size), [key for key, _ in make_pairs(size)]
+
+
+def run_delitem(state):
+    tdict, keys = state
+
+    for key in keys:
+        del tdict[key]
+
+    return len(keys)
+
+
+def run_pop(state):
+    tdict, keys = state
+    pop = tdict.pop
+
+    for key in keys:
+        pop(key)
+
+    return len(keys)
+
+
+def run_popitem_first(state):
+    tdict, keys = state
+    popitem = tdict.popitem
+
+    for _ in keys:
+        popitem(last=False)
+
+    return len(keys)
+
+
+########## Read only ##########
+
+def setup_filled(cls, size):
+    return _filled(cls, size)
+
+
+def run_iter(tdict):
+    for _ in tdict:
+        pass
+
+    return len(tdict)
+
+
+def run_reversed(tdict):
+    for _ in reversed(tdict):
+        pass
+
+    return len(tdict)
+
+
+def setup_membership(cls, size):
+    return _filled(cls, size), make_pairs(size)
+
+
+def run_keys_contains(state):
+    tdict, pairs = state
+    keys = tdict.keys()
+
+    for key, _ in pairs:
+        key in keys
+
+    return len(pairs)
+
+
+def run_values_contains(state):
+    tdict, pairs = state
+    values = tdict.values()
+
+    for _, value in pairs:
+        value in values
+
+    return len(pairs)
+
+
+def run_items_contains(state):
+    tdict, pairs = state
+    items = tdict.items()
+
+    for item in pairs:
+        item in items
+
+    return len(pairs)
+
+
+def run_copy(tdict):
+    tdict.copy()
+    return len(tdict)
+
+
+def setup_equal(cls, size):
+    return _filled(cls, size), _filled(cls, size)
+
+
+def run_equal(state):
+    first, second = state
+    first == second
+    return len(first)
+
+
+# name -> (setup, run, mutates the state)
+CASES = [
+    ("init_list", setup_init, run_init_list, False),
+    ("init_dict", setup_init_dict, run_init_dict, False),
+    ("init_kwargs", setup_init_dict, run_init_kwargs, False),
+    ("setitem_new", setup_setitem_new, run_setitem, True),
+    ("setitem_key_as_key", setup_setitem_key_as_key, run_setitem, True),
+    ("setitem_key_as_value", setup_setitem_key_as_value, run_setitem, True),
+    ("setitem_key_as_both", setup_setitem_key_as_both, run_setitem, True),
+    ("delitem", setup_remove, run_delitem, True),
+    ("pop", setup_remove, run_pop, True),
+    ("popitem_first", setup_remove, run_popitem_first, True),
+    ("iter", setup_filled, run_iter, False),
+    ("reversed", setup_filled, run_reversed, False),
+    ("keys_contains", setup_membership, run_keys_contains, False),
+    ("values_contains", setup_membership, run_values_contains, False),
+    ("items_contains", setup_membership, run_items_contains, False),
+    ("copy", setup_filled, run_copy, False),
+    ("equal", setup_equal, run_equal, False),
+]
+
+
+def memory_per_entry(cls, size):
+    """Return the bytes allocated per entry for a cls with size entries."""
+    pairs = make_pairs(size)
+
+    tracemalloc.start()
+
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        tdict = cls(pairs)
+        after = tracemalloc.get_traced_memory()[0]
+    finally:
+        tracemalloc.stop()
+
+    # Keep the dict alive until we measure it
+    del tdict
+
+    return float(after - before) / size
@@ -0,0 +1,67 @@
+"""Measures how long a bulk update stalls the asyncio event loop."""
+
+import time
+import asyncio
+
+import twodict
+
+from .cases import make_pairs
+
+
+async def _ticker(stop, stalls):
+    last = time.perf_counter()
+
+    while not stop.is_set():
+        await asyncio.sleep(0)
+        now = time.perf_counter()
+        stalls.append(now - last)
+        last = now
+
+
+async def _measure(update):
+    stop = asyncio.Event()
+    stalls = []
+
+    ticker = asyncio.ensure_future(_ticker(stop, stalls))
+    await asyncio.sleep(0)
+
+    start = time.perf_counter()
+    await update()
+    elapsed = time.perf_counter() - start
+
+    stop.set()
+    await ticker
+
+    stalls.sort()
+
+    return {"seconds": elapsed, "p99_stall": stalls[len(stalls) * 99 // 100], "max_stall": stalls[-1]}
+
+
+def run_eventloop(size=1000000, chunk_size=1000, log=None):
+    """Return the duration and the event loop stalls of update() vs aupdate().
+
+    Args:
+        size (int): Number of pairs added.
+
+        chunk_size (int): Chunk size of the AsyncTwoWayOrderedDict.
+
+    """
+    pairs = make_pairs(size)
+
+    async def blocking():
+        twodict.TwoWayOrderedDict().update(pairs)
+
+    async def chunked():
+        await twodict.AsyncTwoWayOrderedDict(chunk_size=chunk_size).aupdate(pairs)
+
+    results = {}
+
+    for name, update in (("update", blocking), ("aupdate", chunked)):
+        results[name] = asyncio.run(_measure(update))
+
+        if log is not None:
+            log("{0:<8} {1:>8.3f} s  p99 stall {2:>9.2f} ms  longest stall {3:>9.2f} ms".format(
+                name, results[name]["seconds"], results[name]["p99_stall"] * 1000,
+                results[name]["max_stall"] * 1000))
+
+    return results
@@ -0,0 +1,165 @@
+"""Runs the benchmark cases and compares the saved results.
+
+Attributes:
+    DEFAULT_SIZES (list): Dictionary sizes used when none are given.
+
+    OPS_PER_SAMPLE (int): Minimum number of operations per timing sample,
+        small dictionaries are repeated until they reach it.
+
+"""
+
+import gc
+import sys
+import json
+import time
+import platform
+
+import twodict
+
+from . import cases
+
+
+DEFAULT_SIZES = [10, 1000, 100000]
+
+OPS_PER_SAMPLE = 100000
+
+_timer = getattr(time, "perf_counter", time.time)
+
+
+def _sample(setup, run, cls, size):
+    """Time run() over enough fresh states to reach OPS_PER_SAMPLE operations."""
+    states = [setup(cls, size) for _ in range(max(1, OPS_PER_SAMPLE // size))]
+
+    gc_enabled = gc.isenabled()
+    gc.disable()
+
+    try:
+        start = _timer()
+        ops = sum(run(state) for state in states)
+        elapsed = _timer() - start
+    finally:
+        if gc_enabled:
+            gc.enable()
+
+    return elapsed, ops
+
+
+def run_benchmarks(sizes=None, repeat=5, names=None, cls=twodict.TwoWayOrderedDict, log=None):
+    """Run the benchmark cases and return the results as a JSON serializable dict.
+
+    Args:
+        sizes (list): Dictionary sizes to benchmark.
+
+        repeat (int): Number of samples per case & size, the fastest is kept.
+
+        names (list): Run only the cases with the given names.
+
+        cls (type): Class to benchmark.
+
+        log (callable): Called with a progress message after every result.
+
+    """
+    sizes = sizes or DEFAULT_SIZES
+    results = {}
+
+    for name, setup, run, _ in cases.CASES:
+        if names and name not in names:
+            continue
+
+        results[name] = {}
+
+        for size in sizes:
+            samples = [_sample(setup, run, cls, size) for _ in range(repeat)]
+            elapsed, ops = min(samples)
+
+            results[name][str(size)] = {"seconds_per_op": elapsed / ops, "ops": ops}
+
+            if log is not None:
+                log("{0:<24} {1:>10} {2:>12.1f} ns/op".format(name, size, elapsed / ops * 1e9))
+
+    if cases.tracemalloc is not None and (not names or "memory" in names):
+        results["memory"] = {}
+
+        for size in sizes:
+            results["memory"][str(size)] = {"bytes_per_entry": cases.memory_per_entry(cls, size)}
+
+            if log is not None:
+                log("{0:<24} {1:>10} {2:>12.1f} bytes/entry".format(
+                    "memory", size, results["memory"][str(size)]["bytes_per_entry"]))
+
+    return {
+        "meta": {
+            "python": sys.version,
+            "implementation": platform.python_implementation(),
+            "platform": platform.platform(),
+            "twodict": twodict.__version__,
+            "class": cls.__name__,
+            "backend": twodict._TwoWayOrderedDictBase.__module__,
+            "date": time.strftime("%Y-%m-%d %H:%M:%S")
+        },
+        "results": results
+    }
+
+
+def _metric(values):
+    """Return the (name, value) of the metric stored in values."""
+    if "bytes_per_entry" in values:
+        return "bytes_per_entry", values["bytes_per_entry"]
+
+    if "ops_per_second" in values:
+        return "seconds_per_op", 1.0 / values["ops_per_second"]
+
+    return "seconds_per_op", values["seconds_per_op"]
+
+
+def compare(old, new, threshold=0.1):
+    """Compare two benchmark results.
+
+    Args:
+        old (dict): Results of the baseline run.
+
+        new (dict): Results of the current run.
+
+        threshold (float): Relative change that counts as a regression
+            (or an improvement), 0.1 means 10%.
+
+    Returns:
+        List of (name, size, metric, old value, new value, ratio, status)
+        tuples where status is one of "REGRESSION", "improved", "ok".
+
+    """
+    report = []
+
+    for name in sorted(new["results"]):
+        if name not in old["results"]:
+            continue
+
+        for size in sorted(new["results"][name], key=int):
+            if size not in old["results"][name]:
+                continue
+
+            metric, old_value = _metric(old["results"][name][size])
+            _, new_value = _metric(new["results"][name][size])
+
+            ratio = new_value / old_value if old_value else float("inf")
+
+            if ratio > 1 + threshold:
+                status = "REGRESSION"
+            elif ratio < 1 - threshold:
+                status = "improved"
+            else:
+                status = "ok"
+
+            report.append((name, int(size), metric, old_value, new_value, ratio, status))
+
+    return report
+
+
+def load(path):
+    with open(path) as input_file:
+        return json.load(input_file)
+
+
+def save(results, path):
+    with open(path, "w") as output_file:
+        json.dump(results, output_file, indent=2, sort_keys=True)
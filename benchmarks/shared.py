@@ -0,0 +1,83 @@
+"""Compares the SharedTwoWayOrderedDict with per-process pickled copies."""
+
+import time
+import pickle
+import random
+import multiprocessing
+
+import twodict
+
+from .cases import make_pairs
+
+
+def _worker(args):
+    kind, payload, keys = args
+    start = time.time()
+
+    if kind == "shared":
+        tdict = twodict.SharedTwoWayOrderedDict(payload)
+    else:
+        tdict = pickle.loads(payload)
+
+    startup = time.time() - start
+    start = time.time()
+
+    for key in keys:
+        tdict[key]
+
+    lookups = len(keys) / (time.time() - start)
+
+    if kind == "shared":
+        tdict.close()
+
+    return startup, lookups
+
+
+def run_shared(workers=4, size=100000, lookups=100000, log=None):
+    """Return the average worker start up time & lookups/sec of both approaches.
+
+    Args:
+        workers (int): Number of worker processes.
+
+        size (int): Number of items in the dictionary.
+
+        lookups (int): Lookups performed by every worker.
+
+    """
+    pairs = make_pairs(size)
+    rand = random.Random(0)
+    keys = [rand.choice(pairs)[rand.randrange(2)] for _ in range(lookups)]
+
+    tdict = twodict.TwoWayOrderedDict(pairs)
+    shared = twodict.SharedTwoWayOrderedDict.create(size, pairs, key_size=32, value_size=16)
+
+    candidates = [
+        ("pickled copy", "copy", pickle.dumps(tdict, pickle.HIGHEST_PROTOCOL)),
+        ("shared memory", "shared", shared.name),
+    ]
+
+    results = {}
+
+    try:
+        pool = multiprocessing.Pool(workers)
+
+        try:
+            for name, kind, payload in candidates:
+                samples = pool.map(_worker, [(kind, payload, keys)] * workers)
+
+                results[name] = {
+                    "startup_seconds": sum(startup for startup, _ in samples) / workers,
+                    "lookups_per_second": sum(rate for _, rate in samples) / workers,
+                }
+
+                if log is not None:
+                    log("{0:<14} start up {1:>10.4f} s {2:>14,.0f} lookups/sec/worker".format(
+                        name, results[name]["startup_seconds"], results[name]["lookups_per_second"]))
+        finally:
+            pool.close()
+            pool.join()
+    finally:
+        shared.close()
+        shared.unlink()
+
+    return results
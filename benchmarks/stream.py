@@ -0,0 +1,80 @@
+"""Compares from_pairs_stream() with reading the lines into tuples first."""
+
+import gc
+import os
+import time
+import tempfile
+import tracemalloc
+
+import twodict
+
+from .cases import make_pairs
+
+
+def _line_by_line(fileobj):
+    pairs = []
+
+    for line in fileobj:
+        key, value = line.rstrip(b"\n").split(b"\t", 1)
+        pairs.append((key.decode("utf-8"), int(value)))
+
+    tdict = twodict.TwoWayOrderedDict()
+    tdict.update(pairs)
+    return tdict
+
+
+def _streamed(fileobj):
+    return twodict.TwoWayOrderedDict.from_pairs_stream(fileobj, converters=(None, int))
+
+
+def _measure(load, path):
+    # Timed without tracemalloc, it slows down every allocation
+    gc.collect()
+    start = time.perf_counter()
+
+    with open(path, "rb") as fileobj:
+        tdict = load(fileobj)
+
+    elapsed = time.perf_counter() - start
+    del tdict
+
+    tracemalloc.start()
+
+    try:
+        with open(path, "rb") as fileobj:
+            tdict = load(fileobj)
+
+        size, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    del tdict
+    return {"seconds": elapsed, "peak_overhead": float(peak - size) / size}
+
+
+def run_stream(size=1000000, log=None):
+    """Return the load time & the peak memory above the final size of both approaches.
+
+    Args:
+        size (int): Number of lines of the TSV file.
+
+    """
+    descriptor, path = tempfile.mkstemp(suffix=".tsv")
+    os.close(descriptor)
+
+    results = {}
+
+    try:
+        with open(path, "wb") as fileobj:
+            twodict.TwoWayOrderedDict(make_pairs(size)).to_stream(fileobj)
+
+        for name, load in (("lines", _line_by_line), ("stream", _streamed)):
+            results[name] = _measure(load, path)
+
+            if log is not None:
+                log("{0:<8} {1:>8.3f} s  peak memory {2:>6.1%} above the dictionary".format(
+                    name, results[name]["seconds"], results[name]["peak_overhead"]))
+    finally:
+        os.remove(path)
+
+    return results
@@ -0,0 +1,71 @@
+"""Measures the throughput of the ConcurrentTwoWayOrderedDict under contention."""
+
+import time
+import random
+import threading
+
+import twodict
+
+from .cases import make_pairs
+
+
+DEFAULT_THREADS = [1, 2, 4, 8, 16, 32]
+
+
+def _worker(tdict, pairs, operations, write_ratio, seed, barrier):
+    rand = random.Random(seed)
+    choices = [rand.choice(pairs) for _ in range(1024)]
+    writes = [rand.random() < write_ratio for _ in range(1024)]
+
+    barrier.wait()
+
+    for index in range(operations):
+        key, value = choices[index & 1023]
+
+        if writes[index & 1023]:
+            tdict[key] = value
+        else:
+            tdict.get(key)
+
+
+def run_threads(threads=None, size=100000, operations=200000, write_ratio=0.1,
+                cls=twodict.ConcurrentTwoWayOrderedDict, log=None):
+    """Return {threads: total operations per second} for the given thread counts.
+
+    Args:
+        threads (list): Number of threads for each run.
+
+        size (int): Number of items in the dictionary.
+
+        operations (int): Total operations per run, split between the threads.
+
+        write_ratio (float): Fraction of the operations that are assignments.
+
+    """
+    pairs = make_pairs(size)
+    results = {}
+
+    for count in threads or DEFAULT_THREADS:
+        tdict = cls(pairs)
+        barrier = threading.Barrier(count + 1)
+
+        workers = [threading.Thread(target=_worker,
+                                    args=(tdict, pairs, operations // count, write_ratio, seed, barrier))
+                   for seed in range(count)]
+
+        for worker in workers:
+            worker.start()
+
+        barrier.wait()
+        start = time.time()
+
+        for worker in workers:
+            worker.join()
+
+        elapsed = time.time() - start
+        results[str(count)] = {"ops_per_second": (operations // count) * count / elapsed}
+
+        if log is not None:
+            log("{0:>3} threads {1:>14,.0f} ops/sec".format(count, results[str(count)]["ops_per_second"]))
+
+    return results
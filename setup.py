@@ -1,11 +1,43 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
 
-from distutils.core import setup
+import sys
+import platform
+
+from setuptools import setup, Extension
+from setuptools.command.build_ext import build_ext
 
 from twodict import __version__, __license__
 
 
+class OptionalBuildExt(build_ext):
+
+    """Build the C accelerator, fall back to pure Python when it fails."""
+
+    def run(self):
+        try:
+            build_ext.run(self)
+        except Exception as error:
+            self._warn(error)
+
+    def build_extension(self, ext):
+        try:
+            build_ext.build_extension(self, ext)
+        except Exception as error:
+            self._warn(error)
+
+    @staticmethod
+    def _warn(error):
+        sys.stderr.write("WARNING: Could not build the _twodict C extension ({0}), "
+                         "falling back to pure Python\n".format(error))
+
+
+ext_modules = []
+
+if sys.version_info >= (3, 0) and platform.python_implementation() == "CPython":
+    ext_modules.append(Extension("_twodict", sources=["_twodict.c"]))
+
+
 setup(
     author       = "Sotiris Papadopoulos",
     author_email = "ytubedlg@gmail.com",
@@ -14,5 +46,7 @@ setup(
     version      = __version__,
     license      = __license__,
     url          = "https://github.com/MrS0m30n3/twodict",
-    py_modules   = ["twodict"]
+    py_modules   = ["twodict"],
+    ext_modules  = ext_modules,
+    cmdclass     = {"build_ext": OptionalBuildExt}
 )
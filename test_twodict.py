@@ -2,15 +2,54 @@
 
 """Contains tests for the twodict module."""
 
+import gc
+import io
+import os
 import sys
+import shutil
+import pickle
+import random
+import tempfile
 import unittest
+import functools
+import threading
+import subprocess
+import multiprocessing
 
 try:
+    import numpy
+except ImportError:
+    numpy = None
+
+try:
+    import twodict
     from twodict import (
         TwoWayOrderedDict,
+        CompactTwoWayOrderedDict,
+        IndexedTwoWayOrderedDict,
+        BidirectionalMap,
+        StrIntTwoWayOrderedDict,
+        IntTwoWayOrderedDict,
+        FrozenTwoWayOrderedDict,
+        SharedTwoWayOrderedDict,
+        DiskTwoWayOrderedDict,
+        ConcurrentTwoWayOrderedDict,
+        BoundedTwoWayOrderedDict,
+        JournaledTwoWayOrderedDict,
+        InstrumentedTwoWayOrderedDict,
+        MultiIndexTwoWayOrderedDict,
+        SortedIndex,
+        PrefixIndex,
+        HashIndex,
+        SortedTwoWayDict,
+        SnapshotTwoWayOrderedDict,
+        PersistentTwoWayOrderedDict,
+        AsyncTwoWayOrderedDict,
         DictItemsView,
         DictValuesView,
-        DictKeysView
+        DictKeysView,
+        dump,
+        load
     )
 except ImportError as error:
     print(error)
@@ -38,6 +77,35 @@ class ExtraAssertions(object):
         if view_list != iterable:
             raise AssertionError(self.MSG.format(view_list))
 
+    def assertSameAsReference(self, tdict_class, operations=2000, seed=0, integers=False):
+        """Replay random operations on tdict_class and on TwoWayOrderedDict."""
+        rand = random.Random(seed)
+        population = list(range(20)) + ([] if integers else [chr(ord('a') + i) for i in range(20)])
+
+        reference = TwoWayOrderedDict()
+        tdict = tdict_class()
+
+        for _ in range(operations):
+            choice = rand.random()
+
+            if choice < 0.6:
+                key, value = rand.choice(population), rand.choice(population)
+                reference[key] = value
+                tdict[key] = value
+            elif choice < 0.8 and reference:
+                key = rand.choice(list(reference) + list(reference.values()))
+                del reference[key]
+                del tdict[key]
+            elif choice < 0.9 and reference:
+                last = rand.random() < 0.5
+                self.assertEqual(tdict.popitem(last), reference.popitem(last))
+
+            self.assertEqual(list(tdict.items()), list(reference.items()))
+            self.assertEqual(list(reversed(tdict)), list(reversed(reference)))
+
+            if isinstance(tdict, dict):
+                self.assertEqual(dict(dict.items(tdict)), dict(dict.items(reference)))
+
 #############################
 
 
@@ -263,12 +331,60 @@ class TestSetItem(unittest.TestSuite):
     @staticmethod
     def tearDownForTestCases(test_case):
         """Test the status of the parent dictionary."""
-        current_dict = super(test_case.tdict.__class__, test_case.tdict).copy()
+        # dict.copy() on subclasses that override __iter__ goes through keys()
+        # on newer Python versions, read the raw storage instead
+        current_dict = dict(dict.items(test_case.tdict))
         expected_dict = test_case.expected_dict
 
         test_case.assertEqual(current_dict, expected_dict)
 
 
+class TestGetMany(unittest.TestCase):
+
+    """Test case for the TwoWayOrderedDict batched lookup methods."""
+
+    def setUp(self):
+        self.tdict = TwoWayOrderedDict([('a', 1), ('b', 'b'), ('c', 3)])
+
+    def test_get_many(self):
+        self.assertEqual(self.tdict.get_many(['a', 3, 'b']), [1, 'c', 'b'])
+
+    def test_get_many_raises(self):
+        self.assertRaises(KeyError, self.tdict.get_many, ['a', 'd'])
+
+    def test_get_many_default(self):
+        self.assertEqual(self.tdict.get_many(['a', 'd'], default=None), [1, None])
+
+    def test_get_many_out(self):
+        out = [0] * 4
+        self.assertIs(self.tdict.get_many(['a', 'c'], out=out), out)
+        self.assertEqual(out, [1, 3, 0, 0])
+
+    def test_forward_many(self):
+        self.assertEqual(self.tdict.forward_many(['a', 'b']), [1, 'b'])
+        self.assertEqual(self.tdict.forward_many(['a', 1], default=None), [1, None])
+        self.assertRaises(KeyError, self.tdict.forward_many, [1])
+
+    def test_inverse_many(self):
+        self.assertEqual(self.tdict.inverse_many([3, 'b']), ['c', 'b'])
+        self.assertEqual(self.tdict.inverse_many([3, 'a'], default=None), ['c', None])
+        self.assertRaises(KeyError, self.tdict.inverse_many, ['a'])
+
+    @unittest.skipIf(numpy is None, "NumPy is not installed")
+    def test_numpy_arrays(self):
+        result = self.tdict.get_many(numpy.array(['a', 'c']))
+        self.assertEqual(result.dtype.kind, 'i')
+        self.assertEqual(result.tolist(), [1, 3])
+
+        result = self.tdict.inverse_many(numpy.array([1, 3]))
+        self.assertEqual(result.dtype, object)
+        self.assertEqual(result.tolist(), ['a', 'c'])
+
+        out = numpy.zeros(2, dtype=int)
+        self.tdict.forward_many(['c', 'a'], out=out)
+        self.assertEqual(out.tolist(), [3, 1])
+
+
 class TestDelItem(unittest.TestCase, ExtraAssertions):
 
     """Test case for the TwoWayOrderedDict __delitem__ method."""
@@ -341,6 +457,23 @@ class TestComparison(unittest.TestCase):
 
         self.assertNotEqual(t1, t2)
 
+    def test_equal_any_order(self):
+        for tdict_class in (TwoWayOrderedDict, CompactTwoWayOrderedDict, ConcurrentTwoWayOrderedDict):
+            t1 = tdict_class([('a', 1), ('b', 'b'), ('c', 3)])
+            t2 = tdict_class([('c', 3), ('a', 1), ('b', 'b')])
+
+            self.assertEqual(t1, t2)
+
+            t2['c'] = 4
+            self.assertNotEqual(t1, t2)
+
+            # Same storage but 'b' is a value instead of a key
+            t1 = tdict_class([('a', 1), ('b', 2)])
+            t2 = tdict_class([('a', 1), (2, 'b')])
+
+            self.assertNotEqual(t1, t2)
+            self.assertNotEqual(t2, t1)
+
 
 class TestGetValuesAndKeys(unittest.TestCase, ExtraAssertions):
 
@@ -362,6 +495,24 @@ class TestGetValuesAndKeys(unittest.TestCase, ExtraAssertions):
     def test_get_values_not_empty(self):
         self.assertViewEqualO(self.tdict.values(), [1, 2, 3])
 
+    def test_reversed_views(self):
+        for tdict_class in (TwoWayOrderedDict, CompactTwoWayOrderedDict, ConcurrentTwoWayOrderedDict):
+            tdict = tdict_class(self.tdict.items())
+
+            self.assertEqual(list(reversed(tdict.keys())), ['c', 'b', 'a'])
+            self.assertEqual(list(reversed(tdict.values())), [3, 2, 1])
+            self.assertEqual(list(reversed(tdict.items())), [('c', 3), ('b', 2), ('a', 1)])
+
+    def test_items_kept_alive(self):
+        # The items iterator may reuse the tuples nobody else holds
+        items = list(self.tdict.items())
+        iterator = iter(self.tdict.items())
+        first, second = next(iterator), next(iterator)
+
+        self.assertEqual(items, [('a', 1), ('b', 2), ('c', 3)])
+        self.assertEqual((first, second), (('a', 1), ('b', 2)))
+        self.assertEqual([item for item in iterator], [('c', 3)])
+
 
 class TestPopMethods(unittest.TestCase, ExtraAssertions):
 
@@ -421,6 +572,47 @@ class TestUpdate(unittest.TestCase, ExtraAssertions):
         self.tdict.update(other)
         self.assertViewEqualO(self.tdict.items(), [('a', 10), ('b', 20), ('c', 30)])
 
+    def test_update_same_as_setitem(self):
+        batches = [
+            [('c', 'c'), ('d', 4)],
+            [('c', 3), ('d', 3)],
+            [('c', 'a'), (1, 'd')],
+            [('c', 'd'), ('d', 'c')],
+            [(2, 'x'), ('y', 'y')],
+            [(1, 'a'), (True, 'b')]
+        ]
+
+        for batch in batches:
+            expected = TwoWayOrderedDict([('a', 1), ('b', 2)])
+
+            for key, value in batch:
+                expected[key] = value
+
+            self.setUp()
+            self.tdict.update(batch)
+
+            self.assertViewEqualO(self.tdict.items(), list(expected.items()))
+            self.assertEqual(dict(dict.items(self.tdict)), dict(dict.items(expected)))
+
+    def test_update_equal_objects(self):
+        # 1 & 1.0 are equal but distinct, the pair is not like {'a': 'a'}
+        for batch in ([(1, 1.0)], [(1.0, 1)], [('c', 3), (True, 1)]):
+            expected = TwoWayOrderedDict()
+
+            for key, value in batch:
+                expected[key] = value
+
+            tdict = TwoWayOrderedDict()
+            tdict.update(batch)
+
+            self.assertEqual([(type(key), type(value)) for key, value in tdict.items()],
+                             [(type(key), type(value)) for key, value in expected.items()])
+            self.assertEqual([type(obj) for obj in dict.keys(tdict)], [type(obj) for obj in dict.keys(expected)])
+
+    def test_update_unhashable(self):
+        self.assertRaises(TypeError, self.tdict.update, [('c', 3), ('d', [])])
+        self.assertViewEqualO(self.tdict.items(), [('a', 1), ('b', 2), ('c', 3)])
+
 
 class TestSetDefault(unittest.TestCase, ExtraAssertions):
 
@@ -455,6 +647,1992 @@ class TestCopy(unittest.TestCase):
         tdict_copy['c'] = 3
         self.assertNotEqual(tdict, tdict_copy)
 
+    def test_copy_keeps_storage(self):
+        tdict = TwoWayOrderedDict([('a', 1), ('b', 'b'), ('c', 3)])
+        tdict_copy = tdict.copy()
+
+        self.assertEqual(list(reversed(tdict_copy)), ['c', 'b', 'a'])
+        self.assertEqual(dict(dict.items(tdict_copy)), dict(dict.items(tdict)))
+
+        del tdict_copy['a']
+        self.assertEqual(tdict[1], 'a')
+
+
+class TestPickle(unittest.TestCase):
+
+    """Test case for the TwoWayOrderedDict pickle support."""
+
+    def test_pickle(self):
+        tdict = TwoWayOrderedDict([('a', 1), ('b', 'b'), ('c', 3)])
+
+        for protocol in range(pickle.HIGHEST_PROTOCOL + 1):
+            tdict_copy = pickle.loads(pickle.dumps(tdict, protocol))
+
+            self.assertEqual(tdict, tdict_copy)
+            self.assertEqual(dict(dict.items(tdict_copy)), dict(dict.items(tdict)))
+
+    def test_pickle_compact(self):
+        tdict = CompactTwoWayOrderedDict([('a', 1), ('b', 2)])
+        del tdict['a']
+
+        tdict_copy = pickle.loads(pickle.dumps(tdict))
+        self.assertIsInstance(tdict_copy, CompactTwoWayOrderedDict)
+        self.assertEqual(tdict, tdict_copy)
+
+    def test_pickle_stores_items_once(self):
+        tdict = TwoWayOrderedDict([('a', 'xyz' * 100)])
+        self.assertEqual(pickle.dumps(tdict).count(b'xyz' * 100), 1)
+
+
+class TestStrIntTwoWayOrderedDict(unittest.TestCase, ExtraAssertions):
+
+    """Test case for the StrIntTwoWayOrderedDict class."""
+
+    def setUp(self):
+        self.tdict = StrIntTwoWayOrderedDict([('a', 0), ('b', 1), ('c', 10 ** 12), ('d', -5)])
+
+    def test_get_item(self):
+        self.assertEqual(self.tdict['a'], 0)
+        self.assertEqual(self.tdict[1], 'b')
+        self.assertEqual(self.tdict[10 ** 12], 'c')
+        self.assertEqual(self.tdict[-5], 'd')
+        self.assertEqual(self.tdict[True], 'b')
+        self.assertRaises(KeyError, self.tdict.__getitem__, 2)
+        self.assertRaises(KeyError, self.tdict.__getitem__, 1.0)
+        self.assertRaises(KeyError, self.tdict.__getitem__, 'e')
+
+    def test_set_item(self):
+        self.tdict['a'] = 1
+        self.tdict['e'] = 10 ** 12
+
+        self.assertViewEqualO(self.tdict.items(), [('a', 1), ('d', -5), ('e', 10 ** 12)])
+        self.assertRaises(TypeError, self.tdict.__setitem__, 1, 'a')
+        self.assertRaises(TypeError, self.tdict.__setitem__, 'f', 1.5)
+        self.assertRaises(OverflowError, self.tdict.__setitem__, 'f', 2 ** 64)
+
+    def test_overflow(self):
+        items = list(self.tdict.items())
+
+        self.assertRaises(OverflowError, self.tdict.__setitem__, 'f', 2 ** 63)
+        self.assertRaises(OverflowError, self.tdict.update, [('f', 2), ('g', -2 ** 63 - 1)])
+        self.assertRaises(OverflowError, IntTwoWayOrderedDict().__setitem__, 2 ** 63, 1)
+
+        # The failed assignments leave no trace in the columns
+        self.assertViewEqualO(self.tdict.items(), items + [('f', 2)])
+        self.assertEqual(self.tdict['c'], 10 ** 12)
+        self.assertEqual(self.tdict[-5], 'd')
+        self.assertNotIn('g', self.tdict)
+
+        self.tdict['g'] = 3
+        self.assertEqual(self.tdict[3], 'g')
+        self.assertEqual(self.tdict['g'], 3)
+
+    def test_same_as_reference(self):
+        labels = [chr(ord('a') + index) for index in range(20)]
+
+        for choice in range(200):
+            self.tdict = StrIntTwoWayOrderedDict()
+            reference = TwoWayOrderedDict()
+            rand = random.Random(choice)
+
+            for _ in range(50):
+                key, value = rand.choice(labels), rand.randrange(-3, 20)
+
+                if rand.random() < 0.7:
+                    self.tdict[key] = value
+                    reference[key] = value
+                elif key in reference:
+                    del self.tdict[key]
+                    del reference[key]
+                elif reference:
+                    last = rand.random() < 0.5
+                    self.assertEqual(self.tdict.popitem(last), reference.popitem(last))
+
+                self.assertEqual(list(self.tdict.items()), list(reference.items()))
+                self.assertEqual(list(reversed(self.tdict)), list(reversed(reference)))
+
+    def test_update(self):
+        reference = TwoWayOrderedDict(self.tdict.items())
+
+        pairs = [('k{0}'.format(index), index + 2) for index in range(5000)]
+        self.tdict.update(pairs, z=3)
+        reference.update(pairs, z=3)
+
+        self.assertEqual(list(self.tdict.items()), list(reference.items()))
+
+        # Collisions go through __setitem__
+        self.tdict.update([('a', 5), ('x', 0), ('k7', 7)])
+        reference.update([('a', 5), ('x', 0), ('k7', 7)])
+
+        self.assertEqual(list(self.tdict.items()), list(reference.items()))
+        self.assertEqual(len(self.tdict), len(reference))
+
+    def test_views(self):
+        self.assertViewEqualO(self.tdict.keys(), ['a', 'b', 'c', 'd'])
+        self.assertViewEqualO(reversed(self.tdict.values()), [-5, 10 ** 12, 1, 0])
+        self.assertIn(('b', 1), self.tdict.items())
+        self.assertNotIn(('b', 0), self.tdict.items())
+        self.assertIn(1, self.tdict.values())
+        self.assertNotIn(1, self.tdict.keys())
+        self.assertIn(1, self.tdict)
+
+    def test_values_buffer(self):
+        del self.tdict['b']
+
+        with self.tdict.values_buffer() as ids:
+            self.assertEqual(ids.format, 'q')
+            self.assertEqual(ids.tolist(), [0, 10 ** 12, -5])
+            self.assertRaises(BufferError, self.tdict.__setitem__, 'e', 2)
+            self.assertRaises(BufferError, self.tdict.__delitem__, 'a')
+
+        self.tdict['e'] = 2
+        self.assertEqual(list(self.tdict.items()), [('a', 0), ('c', 10 ** 12), ('d', -5), ('e', 2)])
+
+    def test_compaction(self):
+        self.tdict.update(('k{0}'.format(index), index + 2) for index in range(100))
+
+        for index in range(95):
+            del self.tdict['k{0}'.format(index)]
+
+        self.assertLess(len(self.tdict._alive), 50)
+        self.assertEqual(self.tdict[101], 'k99')
+        self.assertEqual(self.tdict.popitem(last=False), ('a', 0))
+
+    def test_pickle(self):
+        self.assertEqual(pickle.loads(pickle.dumps(self.tdict)), self.tdict)
+        self.assertEqual(self.tdict.copy(), self.tdict)
+        self.assertNotEqual(self.tdict, StrIntTwoWayOrderedDict())
+
+    def test_equal_any_order(self):
+        self.assertEqual(self.tdict, StrIntTwoWayOrderedDict(reversed(list(self.tdict.items()))))
+        self.assertNotEqual(self.tdict, StrIntTwoWayOrderedDict([('a', 0), ('b', 1), ('c', 10 ** 12), ('d', -6)]))
+        self.assertNotEqual(self.tdict, StrIntTwoWayOrderedDict([('a', 0), ('b', 1), ('c', 10 ** 12)]))
+
+
+class TestIntTwoWayOrderedDict(unittest.TestCase, ExtraAssertions):
+
+    """Test case for the IntTwoWayOrderedDict class."""
+
+    def test_same_as_reference(self):
+        self.assertSameAsReference(IntTwoWayOrderedDict, operations=1000, integers=True)
+
+    def test_two_way(self):
+        tdict = IntTwoWayOrderedDict([(1, 2), (3, 3), (-1, 10 ** 15)])
+
+        self.assertEqual(tdict[1], 2)
+        self.assertEqual(tdict[2], 1)
+        self.assertEqual(tdict[3], 3)
+        self.assertEqual(tdict[10 ** 15], -1)
+        self.assertRaises(TypeError, tdict.__setitem__, 'a', 1)
+
+        tdict[2] = 3
+        self.assertEqual(list(tdict.items()), [(-1, 10 ** 15), (2, 3)])
+
+    def test_buffers(self):
+        tdict = IntTwoWayOrderedDict(zip(range(10), range(10, 20)))
+        del tdict[0]
+
+        keys = tdict.keys_buffer()
+        self.assertEqual(keys.tolist(), list(range(1, 10)))
+        self.assertEqual(tdict.values_buffer().tolist(), list(range(11, 20)))
+
+        self.assertRaises(BufferError, tdict.popitem)
+        keys.release()
+
+        self.assertEqual(tdict.popitem(), (9, 19))
+
+
+class TestDumpLoad(unittest.TestCase):
+
+    """Test case for the dump() & load() functions."""
+
+    def roundtrip(self, tdict, cls=TwoWayOrderedDict):
+        fileobj = io.BytesIO()
+        dump(tdict, fileobj)
+        fileobj.seek(0)
+
+        result = load(fileobj, cls)
+
+        self.assertEqual(list(result.items()), list(tdict.items()))
+        self.assertEqual(dict(dict.items(result)), dict(dict.items(tdict)))
+
+        return result
+
+    def test_str_int(self):
+        self.roundtrip(TwoWayOrderedDict((u'k\u00e9{0}'.format(i), i) for i in range(100)))
+
+    def test_int_int(self):
+        self.roundtrip(TwoWayOrderedDict((i, -i - 1) for i in range(100)))
+
+    def test_str_str(self):
+        self.roundtrip(TwoWayOrderedDict([('a', ''), ('b', 'b'), ('\ud800', 'c')]))
+
+    def test_mixed_types(self):
+        items = [(None, 2 ** 70), (True, 1.5), (b'x', (1, 2)), ('d', -2 ** 63)]
+        self.roundtrip(TwoWayOrderedDict(items))
+
+    def test_empty(self):
+        self.roundtrip(TwoWayOrderedDict())
+
+    def test_cls(self):
+        result = self.roundtrip(TwoWayOrderedDict(a=1), CompactTwoWayOrderedDict)
+        self.assertIsInstance(result, CompactTwoWayOrderedDict)
+
+    def test_factory(self):
+        result = self.roundtrip(TwoWayOrderedDict(a=1), functools.partial(BoundedTwoWayOrderedDict, 10))
+        self.assertEqual(result.maxsize, 10)
+
+        # Classes that need arguments can't create the empty mapping
+        self.assertRaises(TypeError, self.roundtrip, TwoWayOrderedDict(a=1), BoundedTwoWayOrderedDict)
+
+    def test_invalid_file(self):
+        self.assertRaises(ValueError, load, io.BytesIO(b'not a dump at all'))
+
+    def test_truncated_file(self):
+        fileobj = io.BytesIO()
+        dump(TwoWayOrderedDict(a=1, b=2), fileobj)
+
+        self.assertRaises(ValueError, load, io.BytesIO(fileobj.getvalue()[:-1]))
+
+
+class TestStream(unittest.TestCase, ExtraAssertions):
+
+    """Test case for the from_pairs_stream() & to_stream() methods."""
+
+    def setUp(self):
+        rand = random.Random(0)
+        # Collides with itself, so the result must match the assignments
+        self.pairs = [(rand.randrange(500), rand.randrange(500)) for _ in range(1000)]
+        self.text = u"".join(u"{0}\t{1}\n".format(key, value) for key, value in self.pairs)
+
+    def test_chunks(self):
+        reference = TwoWayOrderedDict()
+
+        for key, value in self.pairs:
+            reference[key] = value
+
+        for chunk_size in (1, 7, 100, 1 << 20):
+            for fileobj in (io.StringIO(self.text), io.BytesIO(self.text.encode("utf-8"))):
+                tdict = TwoWayOrderedDict.from_pairs_stream(fileobj, converters=(int, int), chunk_size=chunk_size)
+                self.assertEqual(list(tdict.items()), list(reference.items()))
+
+    def test_str_fields(self):
+        text = u"a b c\r\n\n\u00e9 1\nlast 2"
+        tdict = TwoWayOrderedDict.from_pairs_stream(io.BytesIO(text.encode("utf-8")), sep=u" ", chunk_size=2)
+
+        self.assertViewEqualO(tdict.items(), [(u'a', u'b c'), (u'\u00e9', u'1'), (u'last', u'2')])
+
+    def test_converters(self):
+        fileobj = io.StringIO(u"1\ta\n2\tb\n")
+        tdict = TwoWayOrderedDict.from_pairs_stream(fileobj, converters=(int, None))
+
+        self.assertViewEqualO(tdict.items(), [(1, u'a'), (2, u'b')])
+
+    def test_progress(self):
+        reports = []
+        TwoWayOrderedDict.from_pairs_stream(io.StringIO(self.text), chunk_size=1000,
+                                            progress=lambda *report: reports.append(report))
+
+        self.assertEqual(reports[-1], (1000, len(self.text)))
+        self.assertEqual(reports, sorted(reports))
+
+    def test_factory(self):
+        factory = functools.partial(BoundedTwoWayOrderedDict, 2)
+        tdict = BoundedTwoWayOrderedDict.from_pairs_stream(io.StringIO(u"a\t1\nb\t2\nc\t3\n"), factory=factory)
+
+        self.assertIsInstance(tdict, BoundedTwoWayOrderedDict)
+        self.assertViewEqualO(tdict.items(), [(u'b', u'2'), (u'c', u'3')])
+
+        self.assertRaises(TypeError, BoundedTwoWayOrderedDict.from_pairs_stream, io.StringIO(u"a\t1\n"))
+
+    def test_missing_separator(self):
+        fileobj = io.StringIO(u"a\t1\n\nb\n")
+        with self.assertRaises(ValueError) as context:
+            TwoWayOrderedDict.from_pairs_stream(fileobj)
+
+        self.assertIn("line 3", str(context.exception))
+
+    def test_cls(self):
+        tdict = CompactTwoWayOrderedDict.from_pairs_stream(io.StringIO(self.text))
+        self.assertIsInstance(tdict, CompactTwoWayOrderedDict)
+
+    def test_roundtrip(self):
+        tdict = TwoWayOrderedDict(self.pairs)
+        reports = []
+
+        for fileobj in (io.StringIO(), io.BytesIO()):
+            self.assertEqual(tdict.to_stream(fileobj, batch_size=64, progress=lambda *report: reports.append(report)),
+                             len(tdict))
+
+            fileobj.seek(0)
+            result = TwoWayOrderedDict.from_pairs_stream(fileobj, converters=(int, int))
+            self.assertEqual(list(result.items()), list(tdict.items()))
+
+        self.assertEqual(reports[-1][0], len(tdict))
+
+    def test_unsafe_fields(self):
+        for tdict in (TwoWayOrderedDict(a=u'b\tc'), TwoWayOrderedDict(a=u'b\nc')):
+            self.assertRaises(ValueError, tdict.to_stream, io.StringIO())
+
+        fileobj = io.StringIO()
+        TwoWayOrderedDict([(1, 2)]).to_stream(fileobj, sep=u",", converters=(hex, None))
+        self.assertEqual(fileobj.getvalue(), u"0x1,2\n")
+
+
+class TestFrozenTwoWayOrderedDict(unittest.TestCase, ExtraAssertions):
+
+    """Test case for the FrozenTwoWayOrderedDict class."""
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'tdict.2wof')
+
+        self.tdict = TwoWayOrderedDict([('a', 1), ('b', 'b'), (None, 2.5), (b'x', (1, 2))])
+        self.frozen = FrozenTwoWayOrderedDict.build(self.tdict, self.path)
+
+    def tearDown(self):
+        self.frozen.close()
+        shutil.rmtree(self.directory)
+
+    def test_get_item(self):
+        for key, value in self.tdict.items():
+            self.assertEqual(self.frozen[key], value)
+            self.assertEqual(self.frozen[value], key)
+
+    def test_get_item_not_exist(self):
+        self.assertRaises(KeyError, self.frozen.__getitem__, 'c')
+        self.assertRaises(TypeError, self.frozen.__getitem__, [])
+
+    def test_get_item_equal_numbers(self):
+        self.assertEqual(self.frozen[1.0], 'a')
+        self.assertEqual(self.frozen[True], 'a')
+
+    def test_read_only(self):
+        with self.assertRaises(TypeError):
+            self.frozen['c'] = 3
+
+    def test_length(self):
+        self.assertEqual(len(self.frozen), 4)
+
+    def test_iter(self):
+        self.assertEqual(list(self.frozen), list(self.tdict))
+        self.assertEqual(list(reversed(self.frozen)), list(reversed(self.tdict)))
+
+    def test_views(self):
+        self.assertViewEqualO(self.frozen.items(), list(self.tdict.items()))
+        self.assertViewEqualO(self.frozen.values(), list(self.tdict.values()))
+
+        self.assertIn('a', self.frozen.keys())
+        self.assertNotIn(1, self.frozen.keys())
+        self.assertIn(1, self.frozen.values())
+        self.assertNotIn('a', self.frozen.values())
+        self.assertIn(('b', 'b'), self.frozen.items())
+        self.assertNotIn((1, 'a'), self.frozen.items())
+
+    def test_contains(self):
+        self.assertIn('a', self.frozen)
+        self.assertIn(1, self.frozen)
+        self.assertNotIn('c', self.frozen)
+
+    def test_many_items(self):
+        tdict = TwoWayOrderedDict(('k{0}'.format(i), i) for i in range(1000))
+
+        with FrozenTwoWayOrderedDict.build(tdict, self.path + '.big') as frozen:
+            self.assertEqual(len(frozen), 1000)
+            self.assertEqual([frozen[i] for i in range(0, 1000, 7)],
+                             ['k{0}'.format(i) for i in range(0, 1000, 7)])
+            self.assertEqual(list(frozen.items()), list(tdict.items()))
+
+    def test_empty(self):
+        with FrozenTwoWayOrderedDict.build(TwoWayOrderedDict(), self.path + '.empty') as frozen:
+            self.assertEqual(len(frozen), 0)
+            self.assertNotIn('a', frozen)
+
+    def test_pickle(self):
+        frozen = pickle.loads(pickle.dumps(self.frozen))
+        self.assertEqual(frozen, self.frozen)
+        frozen.close()
+
+    def test_equal_any_order(self):
+        items = list(self.tdict.items())
+
+        with FrozenTwoWayOrderedDict.build(TwoWayOrderedDict(reversed(items)), self.path + '.reversed') as frozen:
+            self.assertEqual(frozen, self.frozen)
+
+        with FrozenTwoWayOrderedDict.build(TwoWayOrderedDict(items[1:]), self.path + '.short') as frozen:
+            self.assertNotEqual(frozen, self.frozen)
+
+    def test_invalid_file(self):
+        with open(self.path, 'wb') as fileobj:
+            fileobj.write(b'not a frozen dict')
+
+        self.assertRaises(ValueError, FrozenTwoWayOrderedDict, self.path)
+
+
+def _shared_reader(tdict, event, queue):
+    """Read the SharedTwoWayOrderedDict from another process."""
+    tdict = pickle.loads(pickle.dumps(tdict))
+    event.wait()
+    queue.put((tdict['late'], list(tdict.items())))
+    tdict.close()
+
+
+@unittest.skipIf(twodict.shared_memory is None, "multiprocessing.shared_memory is not available")
+class TestSharedTwoWayOrderedDict(unittest.TestCase, ExtraAssertions):
+
+    """Test case for the SharedTwoWayOrderedDict class."""
+
+    def setUp(self):
+        self.created = []
+        self.tdict = self.create(8, [('a', 1), ('b', 'b'), (None, 2.5), (b'x', (1, 2))])
+
+    def tearDown(self):
+        for tdict in self.created:
+            tdict.close()
+            tdict.unlink()
+
+    def create(self, capacity=64, items=()):
+        tdict = SharedTwoWayOrderedDict.create(capacity, items)
+        self.created.append(tdict)
+        return tdict
+
+    def test_same_as_reference(self):
+        self.assertSameAsReference(self.create, operations=1000)
+
+    def test_get_item(self):
+        self.assertEqual(self.tdict['a'], 1)
+        self.assertEqual(self.tdict[2.5], None)
+        self.assertEqual(self.tdict[(1, 2)], b'x')
+        self.assertEqual(self.tdict[True], 'a')
+        self.assertRaises(KeyError, self.tdict.__getitem__, 'c')
+        self.assertRaises(TypeError, self.tdict.__getitem__, [])
+
+    def test_views(self):
+        self.assertViewEqualO(self.tdict.keys(), ['a', 'b', None, b'x'])
+        self.assertViewEqualO(self.tdict.values(), [1, 'b', 2.5, (1, 2)])
+        self.assertIn(('b', 'b'), self.tdict.items())
+        self.assertIn(2.5, self.tdict.values())
+        self.assertNotIn(2.5, self.tdict.keys())
+        self.assertEqual(list(reversed(self.tdict)), [b'x', None, 'b', 'a'])
+
+    def test_attach(self):
+        other = SharedTwoWayOrderedDict(self.tdict.name)
+        self.tdict['c'] = 3
+        del self.tdict['a']
+
+        self.assertEqual(other, self.tdict)
+        self.assertEqual(other.copy(), TwoWayOrderedDict(self.tdict.items()))
+        other.close()
+
+    def test_equal_any_order(self):
+        items = list(self.tdict.items())
+
+        self.assertEqual(self.create(8, reversed(items)), self.tdict)
+        self.assertNotEqual(self.create(8, items[1:]), self.tdict)
+        self.assertNotEqual(self.create(8, items[1:] + [('a', 2)]), self.tdict)
+
+    def test_capacity(self):
+        self.tdict.update([('c', 3), ('d', 4), ('e', 5), ('f', 6)])
+
+        self.assertRaises(ValueError, self.tdict.__setitem__, 'g', 7)
+
+        # Deleted entries are reused once the ordering array is compacted
+        for index in range(20):
+            del self.tdict['c']
+            self.tdict['c'] = 'value{0}'.format(index)
+
+        self.assertEqual(self.tdict.popitem(), ('c', 'value19'))
+        self.assertEqual(self.tdict.popitem(last=False), ('a', 1))
+        self.assertEqual(len(self.tdict), 6)
+
+    def test_deleted_slots(self):
+        # Every value update leaves a deleted slot in the inverse table
+        tdict = self.create(1, [('a', 0)])
+
+        for index in range(100):
+            tdict['a'] = index
+
+        self.assertEqual(tdict['a'], 99)
+        self.assertEqual(tdict[99], 'a')
+
+        tdict = self.create(1000, [(key, 0) for key in range(10)])
+
+        for index in range(5000):
+            tdict[index % 10] = 'value{0}'.format(index)
+
+        self.assertEqual(len(tdict), 10)
+        self.assertEqual(tdict[9], 'value4999')
+        self.assertEqual(tdict['value4990'], 0)
+        self.assertNotIn('c', tdict)
+
+    def test_record_size(self):
+        self.assertRaises(ValueError, self.tdict.__setitem__, 'long' * 20, 1)
+        self.assertEqual(len(self.tdict), 4)
+
+    def test_invalid_block(self):
+        block = twodict.shared_memory.SharedMemory(create=True, size=64)
+
+        try:
+            self.assertRaises(ValueError, SharedTwoWayOrderedDict, block.name)
+        finally:
+            block.close()
+            block.unlink()
+
+    def test_unrelated_process(self):
+        # The resource tracker of a process that only attached to the block
+        # must not unlink it at exit, stop it to let it run its cleanup now
+        code = ("import twodict\n"
+                "from multiprocessing import resource_tracker\n"
+                "tdict = twodict.SharedTwoWayOrderedDict({0!r})\n"
+                "assert tdict['a'] == 1\n"
+                "tdict.close()\n"
+                "getattr(resource_tracker._resource_tracker, '_stop', lambda: None)()\n").format(self.tdict.name)
+
+        subprocess.check_call([sys.executable, '-c', code], cwd=os.path.dirname(os.path.abspath(twodict.__file__)))
+
+        other = SharedTwoWayOrderedDict(self.tdict.name)
+        self.assertEqual(other, self.tdict)
+        other.close()
+
+    def test_other_process(self):
+        event = multiprocessing.Event()
+        queue = multiprocessing.Queue()
+
+        process = multiprocessing.Process(target=_shared_reader, args=(self.tdict, event, queue))
+        process.start()
+
+        self.tdict['late'] = 'update'
+        event.set()
+
+        late, items = queue.get(timeout=30)
+        process.join()
+
+        self.assertEqual(late, 'update')
+        self.assertEqual(items, list(self.tdict.items()))
+
+
+@unittest.skipIf(twodict.sqlite3 is None, "sqlite3 is not available")
+class TestDiskTwoWayOrderedDict(unittest.TestCase, ExtraAssertions):
+
+    """Test case for the DiskTwoWayOrderedDict class."""
+
+    def setUp(self):
+        self.tempdir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tempdir, 'pairs.db')
+        self.opened = []
+        self.tdict = self.open(self.path, [('a', 1), ('b', 'b'), (None, 2.5), (b'x', (1, 2))])
+
+    def tearDown(self):
+        for tdict in self.opened:
+            tdict.close()
+
+        shutil.rmtree(self.tempdir)
+
+    def open(self, *args, **kwargs):
+        tdict = DiskTwoWayOrderedDict(*args, **kwargs)
+        self.opened.append(tdict)
+        return tdict
+
+    def test_same_as_reference(self):
+        self.assertSameAsReference(lambda: self.open(cache_size=4, batch_size=7), operations=1000)
+
+    def test_get_item(self):
+        self.assertEqual(self.tdict['a'], 1)
+        self.assertEqual(self.tdict[2.5], None)
+        self.assertEqual(self.tdict[(1, 2)], b'x')
+        self.assertEqual(self.tdict[True], 'a')
+        self.assertEqual(self.tdict[1.0], 'a')
+        self.assertRaises(KeyError, self.tdict.__getitem__, 'c')
+        self.assertRaises(TypeError, self.tdict.__getitem__, [])
+
+    def test_views(self):
+        self.assertViewEqualO(self.tdict.keys(), ['a', 'b', None, b'x'])
+        self.assertViewEqualO(self.tdict.values(), [1, 'b', 2.5, (1, 2)])
+        self.assertViewEqualO(reversed(self.tdict.items()), [(b'x', (1, 2)), (None, 2.5), ('b', 'b'), ('a', 1)])
+        self.assertEqual(list(reversed(self.tdict)), [b'x', None, 'b', 'a'])
+        self.assertIn(('b', 'b'), self.tdict.items())
+        self.assertNotIn((1, 'a'), self.tdict.items())
+        self.assertIn(2.5, self.tdict.values())
+        self.assertNotIn(2.5, self.tdict.keys())
+
+    def test_update(self):
+        pairs = [('k{0}'.format(index), index) for index in range(1000)]
+        # Collides with the stored pairs and inside the batch
+        pairs[500:502] = [('a', 'k3'), ('c', 'd'), ('d', 'c')]
+
+        reference = TwoWayOrderedDict(self.tdict.items())
+        reference.update(pairs, e=5)
+        self.tdict.update(pairs, e=5)
+
+        self.assertEqual(list(self.tdict.items()), list(reference.items()))
+        self.assertEqual(len(self.tdict), len(reference))
+
+    def test_popitem(self):
+        self.assertEqual(self.tdict.popitem(), (b'x', (1, 2)))
+        self.assertEqual(self.tdict.popitem(last=False), ('a', 1))
+        self.assertEqual(self.tdict.pop('b'), 'b')
+        self.assertEqual(self.tdict.pop(2.5), None)
+        self.assertRaises(KeyError, self.tdict.popitem)
+
+    def test_reopen(self):
+        del self.tdict['b']
+        self.tdict['c'] = 3
+        self.tdict.close()
+
+        tdict = self.open(self.path)
+
+        self.assertEqual(list(tdict.items()), [('a', 1), (None, 2.5), (b'x', (1, 2)), ('c', 3)])
+        self.assertEqual(tdict.copy(), TwoWayOrderedDict(tdict.items()))
+        self.assertEqual(tdict[3], 'c')
+
+    def test_batched_writes(self):
+        tdict = self.open(os.path.join(self.tempdir, 'batched.db'), batch_size=2)
+        reader = twodict.sqlite3.connect(tdict.path)
+
+        def stored():
+            return reader.execute("SELECT COUNT(*) FROM pairs").fetchone()[0]
+
+        tdict['a'] = 1
+        self.assertEqual(stored(), 0)
+
+        tdict['b'] = 2
+        self.assertEqual(stored(), 2)
+
+        tdict.clear()
+        tdict.flush()
+        self.assertEqual(stored(), 0)
+
+        reader.close()
+
+    def test_unhashable(self):
+        self.assertRaises(TypeError, self.tdict.__setitem__, 'c', [])
+
+        self.tdict['c'] = 3
+        self.tdict.flush()
+
+        self.assertEqual(len(self.tdict), 5)
+
+    def test_format_version(self):
+        self.tdict.close()
+
+        database = twodict.sqlite3.connect(self.path)
+        database.execute("PRAGMA user_version = 99")
+        database.close()
+
+        self.assertRaises(ValueError, DiskTwoWayOrderedDict, self.path)
+
+
+class TestConcurrentTwoWayOrderedDict(unittest.TestCase, ExtraAssertions):
+
+    """Test case for the ConcurrentTwoWayOrderedDict class."""
+
+    def setUp(self):
+        self.tdict = ConcurrentTwoWayOrderedDict([('a', 1), ('b', 'b'), ('c', 3)])
+
+    def test_same_as_reference(self):
+        self.assertSameAsReference(ConcurrentTwoWayOrderedDict, operations=500)
+
+    def test_methods(self):
+        self.assertEqual(self.tdict.setdefault('d', 4), 4)
+        self.assertEqual(self.tdict.pop(1), 'a')
+        self.assertEqual(self.tdict.popitem(last=False), ('b', 'b'))
+        self.assertEqual(self.tdict.get('x'), None)
+        self.assertIn(3, self.tdict.values())
+        self.assertViewEqualO(self.tdict.items(), [('c', 3), ('d', 4)])
+        self.assertEqual(list(reversed(self.tdict)), ['d', 'c'])
+        self.assertEqual(self.tdict.copy(), self.tdict)
+        self.assertEqual(pickle.loads(pickle.dumps(self.tdict)), self.tdict)
+
+    def test_iteration_is_snapshot(self):
+        for index, key in enumerate(self.tdict):
+            self.tdict['new' + key] = 'value{0}'.format(index)
+
+        self.assertEqual(len(self.tdict), 6)
+
+    def test_stress(self):
+        switch_interval = sys.getswitchinterval()
+        sys.setswitchinterval(1e-6)
+
+        errors = []
+
+        def worker(seed):
+            rand = random.Random(seed)
+
+            try:
+                for _ in range(2000):
+                    key, value = rand.randrange(50), 'v{0}'.format(rand.randrange(50))
+                    choice = rand.random()
+
+                    if choice < 0.5:
+                        self.tdict[key] = value
+                    elif choice < 0.6:
+                        self.tdict.pop(key, None)
+                    elif choice < 0.7:
+                        self.tdict.setdefault(key, value)
+                    else:
+                        # Every snapshot must be a consistent one to one mapping
+                        items = list(self.tdict.items())
+                        assert len(set(key for key, _ in items)) == len(items)
+                        assert len(set(value for _, value in items)) == len(items)
+            except Exception as error:
+                errors.append(error)
+
+        try:
+            threads = [threading.Thread(target=worker, args=(seed,)) for seed in range(8)]
+
+            for thread in threads:
+                thread.start()
+
+            for thread in threads:
+                thread.join()
+        finally:
+            sys.setswitchinterval(switch_interval)
+
+        self.assertEqual(errors, [])
+
+        items = list(self.tdict.items())
+        storage = dict(dict.items(self.tdict))
+
+        self.assertEqual(len(items), len(self.tdict))
+        self.assertEqual(len(storage), sum(2 if key != value else 1 for key, value in items))
+
+        for key, value in items:
+            self.assertEqual(storage[key], value)
+            self.assertEqual(storage[value], key)
+
+
+class TestBoundedTwoWayOrderedDict(unittest.TestCase, ExtraAssertions):
+
+    """Test case for the BoundedTwoWayOrderedDict class."""
+
+    def setUp(self):
+        self.evicted = []
+        self.lru = BoundedTwoWayOrderedDict(3, [('a', 1), ('b', 2), ('c', 3)], on_evict=self.on_evict)
+        self.lfu = BoundedTwoWayOrderedDict(3, [('a', 1), ('b', 2), ('c', 3)],
+                                            policy=BoundedTwoWayOrderedDict.LFU, on_evict=self.on_evict)
+
+    def on_evict(self, key, value):
+        self.evicted.append((key, value))
+
+    def test_invalid_arguments(self):
+        self.assertRaises(ValueError, BoundedTwoWayOrderedDict, 0)
+        self.assertRaises(ValueError, BoundedTwoWayOrderedDict, 1, policy='fifo')
+
+    def test_lru_eviction(self):
+        self.lru['d'] = 4
+
+        self.assertEqual(self.evicted, [('a', 1)])
+        self.assertViewEqualO(self.lru.items(), [('b', 2), ('c', 3), ('d', 4)])
+        self.assertNotIn(1, self.lru)
+
+    def test_lru_access_by_key_and_value(self):
+        self.lru['a']
+        self.lru[2]
+        self.lru['e'] = 5
+
+        self.assertEqual(self.evicted, [('c', 3)])
+        self.assertViewEqualO(self.lru.items(), [('a', 1), ('b', 2), ('e', 5)])
+
+    def test_lru_assignment_is_access(self):
+        self.lru['a'] = 10
+        self.lru['d'] = 4
+
+        self.assertEqual(self.evicted, [('b', 2)])
+        self.assertViewEqualO(self.lru.items(), [('c', 3), ('a', 10), ('d', 4)])
+
+    def test_lfu_eviction(self):
+        for _ in range(3):
+            self.lfu['a']
+
+        self.lfu[2]
+        self.lfu['d'] = 4
+        self.lfu['e'] = 5
+
+        self.assertEqual(self.evicted, [('c', 3), ('d', 4)])
+        self.assertViewEqualO(self.lfu.items(), [('a', 1), ('b', 2), ('e', 5)])
+
+    def test_lfu_removed_keys(self):
+        self.lfu['a']
+        del self.lfu[1]
+        self.assertEqual(self.lfu.pop('b'), 2)
+
+        # Implicitly removes ('c', 3)
+        self.lfu['d'] = 'c'
+        self.lfu['e'] = 5
+        self.lfu['f'] = 6
+        self.lfu['g'] = 7
+
+        self.assertEqual(self.evicted, [('d', 'c')])
+        self.assertViewEqualO(self.lfu.items(), [('e', 5), ('f', 6), ('g', 7)])
+        self.assertEqual(set(self.lfu._counts), set(self.lfu.keys()))
+
+    def test_lfu_same_pair(self):
+        # Key & value both belong to ('a', 1)
+        self.lfu['a']
+        self.lfu[1] = 'a'
+
+        self.assertViewEqualO(self.lfu.items(), [('b', 2), ('c', 3), (1, 'a')])
+        self.assertEqual(set(self.lfu._counts), set(self.lfu.keys()))
+        self.assertEqual(self.lfu._counts[1], 1)
+
+    def test_no_access(self):
+        'a' in self.lru
+        list(self.lru.items())
+        list(self.lru.values())
+        self.lru.pop('b')
+        self.lru['d'] = 4
+        self.lru['e'] = 5
+
+        self.assertEqual(self.evicted, [('a', 1)])
+        self.assertEqual((self.lru.hits, self.lru.misses), (0, 0))
+
+    def test_counters(self):
+        self.lru['a']
+        self.lru.get(3)
+        self.lru.get('x')
+        self.assertRaises(KeyError, self.lru.__getitem__, 'y')
+        self.lru.update([('d', 4), ('e', 5)])
+
+        self.assertEqual((self.lru.hits, self.lru.misses, self.lru.evictions), (2, 2, 2))
+
+    def test_copy_and_pickle(self):
+        self.lfu['a']
+
+        for tdict in (self.lfu.copy(), pickle.loads(pickle.dumps(self.lfu))):
+            self.assertEqual(tdict, self.lfu)
+            self.assertEqual(tdict.maxsize, 3)
+            self.assertEqual(tdict.policy, BoundedTwoWayOrderedDict.LFU)
+
+        tdict = self.lfu.copy()
+        tdict['d'] = 4
+
+        self.assertEqual(self.evicted, [('b', 2)])
+        self.assertEqual(len(self.lfu), 3)
+
+    def test_same_as_reference(self):
+        rand = random.Random(0)
+        population = list(range(10)) + [chr(ord('a') + i) for i in range(10)]
+
+        reference = TwoWayOrderedDict()
+        tdict = BoundedTwoWayOrderedDict(5)
+
+        def touch(item):
+            key = item if item in reference.keys() else reference[item]
+            reference[key] = reference.pop(key)
+
+        for _ in range(2000):
+            choice = rand.random()
+
+            if choice < 0.5:
+                key, value = rand.choice(population), rand.choice(population)
+                reference[key] = value
+                touch(key)
+                tdict[key] = value
+
+                while len(reference) > 5:
+                    reference.popitem(last=False)
+            elif choice < 0.9 and reference:
+                item = rand.choice(list(reference) + list(reference.values()))
+                touch(item)
+                self.assertEqual(tdict[item], reference[item])
+            elif reference:
+                item = rand.choice(list(reference) + list(reference.values()))
+                del reference[item]
+                del tdict[item]
+
+            self.assertEqual(list(tdict.items()), list(reference.items()))
+            self.assertEqual(dict(dict.items(tdict)), dict(dict.items(reference)))
+
+
+class TestMove(unittest.TestCase, ExtraAssertions):
+
+    """Test case for the move_to_end(), move_before() & move_after() methods."""
+
+    CLASSES = [TwoWayOrderedDict, CompactTwoWayOrderedDict, ConcurrentTwoWayOrderedDict]
+
+    def setUp(self):
+        self.items = [('a', 1), ('b', 2), ('c', 3), ('d', 'd')]
+
+    def test_move_to_end(self):
+        for tdict_class in self.CLASSES:
+            tdict = tdict_class(self.items)
+
+            tdict.move_to_end('a')
+            tdict.move_to_end(3, last=False)
+            tdict.move_to_end('c')
+            tdict.move_to_end('d', last=False)
+
+            self.assertViewEqualO(tdict.items(), [('d', 'd'), ('b', 2), ('a', 1), ('c', 3)])
+            self.assertEqual(list(reversed(tdict)), ['c', 'a', 'b', 'd'])
+            self.assertEqual(tdict.popitem(last=False), ('d', 'd'))
+            self.assertRaises(KeyError, tdict.move_to_end, 'x')
+
+    def test_move_before_after(self):
+        for tdict_class in self.CLASSES:
+            tdict = tdict_class(self.items)
+
+            tdict.move_before('d', 'b')
+            tdict.move_after(1, 3)
+            tdict.move_after('b', 'b')
+
+            self.assertViewEqualO(tdict.items(), [('d', 'd'), ('b', 2), ('c', 3), ('a', 1)])
+
+            tdict.move_before('a', 'd')
+            tdict.move_after('d', 'c')
+
+            self.assertViewEqualO(tdict.items(), [('a', 1), ('b', 2), ('c', 3), ('d', 'd')])
+            self.assertEqual(list(reversed(tdict)), ['d', 'c', 'b', 'a'])
+            self.assertRaises(KeyError, tdict.move_before, 'a', 'x')
+            self.assertRaises(KeyError, tdict.move_after, 'x', 'a')
+
+    def test_same_as_reference(self):
+        rand = random.Random(0)
+
+        for tdict_class in self.CLASSES:
+            reference = []
+            tdict = tdict_class()
+
+            for _ in range(1000):
+                key = rand.randrange(30)
+
+                if key not in tdict:
+                    tdict[key] = -key - 1
+                    reference.append(key)
+                elif rand.random() < 0.2:
+                    del tdict[-key - 1]
+                    reference.remove(key)
+                elif rand.random() < 0.5:
+                    last = rand.random() < 0.5
+                    tdict.move_to_end(key if rand.random() < 0.5 else -key - 1, last)
+                    reference.remove(key)
+                    reference.insert(len(reference) if last else 0, key)
+                else:
+                    anchor = rand.choice(reference)
+                    after = rand.random() < 0.5
+
+                    if after:
+                        tdict.move_after(key, -anchor - 1)
+                    else:
+                        tdict.move_before(-key - 1, anchor)
+
+                    if key != anchor:
+                        reference.remove(key)
+                        reference.insert(reference.index(anchor) + after, key)
+
+                self.assertEqual(list(tdict), reference)
+                self.assertEqual(list(reversed(tdict)), reference[::-1])
+                self.assertEqual(list(tdict.values()), [-key - 1 for key in reference])
+
+
+class TestPositional(unittest.TestCase, ExtraAssertions):
+
+    """Test case for the index_of(), item_at() & islice() methods."""
+
+    CLASSES = [TwoWayOrderedDict, CompactTwoWayOrderedDict, IndexedTwoWayOrderedDict,
+               ConcurrentTwoWayOrderedDict]
+
+    def test_basic(self):
+        for tdict_class in self.CLASSES:
+            tdict = tdict_class([('a', 1), ('b', 2), ('c', 3), ('d', 'd')])
+
+            self.assertEqual(tdict.index_of('c'), 2)
+            self.assertEqual(tdict.index_of(2), 1)
+            self.assertEqual(tdict.item_at(0), ('a', 1))
+            self.assertEqual(tdict.item_at(-1), ('d', 'd'))
+            self.assertEqual(list(tdict.islice(1, 3)), [('b', 2), ('c', 3)])
+            self.assertEqual(list(tdict.islice(-2)), [('c', 3), ('d', 'd')])
+            self.assertEqual(list(tdict.islice(3, 1)), [])
+            self.assertRaises(KeyError, tdict.index_of, 'x')
+            self.assertRaises(IndexError, tdict.item_at, 4)
+            self.assertRaises(IndexError, tdict.item_at, -5)
+
+    def test_same_as_reference(self):
+        rand = random.Random(0)
+
+        for tdict_class in self.CLASSES:
+            reference = []
+            tdict = tdict_class()
+
+            for _ in range(2000):
+                choice = rand.random()
+                key = rand.randrange(100)
+
+                if choice < 0.4:
+                    if key not in tdict:
+                        reference.append(key)
+
+                    tdict[key] = -key - 1
+                elif choice < 0.6 and key in tdict:
+                    del tdict[key]
+                    reference.remove(key)
+                elif choice < 0.7 and key in tdict:
+                    last = rand.random() < 0.5
+                    tdict.move_to_end(key, last)
+                    reference.remove(key)
+                    reference.insert(len(reference) if last else 0, key)
+                elif choice < 0.75:
+                    tdict.update((key, -key - 1) for key in range(100, 100 + key) if key not in tdict)
+                    reference.extend(key for key in range(100, 100 + key) if key not in reference)
+                elif reference:
+                    index = rand.randrange(-len(reference), len(reference))
+                    start, stop = rand.randrange(-5, 105), rand.randrange(-5, 105)
+
+                    self.assertEqual(tdict.item_at(index)[0], reference[index])
+                    self.assertEqual(tdict.index_of(-reference[index] - 1), index % len(reference))
+                    self.assertEqual([key for key, _ in tdict.islice(start, stop)], reference[start:stop])
+
+            self.assertEqual(list(tdict), reference)
+
+    def test_indexed_same_as_reference(self):
+        self.assertSameAsReference(IndexedTwoWayOrderedDict)
+
+
+class TestJournaledTwoWayOrderedDict(unittest.TestCase, ExtraAssertions):
+
+    """Test case for the JournaledTwoWayOrderedDict class."""
+
+    def setUp(self):
+        self.tdict = JournaledTwoWayOrderedDict([('a', 1), ('b', 2), ('c', 3)])
+
+    def test_same_as_reference(self):
+        self.assertSameAsReference(JournaledTwoWayOrderedDict)
+
+    def test_records(self):
+        self.tdict['a'] = 10
+        self.tdict[2] = 'c'
+        del self.tdict[10]
+        self.tdict.popitem()
+        self.tdict.update(x=1, y=2)
+        self.tdict.move_before('y', 1)
+        self.tdict.clear()
+
+        self.assertEqual(self.tdict.version, 13)
+        self.assertEqual(self.tdict.deltas_since(3), [
+            (4, 'set', 'a', 10),
+            (5, 'evict', 'b', 2),
+            (6, 'evict', 'c', 3),
+            (7, 'set', 2, 'c'),
+            (8, 'delete', 'a', 10),
+            (9, 'delete', 2, 'c'),
+            (10, 'set', 'x', 1),
+            (11, 'set', 'y', 2),
+            (12, 'move_before', 'y', 'x'),
+            (13, 'clear', None, None),
+        ])
+        self.assertEqual(self.tdict.deltas_since(13), [])
+
+    def test_trimmed_journal(self):
+        self.tdict.max_deltas = 2
+
+        for index in range(10):
+            self.tdict['k{0}'.format(index)] = 'v{0}'.format(index)
+
+        self.assertEqual(self.tdict.deltas_since(11), [(12, 'set', 'k8', 'v8'), (13, 'set', 'k9', 'v9')])
+        self.assertRaises(ValueError, self.tdict.deltas_since, 0)
+        self.assertRaises(ValueError, self.tdict.deltas_since, 14)
+
+    def test_copy_and_pickle(self):
+        for tdict in (self.tdict.copy(), pickle.loads(pickle.dumps(self.tdict))):
+            replica = TwoWayOrderedDict()
+            replica.apply_deltas(tdict.deltas_since(0))
+
+            self.assertEqual(tdict, self.tdict)
+            self.assertViewEqualO(replica.items(), list(self.tdict.items()))
+
+    def test_empty_sync(self):
+        replica, version = TwoWayOrderedDict(self.tdict.items()), self.tdict.version
+
+        # Nothing changed, the replica stays at the same version
+        for _ in range(2):
+            version = replica.apply_deltas(self.tdict.deltas_since(version), version)
+            self.assertEqual(version, self.tdict.version)
+
+        self.assertIsNone(replica.apply_deltas([]))
+
+    def test_apply_unknown_operation(self):
+        self.assertRaises(ValueError, TwoWayOrderedDict().apply_deltas, [(1, 'merge', 'a', 1)])
+
+    def test_replication(self):
+        rand = random.Random(0)
+        population = list(range(20)) + [chr(ord('a') + i) for i in range(20)]
+
+        replicas = [(TwoWayOrderedDict(self.tdict.items()), self.tdict.version),
+                    (CompactTwoWayOrderedDict(), 0)]
+
+        for step in range(3000):
+            choice = rand.random()
+
+            if choice < 0.5:
+                self.tdict[rand.choice(population)] = rand.choice(population)
+            elif choice < 0.6:
+                self.tdict.update((rand.choice(population), rand.choice(population)) for _ in range(3))
+            elif choice < 0.7 and self.tdict:
+                del self.tdict[rand.choice(list(self.tdict))]
+            elif choice < 0.75 and self.tdict:
+                self.tdict.popitem(rand.random() < 0.5)
+            elif choice < 0.8 and self.tdict:
+                self.tdict.pop(rand.choice(list(self.tdict.values())))
+            elif choice < 0.9 and self.tdict:
+                self.tdict.move_to_end(rand.choice(list(self.tdict.values())), rand.random() < 0.5)
+            elif choice < 0.99 and self.tdict:
+                self.tdict.move_after(rand.choice(list(self.tdict)), rand.choice(list(self.tdict)))
+            else:
+                self.tdict.clear()
+
+            if step % 7 == 0:
+                for index, (replica, version) in enumerate(replicas):
+                    version = replica.apply_deltas(self.tdict.deltas_since(version), version)
+                    replicas[index] = replica, version
+
+                    self.assertEqual(version, self.tdict.version)
+                    self.assertViewEqualO(replica.items(), list(self.tdict.items()))
+                    self.assertEqual(dict(dict.items(replica)), dict(dict.items(self.tdict)))
+
+
+class TestInstrumentedTwoWayOrderedDict(unittest.TestCase, ExtraAssertions):
+
+    """Test case for the InstrumentedTwoWayOrderedDict class."""
+
+    def setUp(self):
+        self.tdict = InstrumentedTwoWayOrderedDict([('a', 1), ('b', 2)])
+
+    def counts(self):
+        return self.tdict.stats()['counts']
+
+    def test_same_as_reference(self):
+        self.assertSameAsReference(InstrumentedTwoWayOrderedDict)
+
+    def test_init_not_counted(self):
+        self.assertEqual(self.tdict.stats(), {'counts': {}, 'timings': {}})
+
+    def test_collision_branches(self):
+        self.tdict['a'] = 3
+        self.tdict[2] = 'c'
+        self.tdict['d'] = 'c'
+        self.tdict['e'] = 'e'
+        self.tdict['e'] = 4
+
+        self.assertEqual(self.counts(), {
+            'setitem': 5,
+            'set.key_exists': 2,
+            'set.key_is_value': 1,
+            'set.value_exists': 1,
+            'set.self_mapped': 2,
+            'implicit_evictions': 2
+        })
+        self.assertEqual(list(self.tdict.items()), [('a', 3), ('d', 'c'), ('e', 4)])
+
+    def test_operations(self):
+        self.tdict['a']
+        self.assertRaises(KeyError, self.tdict.__getitem__, 'c')
+        self.assertEqual(self.tdict.get('c', 5), 5)
+        self.assertIn('a', self.tdict)
+        self.assertEqual(list(reversed(self.tdict)), ['b', 'a'])
+        self.assertEqual(list(self.tdict.values()), [1, 2])
+        self.tdict.popitem()
+        self.tdict.clear()
+
+        counts = self.counts()
+
+        self.assertEqual(counts['getitem'], 3)
+        self.assertEqual(counts['getitem.miss'], 1)
+        self.assertEqual(counts['get.miss'], 1)
+        self.assertEqual(counts['contains'], 1)
+        self.assertEqual(counts['iterate'], 2)
+        self.assertEqual(counts['popitem'], 1)
+        self.assertEqual(counts['pop'], 1)
+        self.assertEqual(counts['delitem'], 1)
+        self.assertEqual(counts['clear'], 1)
+
+    def test_update(self):
+        self.tdict.update([('c', 3), ('d', 4)])
+        self.tdict.update([('e', 5), ('f', 'a')])
+
+        counts = self.counts()
+
+        self.assertEqual(counts['update'], 2)
+        self.assertEqual(counts['update.bulk_pairs'], 2)
+        self.assertEqual(counts['setitem'], 2)
+        self.assertEqual(counts['implicit_evictions'], 1)
+
+    def test_timings(self):
+        tdict = InstrumentedTwoWayOrderedDict(sample_every=2)
+
+        for index in range(10):
+            tdict[index] = -index - 1
+
+        for _ in tdict.items():
+            pass
+
+        list(tdict)
+
+        timings = tdict.stats()['timings']
+
+        self.assertEqual(timings['setitem']['samples'], 5)
+        self.assertEqual(timings['iterate']['samples'], 1)
+        self.assertGreaterEqual(timings['setitem']['max'], timings['setitem']['mean'])
+        self.assertNotIn('getitem', timings)
+        self.assertRaises(ValueError, InstrumentedTwoWayOrderedDict, sample_every=-1)
+
+    def test_reset_stats(self):
+        self.tdict['c'] = 3
+        self.tdict.reset_stats()
+
+        self.assertEqual(self.counts(), {})
+
+    def test_copy_pickle(self):
+        self.tdict.sample_every = 10
+
+        for tdict in (self.tdict.copy(), pickle.loads(pickle.dumps(self.tdict))):
+            self.assertIsInstance(tdict, InstrumentedTwoWayOrderedDict)
+            self.assertEqual(tdict, self.tdict)
+            self.assertEqual(tdict.sample_every, 10)
+
+
+class TestMultiIndexTwoWayOrderedDict(unittest.TestCase, ExtraAssertions):
+
+    """Test case for the MultiIndexTwoWayOrderedDict class."""
+
+    def setUp(self):
+        self.tdict = MultiIndexTwoWayOrderedDict([('apple', 3), ('apricot', 7), ('banana', 5)])
+        self.prices = self.tdict.add_index('prices', SortedIndex(SortedIndex.VALUES))
+        self.names = self.tdict.add_index('names', PrefixIndex())
+        self.letters = self.tdict.add_index('letters', HashIndex(lambda key: key[0]))
+
+    def assertIndexed(self, tdict=None):
+        """Compare every index with a full scan of the pairs."""
+        tdict = self.tdict if tdict is None else tdict
+        indexes = tdict.indexes
+        pairs = list(tdict.items())
+
+        by_value = sorted((value, key) for key, value in pairs if isinstance(value, int))
+        self.assertEqual(list(indexes['prices'].range()), [key for _, key in by_value])
+
+        strings = sorted(key for key, _ in pairs if isinstance(key, str))
+        self.assertEqual(list(indexes['names'].startswith('')), strings)
+
+        for letter in set(key[0] for key in strings):
+            self.assertEqual(sorted(indexes['letters'].lookup(letter)), [key for key in strings if key[0] == letter])
+
+    def test_queries(self):
+        self.assertEqual(list(self.prices.range(4, 8)), ['banana', 'apricot'])
+        self.assertEqual(list(self.prices.range(3, 7, inclusive=(False, False))), ['banana'])
+        self.assertEqual(list(self.prices.range(high=5, reverse=True)), ['banana', 'apple'])
+        self.assertEqual(list(self.prices.range(low=6)), ['apricot'])
+        self.assertEqual(list(self.names.startswith('ap')), ['apple', 'apricot'])
+        self.assertEqual(list(self.names.startswith('c')), [])
+        self.assertEqual(self.letters.lookup('a'), ['apple', 'apricot'])
+        self.assertEqual(self.letters.lookup('z'), [])
+
+    def test_implicit_evictions(self):
+        self.tdict['cherry'] = 3
+        self.tdict['blueberry'] = 7
+        self.tdict['banana'] = 6
+
+        self.assertEqual(list(self.tdict.items()), [('banana', 6), ('cherry', 3), ('blueberry', 7)])
+        self.assertIndexed()
+
+    def test_delete(self):
+        del self.tdict[7]
+        self.assertEqual(self.tdict.pop('apple'), 3)
+        self.assertIndexed()
+
+        self.tdict.clear()
+        self.assertEqual(len(self.prices), 0)
+        self.assertEqual(len(self.names), 0)
+        self.assertEqual(len(self.letters), 0)
+
+    def test_random_operations(self):
+        rand = random.Random(0)
+        keys = ['k{0}{1}'.format(letter, index) for letter in 'abc' for index in range(10)]
+
+        for _ in range(2000):
+            if rand.random() < 0.7:
+                self.tdict[rand.choice(keys)] = rand.randrange(40)
+            elif self.tdict:
+                del self.tdict[rand.choice(list(self.tdict))]
+
+        self.assertIndexed()
+
+    def test_update(self):
+        self.tdict.update([('cherry', 1), ('date', 2)])
+        self.tdict.update([('elder', 5), ('fig', 8)])
+
+        self.assertIndexed()
+
+    def test_failed_assignment(self):
+        items = list(self.tdict.items())
+
+        # 'x' can't be compared with the prices, nothing changes
+        self.assertRaises(TypeError, self.tdict.__setitem__, 'cherry', 'x')
+        self.assertRaises(TypeError, self.tdict.__setitem__, 'apple', 'x')
+        self.assertRaises(TypeError, self.tdict.update, [('cherry', 1), ('date', 'x')])
+
+        # Batches with collisions are checked as a whole as well
+        self.assertRaises(TypeError, self.tdict.update, [('cherry', 1), ('cherry', 2), ('date', 'x')])
+
+        self.assertEqual(list(self.tdict.items()), items)
+        self.assertIndexed()
+
+        tdict = MultiIndexTwoWayOrderedDict()
+        prices = tdict.add_index('prices', SortedIndex(SortedIndex.VALUES))
+
+        self.assertRaises(TypeError, tdict.update, [('cherry', 1), ('date', 'x')])
+        self.assertEqual(len(tdict), 0)
+        self.assertEqual(len(prices), 0)
+
+        # The pairs are deleted without errors afterwards
+        del self.tdict['apple']
+        self.assertIndexed()
+
+    def test_non_indexable(self):
+        tdict = MultiIndexTwoWayOrderedDict([('apple', 3), (10, 'date')])
+        names = tdict.add_index('names', PrefixIndex())
+        letters = tdict.add_index('letters', HashIndex(lambda key: key[0] if isinstance(key, str) else None))
+
+        # Objects that are not str (or mapped to None) are left out
+        self.assertEqual(list(names.startswith('')), ['apple'])
+        self.assertEqual(len(letters), 1)
+
+        # Pairs are indexed by their node key, here 'date' replaces 10
+        tdict['date'] = 4
+        self.assertEqual(list(names.startswith('')), ['apple', 'date'])
+        self.assertEqual(letters.lookup('d'), ['date'])
+
+    def test_same_index_key(self):
+        tdict = MultiIndexTwoWayOrderedDict([('Apple', 1), ('apple', 2)])
+        names = tdict.add_index('names', PrefixIndex(key_func=str.lower))
+
+        # Both pairs are indexed under 'apple'
+        self.assertEqual(len(names), 2)
+        self.assertEqual(list(names.startswith('ap')), ['Apple', 'apple'])
+
+        del tdict['Apple']
+        self.assertEqual(len(names), 1)
+        self.assertEqual(list(names.startswith('ap')), ['apple'])
+
+        # The length counts the pairs, not the groups
+        self.assertEqual(len(self.letters), 3)
+        self.assertEqual(self.letters.lookup('a'), ['apple', 'apricot'])
+
+    def test_add_remove_index(self):
+        self.assertRaises(ValueError, self.tdict.add_index, 'names', PrefixIndex())
+        self.assertRaises(ValueError, SortedIndex, 'neither')
+
+        self.assertIs(self.tdict.remove_index('names'), self.names)
+        self.assertEqual(sorted(self.tdict.indexes), ['letters', 'prices'])
+
+        self.tdict['cherry'] = 1
+        self.assertEqual(list(self.names.startswith('')), ['apple', 'apricot', 'banana'])
+
+    def test_copy_pickle(self):
+        self.tdict.remove_index('letters')
+        self.tdict.add_index('letters', HashIndex(len))
+
+        for tdict in (self.tdict.copy(), pickle.loads(pickle.dumps(self.tdict))):
+            self.assertEqual(tdict, self.tdict)
+            self.assertEqual(list(tdict.indexes['prices'].range()), list(self.prices.range()))
+
+            tdict['cherry'] = 1
+            self.assertEqual(list(self.prices.range(high=2)), [])
+
+    def test_sorted_list(self):
+        sorted_list = twodict._SortedList(load=4)
+        numbers = list(range(100))
+        random.Random(1).shuffle(numbers)
+
+        for number in numbers:
+            sorted_list.add(number)
+
+        for number in numbers[:50]:
+            sorted_list.remove(number)
+
+        rest = sorted(numbers[50:])
+        sorted_list.update([200, 150])
+
+        self.assertEqual(list(sorted_list), rest + [150, 200])
+        self.assertEqual(list(reversed(sorted_list)), (rest + [150, 200])[::-1])
+        self.assertEqual(sorted_list[3], rest[3])
+        self.assertEqual(sorted_list[-1], 200)
+        self.assertEqual(list(sorted_list.irange(10, 30)), [number for number in rest if 10 <= number <= 30])
+        self.assertEqual(list(sorted_list.irange(10, 30, reverse=True)),
+                         [number for number in rest if 10 <= number <= 30][::-1])
+        self.assertRaises(IndexError, sorted_list.__getitem__, 52)
+
+
+class TestSortedTwoWayDict(unittest.TestCase, ExtraAssertions):
+
+    """Test case for the SortedTwoWayDict class."""
+
+    def setUp(self):
+        self.tdict = SortedTwoWayDict([('d', 1), ('b', 4), ('a', 3), ('c', 2)])
+        self.by_value = SortedTwoWayDict(self.tdict, by=SortedTwoWayDict.VALUES)
+
+    def assertSorted(self, tdict, reference):
+        """Compare tdict with the reference TwoWayOrderedDict sorted by key or value."""
+        side = 0 if tdict.by == SortedTwoWayDict.KEYS else 1
+        items = sorted(reference.items(), key=lambda item: item[side])
+
+        self.assertEqual(list(tdict.items()), items)
+        self.assertEqual(list(reversed(tdict)), [key for key, _ in reversed(items)])
+        self.assertEqual(dict(dict.items(tdict)), dict(dict.items(reference)))
+        self.assertEqual(len(tdict), len(items))
+
+        for index, item in enumerate(items):
+            self.assertEqual(tdict.peekitem(index), item)
+            self.assertEqual(tdict.index_of(item[0]), index)
+
+    def test_order(self):
+        self.assertViewEqualO(self.tdict.items(), [('a', 3), ('b', 4), ('c', 2), ('d', 1)])
+        self.assertViewEqualO(self.by_value.items(), [('d', 1), ('c', 2), ('a', 3), ('b', 4)])
+        self.assertEqual(self.by_value.by, SortedTwoWayDict.VALUES)
+
+        self.assertRaises(ValueError, SortedTwoWayDict, by='neither')
+
+    def test_lookups(self):
+        self.assertEqual(self.tdict['a'], 3)
+        self.assertEqual(self.tdict[3], 'a')
+        self.assertEqual(self.by_value[4], 'b')
+
+    def test_random_operations(self):
+        for by in (SortedTwoWayDict.KEYS, SortedTwoWayDict.VALUES):
+            rand = random.Random(0)
+            reference = TwoWayOrderedDict()
+            tdict = SortedTwoWayDict(by=by)
+            tdict._items._load = 4
+
+            for _ in range(2000):
+                choice = rand.random()
+
+                if choice < 0.6:
+                    key, value = rand.randrange(40), rand.randrange(40)
+                    reference[key] = value
+                    tdict[key] = value
+                elif choice < 0.8 and reference:
+                    key = rand.choice(list(reference) + list(reference.values()))
+                    del reference[key]
+                    del tdict[key]
+                elif choice < 0.9 and reference:
+                    last = rand.random() < 0.5
+                    key, value = tdict.popitem(last)
+                    self.assertEqual(reference.pop(key), value)
+                else:
+                    pairs = [(rand.randrange(40, 80), rand.randrange(40, 80)) for _ in range(5)]
+                    reference.update(pairs)
+                    tdict.update(pairs)
+
+            self.assertSorted(tdict, reference)
+
+    def test_bisect(self):
+        self.assertEqual(self.tdict.bisect_left('b'), 1)
+        self.assertEqual(self.tdict.bisect_right('b'), 2)
+        self.assertEqual(self.tdict.bisect('bb'), 2)
+        self.assertEqual(self.by_value.bisect_left(5), 4)
+        self.assertEqual(self.by_value.bisect_left(0), 0)
+
+    def test_irange(self):
+        self.assertEqual(list(self.tdict.irange('b', 'c')), ['b', 'c'])
+        self.assertEqual(list(self.tdict.irange('b', 'c', inclusive=(False, True))), ['c'])
+        self.assertEqual(list(self.tdict.irange(high='b', reverse=True)), ['b', 'a'])
+        self.assertEqual(list(self.by_value.irange(2, 4, inclusive=(True, False))), ['c', 'a'])
+        self.assertEqual(list(self.by_value.irange(low=3)), ['a', 'b'])
+        self.assertEqual(list(self.by_value.irange(5, 9)), [])
+        self.assertEqual(list(self.by_value.irange(3, 2)), [])
+
+    def test_floor_ceiling(self):
+        self.assertEqual(self.tdict.floor_item('bb'), ('b', 4))
+        self.assertEqual(self.tdict.floor_item('b', strict=True), ('a', 3))
+        self.assertIsNone(self.tdict.floor_item('a', strict=True))
+        self.assertEqual(self.tdict.ceiling_item('bb'), ('c', 2))
+        self.assertEqual(self.tdict.ceiling_item('c', strict=True), ('d', 1))
+        self.assertIsNone(self.tdict.ceiling_item('e'))
+
+        self.assertEqual(self.by_value.floor_item(2), ('c', 2))
+        self.assertEqual(self.by_value.ceiling_item(2, strict=True), ('a', 3))
+
+    def test_positional(self):
+        self.assertEqual(self.tdict.peekitem(), ('d', 1))
+        self.assertEqual(self.by_value.peekitem(0), ('d', 1))
+        self.assertRaises(IndexError, self.tdict.peekitem, 4)
+        self.assertEqual(list(self.by_value.islice(1, 3)), [('c', 2), ('a', 3)])
+        self.assertEqual(self.tdict.popitem(last=False), ('a', 3))
+
+    def test_implicit_evictions(self):
+        # ('e', 3) removes ('a', 3), 'a' re-enters the order by value
+        self.by_value['e'] = 3
+        self.by_value['a'] = 0
+        self.by_value['c'] = 5
+
+        self.assertViewEqualO(self.by_value.items(), [('a', 0), ('d', 1), ('e', 3), ('b', 4), ('c', 5)])
+
+    def test_incomparable(self):
+        self.assertRaises(TypeError, self.tdict.__setitem__, 1, 'e')
+        self.assertRaises(TypeError, self.tdict.update, [('e', 5), (6, 'f')])
+        self.assertRaises(TypeError, self.by_value.__setitem__, 'e', 'f')
+
+        self.assertViewEqualO(self.tdict.items(), [('a', 3), ('b', 4), ('c', 2), ('d', 1)])
+        self.assertViewEqualO(self.by_value.items(), [('d', 1), ('c', 2), ('a', 3), ('b', 4)])
+
+    def test_move(self):
+        with self.assertRaises(TypeError) as context:
+            self.tdict.move_to_end('a')
+
+        self.assertEqual(str(context.exception), "SortedTwoWayDict is ordered by its sort key; pairs can't be moved")
+        self.assertRaises(TypeError, self.tdict.move_before, 'a', 'b')
+        self.assertRaises(TypeError, self.by_value.move_after, 'a', 'b')
+        self.assertViewEqualO(self.tdict.items(), [('a', 3), ('b', 4), ('c', 2), ('d', 1)])
+
+    def test_copy_pickle(self):
+        for tdict in (self.by_value.copy(), pickle.loads(pickle.dumps(self.by_value))):
+            self.assertIsInstance(tdict, SortedTwoWayDict)
+            self.assertEqual(tdict.by, SortedTwoWayDict.VALUES)
+            self.assertViewEqualO(tdict.items(), list(self.by_value.items()))
+
+            tdict['e'] = 0
+            self.assertEqual(tdict.peekitem(0), ('e', 0))
+            self.assertEqual(self.by_value.peekitem(0), ('d', 1))
+
+    def test_sorted_list_positions(self):
+        sorted_list = twodict._SortedList(load=4)
+        numbers = list(range(0, 200, 2))
+        random.Random(2).shuffle(numbers)
+
+        for number in numbers:
+            sorted_list.add(number)
+
+        for number in numbers[:40]:
+            sorted_list.remove(number)
+
+        rest = sorted(numbers[40:])
+
+        for position, number in enumerate(rest):
+            self.assertEqual(sorted_list[position], number)
+            self.assertEqual(sorted_list.bisect_left(number), position)
+            self.assertEqual(sorted_list.bisect_right(number), position + 1)
+            self.assertEqual(sorted_list.bisect_left(number + 1), position + 1)
+
+        for start, stop in ((0, 60), (5, 17), (13, 14), (30, 30)):
+            self.assertEqual(list(sorted_list.islice(start, stop)), rest[start:stop])
+            self.assertEqual(list(sorted_list.islice(start, stop, reverse=True)), rest[start:stop][::-1])
+
+
+class TestSnapshotTwoWayOrderedDict(unittest.TestCase, ExtraAssertions):
+
+    """Test case for the SnapshotTwoWayOrderedDict class."""
+
+    def setUp(self):
+        self.tdict = SnapshotTwoWayOrderedDict([('a', 1), ('b', 2), ('c', 3)])
+
+    def assertSnapshot(self, snapshot, items):
+        """Compare the snapshot with the expected list of items."""
+        self.assertEqual(list(snapshot.items()), items)
+        self.assertEqual(list(reversed(snapshot)), [key for key, _ in reversed(items)])
+        self.assertEqual(len(snapshot), len(items))
+
+        for key, value in items:
+            self.assertEqual(snapshot[key], value)
+            self.assertEqual(snapshot[value], key)
+            self.assertIn(key, snapshot.keys())
+            self.assertIn(value, snapshot.values())
+            self.assertIn((key, value), snapshot.items())
+
+            if key != value:
+                self.assertNotIn(value, snapshot.keys())
+                self.assertNotIn(key, snapshot.values())
+                self.assertNotIn((value, key), snapshot.items())
+
+    def test_snapshot(self):
+        snapshot = self.tdict.snapshot()
+
+        self.tdict['d'] = 'a'
+        self.tdict[2] = 'e'
+        self.tdict.move_to_end('c', last=False)
+        del self.tdict['d']
+
+        self.assertViewEqualO(self.tdict.items(), [('c', 3), (2, 'e')])
+        self.assertSnapshot(snapshot, [('a', 1), ('b', 2), ('c', 3)])
+        self.assertNotIn('d', snapshot)
+        self.assertNotIn('e', snapshot)
+        self.assertRaises(KeyError, snapshot.__getitem__, 'e')
+
+    def test_views(self):
+        snapshot = self.tdict.snapshot()
+
+        # Turns the value 1 into a key
+        self.tdict[1] = 'a'
+        self.tdict['d'] = 4
+
+        self.assertNotIn(1, snapshot.keys())
+        self.assertNotIn((1, 'a'), snapshot.items())
+        self.assertNotIn('d', snapshot.keys())
+        self.assertNotIn([], snapshot.keys())
+        self.assertNotIn([], snapshot.values())
+        self.assertEqual(list(snapshot.values()), [1, 2, 3])
+        self.assertEqual(list(reversed(snapshot.items())), [('c', 3), ('b', 2), ('a', 1)])
+        self.assertEqual(repr(snapshot.keys()), "dict_keys(['a', 'b', 'c'])")
+
+        self.tdict.clear()
+        self.assertSnapshot(snapshot, [('a', 1), ('b', 2), ('c', 3)])
+
+    def test_iterate_while_mutating(self):
+        for key, value in self.tdict.snapshot().items():
+            del self.tdict[key]
+            self.tdict[key * 2] = value
+
+        self.assertViewEqualO(self.tdict.items(), [('aa', 1), ('bb', 2), ('cc', 3)])
+
+    def test_clear(self):
+        snapshot = self.tdict.snapshot()
+        self.tdict.clear()
+        self.tdict['a'] = 2
+
+        self.assertSnapshot(snapshot, [('a', 1), ('b', 2), ('c', 3)])
+        self.assertRaises(KeyError, snapshot.__getitem__, 'd')
+
+    def test_random_operations(self):
+        rand = random.Random(0)
+        population = list(range(20)) + [chr(ord('a') + i) for i in range(20)]
+        snapshots = []
+
+        for _ in range(3000):
+            choice = rand.random()
+
+            if choice < 0.5:
+                self.tdict[rand.choice(population)] = rand.choice(population)
+            elif choice < 0.65 and self.tdict:
+                del self.tdict[rand.choice(list(self.tdict) + list(self.tdict.values()))]
+            elif choice < 0.75 and len(self.tdict) > 1:
+                key, anchor = rand.sample(list(self.tdict), 2)
+                rand.choice([self.tdict.move_to_end, self.tdict.move_before])(key, anchor)
+            elif choice < 0.85:
+                self.tdict.update((rand.randrange(100, 200), str(rand.random())) for _ in range(3))
+            elif choice < 0.86:
+                self.tdict.clear()
+            elif choice < 0.9:
+                snapshots.append((self.tdict.snapshot(), list(self.tdict.items())))
+
+        for snapshot, items in snapshots:
+            self.assertSnapshot(snapshot, items)
+
+    def test_released_snapshots(self):
+        snapshot = self.tdict.snapshot()
+        self.assertEqual(len(self.tdict._snapshots), 1)
+
+        del snapshot
+        gc.collect()
+        self.assertEqual(len(self.tdict._snapshots), 0)
+
+    def test_copy_pickle(self):
+        snapshot = self.tdict.snapshot()
+
+        for tdict in (self.tdict.copy(), pickle.loads(pickle.dumps(self.tdict))):
+            self.assertIsInstance(tdict, SnapshotTwoWayOrderedDict)
+            self.assertViewEqualO(tdict.items(), [('a', 1), ('b', 2), ('c', 3)])
+
+            tdict['a'] = 4
+            self.assertEqual(snapshot['a'], 1)
+
+    def test_same_as_reference(self):
+        self.assertSameAsReference(SnapshotTwoWayOrderedDict)
+
+
+class _SameHash(object):
+
+    """Distinct objects that all have the same hash."""
+
+    def __init__(self, name):
+        self.name = name
+
+    def __hash__(self):
+        return 42
+
+    def __eq__(self, other):
+        return isinstance(other, _SameHash) and self.name == other.name
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __repr__(self):
+        return "_SameHash({0!r})".format(self.name)
+
+
+class TestPersistentTwoWayOrderedDict(unittest.TestCase, ExtraAssertions):
+
+    """Test case for the PersistentTwoWayOrderedDict class."""
+
+    def setUp(self):
+        self.tdict = PersistentTwoWayOrderedDict([('a', 1), ('b', 2), ('c', 3)])
+
+    def assertSameItems(self, tdict, reference):
+        """Compare tdict with the reference TwoWayOrderedDict."""
+        items = list(reference.items())
+
+        self.assertEqual(list(tdict.items()), items)
+        self.assertEqual(list(reversed(tdict)), list(reversed(reference)))
+        self.assertEqual(len(tdict), len(reference))
+
+        for key, value in items:
+            self.assertEqual(tdict[key], value)
+            self.assertEqual(tdict[value], key)
+            self.assertIn(key, tdict.keys())
+            self.assertIn(value, tdict.values())
+            self.assertIn((key, value), tdict.items())
+
+    def test_versions(self):
+        v2 = self.tdict.set('d', 4)
+        v3 = v2.delete(2).set('a', 5)
+
+        self.assertViewEqualO(self.tdict.items(), [('a', 1), ('b', 2), ('c', 3)])
+        self.assertViewEqualO(v2.items(), [('a', 1), ('b', 2), ('c', 3), ('d', 4)])
+        self.assertViewEqualO(v3.items(), [('a', 5), ('c', 3), ('d', 4)])
+
+        self.assertRaises(KeyError, v3.delete, 'b')
+        self.assertRaises(KeyError, v3.__getitem__, 1)
+        self.assertNotIn('b', v3)
+        self.assertNotIn(3, v3.keys())
+        self.assertNotIn(('a', 1), v3.items())
+
+    def test_collisions(self):
+        # Same as the TwoWayOrderedDict.__setitem__ cases
+        self.assertViewEqualO(self.tdict.set('a', 2).items(), [('a', 2), ('c', 3)])
+        self.assertViewEqualO(self.tdict.set(1, 'x').items(), [('b', 2), ('c', 3), (1, 'x')])
+        self.assertViewEqualO(self.tdict.set(2, 1).items(), [('c', 3), (2, 1)])
+        self.assertViewEqualO(self.tdict.set('a', 'a').items(), [('a', 'a'), ('b', 2), ('c', 3)])
+        self.assertViewEqualO(self.tdict.set('a', 'a').set('a', 4).items(), [('a', 4), ('b', 2), ('c', 3)])
+
+    def test_random_operations(self):
+        rand = random.Random(0)
+        population = list(range(50)) + [chr(ord('a') + i) for i in range(26)]
+
+        reference = TwoWayOrderedDict()
+        tdict = PersistentTwoWayOrderedDict()
+        versions = []
+
+        for _ in range(3000):
+            if rand.random() < 0.6:
+                key, value = rand.choice(population), rand.choice(population)
+                reference[key] = value
+                tdict = tdict.set(key, value)
+            elif reference:
+                key = rand.choice(list(reference) + list(reference.values()))
+                del reference[key]
+                tdict = tdict.delete(key)
+
+            if rand.random() < 0.05:
+                versions.append((tdict, reference.copy()))
+
+        for tdict, reference in versions:
+            self.assertSameItems(tdict, reference)
+
+    def test_hash_collisions(self):
+        objects = [_SameHash(name) for name in 'abcdef']
+        tdict = PersistentTwoWayOrderedDict(zip(objects, range(6)))
+
+        tdict = tdict.delete(objects[2]).set(objects[0], 10).set(_SameHash('g'), 'g').set('h', objects[1])
+        reference = TwoWayOrderedDict(zip(objects, range(6)))
+        del reference[objects[2]]
+        reference[objects[0]] = 10
+        reference[_SameHash('g')] = 'g'
+        reference['h'] = objects[1]
+
+        self.assertSameItems(tdict, reference)
+
+    def test_compaction(self):
+        tdict = PersistentTwoWayOrderedDict((number, str(number)) for number in range(1000))
+
+        for number in range(900):
+            tdict = tdict.delete(number)
+
+        self.assertLess(tdict._size, 300)
+        self.assertViewEqualO(tdict.items(), [(number, str(number)) for number in range(900, 1000)])
+
+    def test_large(self):
+        reference = TwoWayOrderedDict((number, -number - 1) for number in range(5000))
+        tdict = PersistentTwoWayOrderedDict(reference)
+
+        for number in range(0, 5000, 7):
+            tdict = tdict.set(number, 'x{0}'.format(number))
+            reference[number] = 'x{0}'.format(number)
+
+        self.assertSameItems(tdict, reference)
+
+    def test_update(self):
+        tdict = self.tdict.update([('d', 4), ('e', 'a')], f=5)
+
+        self.assertViewEqualO(tdict.items(), [('b', 2), ('c', 3), ('d', 4), ('e', 'a'), ('f', 5)])
+        self.assertViewEqualO(self.tdict.items(), [('a', 1), ('b', 2), ('c', 3)])
+
+    def test_conversion(self):
+        tdict = self.tdict.to_tdict()
+
+        self.assertIsInstance(tdict, TwoWayOrderedDict)
+        self.assertViewEqualO(tdict.items(), [('a', 1), ('b', 2), ('c', 3)])
+        self.assertIsInstance(self.tdict.to_tdict(CompactTwoWayOrderedDict), CompactTwoWayOrderedDict)
+
+        bounded = self.tdict.to_tdict(functools.partial(BoundedTwoWayOrderedDict, 2))
+        self.assertViewEqualO(bounded.items(), [('b', 2), ('c', 3)])
+        self.assertRaises(TypeError, self.tdict.to_tdict, BoundedTwoWayOrderedDict)
+
+        self.assertEqual(PersistentTwoWayOrderedDict(tdict), self.tdict)
+        self.assertEqual(PersistentTwoWayOrderedDict([('a', 1), ('b', 'a')]).to_tdict(), TwoWayOrderedDict(b='a'))
+
+    def test_pickle(self):
+        tdict = pickle.loads(pickle.dumps(self.tdict.delete('b')))
+        self.assertViewEqualO(tdict.items(), [('a', 1), ('c', 3)])
+
+
+@unittest.skipIf(twodict.asyncio is None, "asyncio is not available")
+class TestAsyncTwoWayOrderedDict(unittest.TestCase, ExtraAssertions):
+
+    """Test case for the AsyncTwoWayOrderedDict class."""
+
+    def setUp(self):
+        self.loop = twodict.asyncio.new_event_loop()
+        twodict.asyncio.set_event_loop(self.loop)
+
+        self.adict = AsyncTwoWayOrderedDict([('key{0}'.format(index), index) for index in range(10)],
+                                            chunk_size=3)
+
+    def tearDown(self):
+        self.loop.close()
+        twodict.asyncio.set_event_loop(None)
+
+    def run_loop(self, awaitable):
+        return self.loop.run_until_complete(awaitable)
+
+    def call(self, func, *args):
+        """Call func from the running event loop, like a coroutine would."""
+        results = []
+
+        def run():
+            try:
+                results.append((func(*args), None))
+            except Exception as error:
+                results.append((None, error))
+
+        self.loop.call_soon(run)
+        self.run_loop(twodict.asyncio.sleep(0))
+
+        value, error = results[0]
+
+        if error is not None:
+            raise error
+
+        return value
+
+    def collect(self, aiterator):
+        items = []
+
+        while True:
+            try:
+                items.append(self.run_loop(self.call(aiterator.__anext__)))
+            except StopAsyncIteration:
+                return items
+
+    def test_init(self):
+        self.assertEqual(len(self.adict), 10)
+        self.assertEqual(self.adict['key3'], 3)
+        self.assertEqual(self.adict[3], 'key3')
+        self.assertRaises(ValueError, AsyncTwoWayOrderedDict, chunk_size=0)
+
+    def test_single_items(self):
+        self.adict['key0'] = 5
+
+        self.assertNotIn('key5', self.adict)
+        self.assertEqual(self.adict.get(5), 'key0')
+        self.assertEqual(self.adict.pop('key0'), 5)
+        self.assertEqual(self.adict.pop('key0', None), None)
+        self.assertEqual(self.adict.popitem(), ('key9', 9))
+
+        del self.adict[1]
+        self.assertEqual(len(self.adict), 6)
+
+    def test_aupdate(self):
+        future = self.call(self.adict.aupdate, [('new{0}'.format(index), index + 10) for index in range(10)])
+        sizes = set()
+
+        while not future.done():
+            sizes.add(len(self.adict))
+            self.run_loop(twodict.asyncio.sleep(0))
+
+        self.assertIsNone(future.result())
+        self.assertEqual(len(self.adict), 20)
+        self.assertEqual(self.adict['new9'], 19)
+        # The update yielded to the event loop between the chunks
+        self.assertTrue(sizes & set([13, 16, 19]))
+
+    def test_aupdate_mapping(self):
+        self.run_loop(self.call(self.adict.aupdate, TwoWayOrderedDict([('a', 'b'), ('key0', 'c')])))
+
+        self.assertEqual(self.adict['b'], 'a')
+        self.assertEqual(self.adict['key0'], 'c')
+        self.assertNotIn(0, self.adict)
+
+    def test_aupdate_error(self):
+        self.assertRaises(TypeError, self.run_loop, self.call(self.adict.aupdate, [('a', 1), ([], 2)]))
+
+        self.assertFalse(self.adict.lock.locked())
+        self.assertEqual(self.adict['a'], 1)
+
+    def test_aclear(self):
+        self.run_loop(self.call(self.adict.aclear))
+
+        self.assertEqual(len(self.adict), 0)
+        self.assertNotIn(0, self.adict)
+
+    def test_acopy(self):
+        tdict = self.run_loop(self.call(self.adict.acopy))
+
+        self.assertIsInstance(tdict, TwoWayOrderedDict)
+        self.assertEqual(list(tdict.items()), self.collect(self.adict.aiter_items()))
+
+        tdict['key0'] = 'other'
+        self.assertEqual(self.adict['key0'], 0)
+
+    def test_acopy_factory(self):
+        adict = AsyncTwoWayOrderedDict([('a', 1), ('b', 2)], cls=functools.partial(BoundedTwoWayOrderedDict, 5))
+        tdict = self.run_loop(self.call(adict.acopy))
+
+        self.assertIsInstance(tdict, BoundedTwoWayOrderedDict)
+        self.assertEqual(tdict.maxsize, 5)
+        self.assertViewEqualO(tdict.items(), [('a', 1), ('b', 2)])
+
+    def test_aiter(self):
+        keys = ['key{0}'.format(index) for index in range(10)]
+
+        self.assertEqual(self.collect(self.adict.aiter_keys()), keys)
+        self.assertEqual(self.collect(self.adict.__aiter__()), keys)
+        self.assertEqual(self.collect(self.adict.aiter_keys(reverse=True)), keys[::-1])
+        self.assertEqual(self.collect(self.adict.aiter_items()), list(zip(keys, range(10))))
+        self.assertEqual(self.collect(AsyncTwoWayOrderedDict().aiter_items()), [])
+
+    def test_changed_during_iteration(self):
+        aiterator = self.adict.aiter_items()
+        self.run_loop(self.call(aiterator.__anext__))
+
+        self.adict['a'] = 'b'
+
+        self.assertRaises(RuntimeError, self.call, aiterator.__anext__)
+
+    def test_no_running_loop(self):
+        self.assertRaises(RuntimeError, self.adict.aclear)
+        self.assertRaises(RuntimeError, self.adict.aiter_items().__anext__)
+
+    def test_lock(self):
+        self.run_loop(self.adict.lock.acquire())
+
+        future = self.call(self.adict.aupdate, [('a', 'b')])
+
+        for _ in range(5):
+            self.run_loop(twodict.asyncio.sleep(0))
+
+        self.assertNotIn('a', self.adict)
+
+        self.adict.lock.release()
+        self.run_loop(future)
+
+        self.assertIn('a', self.adict)
+
 
 class TestClear(unittest.TestCase):
 
@@ -517,6 +2695,177 @@ class TestOldMethods(unittest.TestCase):
         self.assertRaises(NotImplementedError, self.tdict.viewvalues)
 
 
+class TestCompactTwoWayOrderedDict(unittest.TestCase, ExtraAssertions):
+
+    """Test case for the CompactTwoWayOrderedDict class."""
+
+    def setUp(self):
+        self.tdict = CompactTwoWayOrderedDict([('a', 1), ('b', 'b'), ('c', 3)])
+
+    def test_same_as_reference(self):
+        self.assertSameAsReference(CompactTwoWayOrderedDict)
+
+    def test_del_item(self):
+        del self.tdict[1]
+        self.assertViewEqualO(self.tdict.items(), [('b', 'b'), ('c', 3)])
+
+    def test_popitem_first(self):
+        self.assertEqual(self.tdict.popitem(last=False), ('a', 1))
+        self.assertEqual(self.tdict.popitem(last=False), ('b', 'b'))
+        self.tdict['d'] = 4
+        self.assertViewEqualO(self.tdict.items(), [('c', 3), ('d', 4)])
+
+    def test_compaction(self):
+        tdict = CompactTwoWayOrderedDict((index, -index - 1) for index in range(100))
+
+        for index in range(100):
+            if index % 3:
+                del tdict[index]
+
+        self.assertLess(len(tdict._items), 100)
+        self.assertViewEqualO(tdict.keys(), list(range(0, 100, 3)))
+        self.assertEqual(tdict[-100], 99)
+        self.assertEqual(tdict.popitem(last=False), (0, -1))
+
+    def test_copy(self):
+        tdict_copy = self.tdict.copy()
+        self.assertIsInstance(tdict_copy, CompactTwoWayOrderedDict)
+        self.assertEqual(self.tdict, tdict_copy)
+
+
+class TestBidirectionalMap(unittest.TestCase, ExtraAssertions):
+
+    """Test case for the BidirectionalMap class."""
+
+    def setUp(self):
+        self.bmap = BidirectionalMap([('a', 1), ('b', 'a'), ('c', 3)])
+
+    def test_get_item(self):
+        self.assertEqual(self.bmap['a'], 1)
+        self.assertEqual(self.bmap['b'], 'a')
+        self.assertRaises(KeyError, self.bmap.__getitem__, 1)
+
+    def test_inverse(self):
+        self.assertEqual(self.bmap.inverse[1], 'a')
+        self.assertEqual(self.bmap.inverse['a'], 'b')
+        self.assertIs(self.bmap.inverse.inverse, self.bmap)
+        self.assertViewEqualO(self.bmap.inverse.items(), [(1, 'a'), ('a', 'b'), (3, 'c')])
+
+    def test_inverse_shares_storage(self):
+        self.bmap.inverse[4] = 'd'
+        self.assertEqual(self.bmap['d'], 4)
+
+        del self.bmap.inverse[1]
+        self.assertNotIn('a', self.bmap)
+
+    def test_set_item_key_exists(self):
+        self.bmap['a'] = 10
+        self.assertViewEqualO(self.bmap.items(), [('a', 10), ('b', 'a'), ('c', 3)])
+        self.assertNotIn(1, self.bmap.inverse)
+
+    def test_set_item_value_exists(self):
+        self.bmap['d'] = 3
+        self.assertViewEqualO(self.bmap.items(), [('a', 1), ('b', 'a'), ('d', 3)])
+        self.assertEqual(self.bmap.inverse[3], 'd')
+
+    def test_set_item_same_pair(self):
+        self.bmap['a'] = 1
+        self.assertViewEqualO(self.bmap.items(), [('a', 1), ('b', 'a'), ('c', 3)])
+
+    def test_set_item_swap(self):
+        self.bmap['a'] = 3
+        self.assertViewEqualO(self.bmap.items(), [('a', 3), ('b', 'a')])
+        self.assertEqual(len(self.bmap.inverse), 2)
+
+    def test_del_item(self):
+        del self.bmap['b']
+        self.assertViewEqualO(self.bmap.items(), [('a', 1), ('c', 3)])
+        self.assertNotIn('a', self.bmap.inverse)
+
+    def test_values(self):
+        self.assertViewEqualO(self.bmap.values(), [1, 'a', 3])
+        self.assertIn('a', self.bmap.values())
+        self.assertNotIn('c', self.bmap.values())
+
+    def test_popitem(self):
+        self.assertEqual(self.bmap.popitem(), ('c', 3))
+        self.assertEqual(self.bmap.popitem(last=False), ('a', 1))
+        self.assertEqual(self.bmap.inverse, BidirectionalMap([('a', 'b')]))
+
+    def test_iter_reversed(self):
+        self.assertEqual(list(reversed(self.bmap)), ['c', 'b', 'a'])
+
+    def test_copy(self):
+        bmap_copy = self.bmap.copy()
+        self.assertEqual(self.bmap, bmap_copy)
+
+        bmap_copy['d'] = 4
+        self.assertNotIn(4, self.bmap.inverse)
+
+    def test_clear(self):
+        self.bmap.clear()
+        self.assertEqual(len(self.bmap), 0)
+        self.assertEqual(len(self.bmap.inverse), 0)
+
+    def test_equal_any_order(self):
+        self.assertEqual(self.bmap, BidirectionalMap([('c', 3), ('a', 1), ('b', 'a')]))
+        self.assertNotEqual(self.bmap, BidirectionalMap([('c', 3), ('a', 1), ('b', 1)]))
+        self.assertNotEqual(self.bmap, {'a': 1, 'b': 'a', 'c': 3})
+
+    def test_repr(self):
+        self.assertEqual(repr(BidirectionalMap([('a', 1)])), "BidirectionalMap([('a', 1)])")
+
+
+class TestBackends(unittest.TestCase):
+
+    """Test case for the pure Python & C storage cores."""
+
+    C_BACKEND = twodict._TwoWayOrderedDictBase is not twodict._PyTwoWayOrderedDictBase
+
+    @unittest.skipIf(not C_BACKEND, "_twodict C extension is not in use")
+    def test_pure_python_backend(self):
+        env = dict(os.environ, TWODICT_PURE_PYTHON="1")
+        process = subprocess.Popen([sys.executable, os.path.abspath(__file__)], env=env,
+                                   stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        _, stderr = process.communicate()
+
+        self.assertEqual(process.returncode, 0, stderr.decode("utf-8", "replace"))
+
+    def test_overridden_hooks(self):
+        calls = []
+
+        class HookedDict(TwoWayOrderedDict):
+
+            def _append_key(self, key):
+                calls.append(('append', key))
+                super(HookedDict, self)._append_key(key)
+
+            def _remove_mapped_key(self, key):
+                calls.append(('remove', key))
+                super(HookedDict, self)._remove_mapped_key(key)
+
+            def _iterate(self, reverse=False):
+                calls.append(('iterate', reverse))
+                return super(HookedDict, self)._iterate(reverse)
+
+        tdict = HookedDict()
+        tdict['a'] = 1
+        del tdict['a']
+        list(tdict)
+        list(reversed(tdict))
+
+        self.assertEqual(calls, [('append', 'a'), ('remove', 1), ('remove', 'a'),
+                                 ('iterate', False), ('iterate', True)])
+
+    def test_iterator_exhausted(self):
+        tdict = TwoWayOrderedDict(a=1)
+        iterator = iter(tdict)
+
+        self.assertEqual(list(iterator), ['a'])
+        tdict['b'] = 2
+        self.assertEqual(list(iterator), [])
+
+
 ########## DictViews section ##########
 
 
@@ -544,6 +2893,24 @@ class TestDictKeysView(unittest.TestCase):
     def test_repr(self):
         self.assertEqual(repr(self.keys_view), "dict_keys(['a', 'b'])")
 
+    def test_contains_self_mapped(self):
+        self.tdict['c'] = 'c'
+        self.assertIn('c', self.keys_view)
+
+    def test_contains_unhashable(self):
+        self.assertNotIn([], self.keys_view)
+
+    def test_set_operations(self):
+        self.assertEqual(self.keys_view & ['a', 'c'], {'a'})
+        self.assertEqual(self.keys_view | ['c'], {'a', 'b', 'c'})
+        self.assertEqual(self.keys_view - ['a'], {'b'})
+        self.assertEqual(['a', 'c'] - self.keys_view, {'c'})
+        self.assertEqual(self.keys_view ^ ['a', 'c'], {'b', 'c'})
+
+    def test_isdisjoint(self):
+        self.assertTrue(self.keys_view.isdisjoint([1, 2]))
+        self.assertFalse(self.keys_view.isdisjoint(['b']))
+
 
 class TestDictValuesView(unittest.TestCase):
 
@@ -569,6 +2936,23 @@ class TestDictValuesView(unittest.TestCase):
     def test_repr(self):
         self.assertEqual(repr(self.values_view), "dict_values([1, 2])")
 
+    def test_contains_self_mapped(self):
+        self.tdict['c'] = 'c'
+        self.assertIn('c', self.values_view)
+
+    def test_contains_unhashable(self):
+        self.assertNotIn([], self.values_view)
+
+    def test_set_operations(self):
+        self.assertEqual(self.values_view & [1, 3], {1})
+        self.assertEqual(self.values_view | [3], {1, 2, 3})
+        self.assertEqual(self.values_view - [1], {2})
+        self.assertEqual(self.values_view ^ [1, 3], {2, 3})
+
+    def test_isdisjoint(self):
+        self.assertTrue(self.values_view.isdisjoint(['a', 'b']))
+        self.assertFalse(self.values_view.isdisjoint([2]))
+
 
 class TestDictItemsView(unittest.TestCase):
 
@@ -596,12 +2980,28 @@ class TestDictItemsView(unittest.TestCase):
     def test_repr(self):
         self.assertEqual(repr(self.items_view), "dict_items([('a', 1), ('b', 2)])")
 
+    def test_contains_reversed_item(self):
+        self.assertNotIn((1, 'a'), self.items_view)
+
+    def test_contains_unhashable(self):
+        self.assertNotIn(([], 1), self.items_view)
+
+    def test_set_operations(self):
+        self.assertEqual(self.items_view & [('a', 1), ('c', 3)], {('a', 1)})
+        self.assertEqual(self.items_view - [('a', 1)], {('b', 2)})
+        self.assertEqual(self.items_view ^ [('a', 1)], {('b', 2)})
+
+    def test_isdisjoint(self):
+        self.assertTrue(self.items_view.isdisjoint([(1, 'a')]))
+        self.assertFalse(self.items_view.isdisjoint([('b', 2)]))
+
 
 def all_tests_suite():
     """Return a test suite with all TestCases - TestSuites in this module."""
     test_cases_list = [
         TestInit,
         TestGetItem,
+        TestGetMany,
         TestDelItem,
         TestLength,
         TestIteration,
@@ -611,8 +3011,30 @@ def all_tests_suite():
         TestUpdate,
         TestSetDefault,
         TestCopy,
+        TestPickle,
+        TestDumpLoad,
+        TestStream,
+        TestFrozenTwoWayOrderedDict,
+        TestSharedTwoWayOrderedDict,
+        TestDiskTwoWayOrderedDict,
+        TestConcurrentTwoWayOrderedDict,
+        TestBoundedTwoWayOrderedDict,
+        TestMove,
+        TestPositional,
+        TestJournaledTwoWayOrderedDict,
+        TestInstrumentedTwoWayOrderedDict,
+        TestMultiIndexTwoWayOrderedDict,
+        TestSortedTwoWayDict,
+        TestSnapshotTwoWayOrderedDict,
+        TestPersistentTwoWayOrderedDict,
+        TestAsyncTwoWayOrderedDict,
         TestClear,
         TestOldMethods,
+        TestCompactTwoWayOrderedDict,
+        TestBidirectionalMap,
+        TestStrIntTwoWayOrderedDict,
+        TestIntTwoWayOrderedDict,
+        TestBackends,
         TestDictKeysView,
         TestDictValuesView,
         TestDictItemsView
@@ -641,7 +3063,9 @@ def main():
     failfast_sts = True if "-f" in sys.argv else False
 
     runner = unittest.TextTestRunner(verbosity=verb_lvl, failfast=failfast_sts)
-    runner.run(all_tests_suite())
+    result = runner.run(all_tests_suite())
+
+    sys.exit(not result.wasSuccessful())
 
     #unittest.main()
 
@@ -3,13 +3,77 @@
 Attributes:
     _DEFAULT_OBJECT (object): Object that it's used as a default parameter.
 
+    _DELETED_OBJECT (object): Tombstone for removed keys in compact storage.
+
 """
 
+import io
+import os
 import sys
-import collections
+import threading
+import time
+import mmap
+import zlib
+import struct
+import pickle
+import weakref
+
+try:
+    from collections.abc import Iterable, Set, KeysView, ValuesView, ItemsView, Mapping, MutableMapping
+except ImportError:
+    from collections import Iterable, Set, KeysView, ValuesView, ItemsView, Mapping, MutableMapping
+
+from collections import OrderedDict, Counter
+from array import array
+from bisect import bisect_left, bisect_right, insort
+from itertools import repeat, islice, compress
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
 
+try:
+    from multiprocessing import shared_memory, resource_tracker
+except ImportError:
+    shared_memory = resource_tracker = None
 
-__all__ = ["TwoWayOrderedDict"]
+try:
+    import asyncio
+except ImportError:
+    asyncio = None
+
+try:
+    import sqlite3
+except ImportError:
+    sqlite3 = None
+
+
+__all__ = [
+    "TwoWayOrderedDict",
+    "CompactTwoWayOrderedDict",
+    "IndexedTwoWayOrderedDict",
+    "BidirectionalMap",
+    "StrIntTwoWayOrderedDict",
+    "IntTwoWayOrderedDict",
+    "FrozenTwoWayOrderedDict",
+    "SharedTwoWayOrderedDict",
+    "DiskTwoWayOrderedDict",
+    "ConcurrentTwoWayOrderedDict",
+    "BoundedTwoWayOrderedDict",
+    "JournaledTwoWayOrderedDict",
+    "InstrumentedTwoWayOrderedDict",
+    "MultiIndexTwoWayOrderedDict",
+    "SortedIndex",
+    "PrefixIndex",
+    "HashIndex",
+    "SortedTwoWayDict",
+    "SnapshotTwoWayOrderedDict",
+    "PersistentTwoWayOrderedDict",
+    "AsyncTwoWayOrderedDict",
+    "dump",
+    "load"
+]
 
 __version__ = "1.2"
 
@@ -18,82 +82,225 @@ __license__ = "Unlicense"
 
 _DEFAULT_OBJECT = object()
 
+_DELETED_OBJECT = object()
+
+
+if sys.version_info >= (3, 0):
+    _viewkeys, _viewitems = dict.keys, dict.items
+else:
+    _viewkeys, _viewitems = dict.viewkeys, dict.viewitems
+
+# Since Python 3.7 the build-in dict is ordered and since 3.8 reversible
+_ORDERED_DICTS = sys.version_info >= (3, 7)
+
+# Bytes (or characters) read per chunk by from_pairs_stream()
+_STREAM_CHUNK_SIZE = 1 << 20
+
+# Pairs written per chunk by to_stream()
+_STREAM_BATCH_SIZE = 10000
+
+_OrderedDict = dict if sys.version_info >= (3, 8) else OrderedDict
+
+
+def _is_numpy_array(obj):
+    return numpy is not None and isinstance(obj, numpy.ndarray)
+
+
+def _to_numpy_array(values):
+    """Convert values to an integer NumPy array, fall back to dtype=object."""
+    array = numpy.array(values)
+
+    if array.dtype.kind not in "iu":
+        array = numpy.empty(len(values), dtype=object)
+        array[:] = values
+
+    return array
+
+
+def _inverse_batch(forward, size):
+    """Return the value -> key dict of a batch of size pairs (given as a dict).
+
+    Returns None when the pairs would evict or overwrite each other.
+
+    """
+    if len(forward) != size:
+        return None
+
+    try:
+        backward = dict(zip(forward.values(), forward.keys()))
+    except TypeError:
+        return None
+
+    if len(backward) != size:
+        return None
+
+    # The only overlap allowed between keys & values are items like
+    # {'a': 'a'}, equal but distinct objects (1 & 1.0) take the slow path
+    for key in _viewkeys(forward) & _viewkeys(backward):
+        if forward[key] != key or forward[key] is not backward[key]:
+            return None
+
+    return backward
+
 
 ########## Custom views to mimic Python3 view objects ##########
 # See: https://docs.python.org/3/library/stdtypes.html#dict-views
 
-class DictKeysView(collections.KeysView):
+class _HashedSetOperations(object):
+
+    """Set operations that rely on the O(1) __contains__ of the views.
+
+    The generic collections.Set mixins build a new view for every result
+    and know nothing about the underlying dictionary. Since every key and
+    every value of a TwoWayOrderedDict is hashable we can answer set algebra
+    using plain sets and the hashed membership tests of the view.
+
+    """
+
+    def __and__(self, other):
+        if not isinstance(other, Iterable):
+            return NotImplemented
+
+        return set(item for item in other if item in self)
+
+    __rand__ = __and__
+
+    def __or__(self, other):
+        if not isinstance(other, Iterable):
+            return NotImplemented
+
+        result = set(self)
+        result.update(other)
+        return result
+
+    __ror__ = __or__
+
+    def __sub__(self, other):
+        if not isinstance(other, Iterable):
+            return NotImplemented
+
+        if not isinstance(other, Set):
+            other = set(other)
+
+        return set(item for item in self if item not in other)
+
+    def __rsub__(self, other):
+        if not isinstance(other, Iterable):
+            return NotImplemented
+
+        return set(item for item in other if item not in self)
+
+    def __xor__(self, other):
+        if not isinstance(other, Iterable):
+            return NotImplemented
+
+        result = set(self)
+        result.symmetric_difference_update(other)
+        return result
+
+    __rxor__ = __xor__
+
+    def isdisjoint(self, other):
+        for item in other:
+            if item in self:
+                return False
 
-    def __init__(self, data):
-        super(DictKeysView, self).__init__(data)
-        self.__data = data
+        return True
+
+
+class DictKeysView(_HashedSetOperations, KeysView):
 
     def __repr__(self):
         return "dict_keys({data})".format(data=list(self))
 
-    def __contains__(self, key):
-        return key in [key for key in self.__data]
+    def __reversed__(self):
+        return self._mapping._iterate(reverse=True)
 
+    def __contains__(self, key):
+        # Only the keys are stored in the linked list
+        try:
+            return key in self._mapping._items_map
+        except TypeError:
+            # Unhashable objects can't be part of the dictionary
+            return False
 
-class DictValuesView(collections.ValuesView):
 
-    def __init__(self, data):
-        super(DictValuesView, self).__init__(data)
-        self.__data = data
+class DictValuesView(_HashedSetOperations, ValuesView):
 
     def __repr__(self):
         return "dict_values({data})".format(data=list(self))
 
+    def __iter__(self):
+        return self._mapping._iterate_values()
+
+    def __reversed__(self):
+        return self._mapping._iterate_values(reverse=True)
+
     def __contains__(self, value):
-        return value in [self.__data[key] for key in self.__data]
+        try:
+            if not dict.__contains__(self._mapping, value):
+                return False
+        except TypeError:
+            # Unhashable objects can't be part of the dictionary
+            return False
+
+        # Anything stored in the dict that is not a key is a value, keys
+        # are values only when they are mapped to themselves e.g. {'a': 'a'}
+        if value in self._mapping._items_map:
+            return dict.__getitem__(self._mapping, value) == value
 
+        return True
 
-class DictItemsView(collections.ItemsView):
 
-    def __init__(self, data):
-        super(DictItemsView, self).__init__(data)
-        self.__data = data
+class BidirectionalValuesView(_HashedSetOperations, ValuesView):
 
     def __repr__(self):
-        return "dict_items({data})".format(data=list(self))
+        return "dict_values({data})".format(data=list(self))
 
-    def __contains__(self, item):
-        return item in [(key, self.__data[key]) for key in self.__data]
+    def __contains__(self, value):
+        try:
+            return value in self._mapping._inverse
+        except TypeError:
+            # Unhashable objects can't be part of the dictionary
+            return False
 
-###########################################################
 
+class DictItemsView(_HashedSetOperations, ItemsView):
 
-class TwoWayOrderedDict(dict):
+    def __repr__(self):
+        return "dict_items({data})".format(data=list(self))
 
-    """Custom data structure which implements a two way ordered dictionary.
+    def __iter__(self):
+        return self._mapping._iterate_items()
 
-    Custom dictionary that supports key:value relationships AND value:key
-    relationships. It also remembers the order in which the items were inserted
-    and supports almost all the features of the build-in dict.
+    def __reversed__(self):
+        return self._mapping._iterate_items(reverse=True)
 
-    Examples:
-        Unordered initialization::
+    def __contains__(self, item):
+        if not isinstance(item, tuple) or len(item) != 2:
+            return False
 
-            >>> tdict = TwoWayOrderedDict(a=1, b=2, c=3)
+        key, value = item
 
-        Ordered initialization::
+        try:
+            if key not in self._mapping._items_map:
+                return False
+        except TypeError:
+            # Unhashable objects can't be part of the dictionary
+            return False
 
-            >>> tdict = TwoWayOrderedDict([('a', 1), ('b', 2), ('c', 3)])
+        return dict.__getitem__(self._mapping, key) == value
 
-        Simple usage::
+###########################################################
 
-            >>> tdict = TwoWayOrderedDict()
-            >>> tdict['a'] = 1
-            >>> tdict['b'] = 2
-            >>> tdict['c'] = 3
 
-            >>> tdict['a']  # Outputs 1
-            >>> tdict[1]  # Outputs 'a'
+class _PyTwoWayOrderedDictBase(dict):
 
-            >>> del tdict[2]
+    """Pure Python storage core of the TwoWayOrderedDict.
 
-            >>> print(tdict)
-            TwoWayOrderedDict([('a', 1), ('c', 3)])
+    Holds the two way mappings in the dict storage and the insertion order
+    in a cyclic doubly linked list. The optional _twodict C extension module
+    provides a drop-in replacement (TwoWayOrderedDictBase) for this class.
 
     """
 
@@ -101,52 +308,49 @@ class TwoWayOrderedDict(dict):
     _KEY = 1
     _NEXT = 2
 
-    def __init__(self, *args, **kwargs):
-        super(TwoWayOrderedDict, self).__init__()
-
-        self.clear()
-        self.update(*args, **kwargs)
-
+    # Like the C core, read the storage directly instead of going through
+    # self[key] & key in self so subclasses can hook __getitem__ and
+    # __contains__ (e.g. to track accesses) without being called in the
+    # middle of an update
     def __setitem__(self, key, value):
-        if key in self:
+        if dict.__contains__(self, key):
             # Make sure that key != self[key] before removing self[key] from
             # our linked list because we will lose the order
             # For example {'a': 'a'} and we do d['a'] = 2
-            if key != self[key]:
-                self._remove_mapped_key(self[key])
+            if key != dict.__getitem__(self, key):
+                self._remove_mapped_key(dict.__getitem__(self, key))
 
-            dict.__delitem__(self, self[key])
+            dict.__delitem__(self, dict.__getitem__(self, key))
 
-        if value in self:
+        if dict.__contains__(self, value):
             # Make sure that key != value before removing value from our
             # linked list because we will lose the order if we remove
             # value = key from our linked list
             if key != value:
                 self._remove_mapped_key(value)
 
-            self._remove_mapped_key(self[value])
+            self._remove_mapped_key(dict.__getitem__(self, value))
 
             # Check if self[value] is in the dict in case that the
             # first del (line:117) has already removed the self[value]
             # For example {'a': 1, 1: 'a'} and we do d['a'] = 'a'
-            if self[value] in self:
-                dict.__delitem__(self, self[value])
+            if dict.__contains__(self, dict.__getitem__(self, value)):
+                dict.__delitem__(self, dict.__getitem__(self, value))
 
         if key not in self._items_map:
-            last = self._items[self._PREV]
-            last[self._NEXT] = self._items[self._PREV] = self._items_map[key] = [last, key, self._items]
+            self._append_key(key)
 
         dict.__setitem__(self, key, value)
         dict.__setitem__(self, value, key)
 
     def __delitem__(self, key):
-        self._remove_mapped_key(self[key])
+        self._remove_mapped_key(dict.__getitem__(self, key))
         self._remove_mapped_key(key)
 
-        dict.__delitem__(self, self[key])
+        dict.__delitem__(self, dict.__getitem__(self, key))
 
         # Cases like {'a': 'a'} where we have only one copy instead of {'a': 1, 1: 'a'}
-        if key in self:
+        if dict.__contains__(self, key):
             dict.__delitem__(self, key)
 
     def __len__(self):
@@ -158,17 +362,27 @@ class TwoWayOrderedDict(dict):
     def __reversed__(self):
         return self._iterate(reverse=True)
 
-    def __repr__(self):
-        return '%s(%r)' % (self.__class__.__name__, list(self.items()))
+    def _append_key(self, key):
+        """Append the given key at the end of the linked list."""
+        last = self._items[self._PREV]
+        last[self._NEXT] = self._items[self._PREV] = self._items_map[key] = [last, key, self._items]
 
-    def __eq__(self, other):
-        if not isinstance(other, self.__class__):
-            return False
+    def _extend_keys(self, keys):
+        """Append all the given keys at the end of the linked list."""
+        root = self._items
+        items_map = self._items_map
+        last = root[self._PREV]
 
-        return self.items() == other.items()
+        try:
+            for key in keys:
+                last[self._NEXT] = last = items_map[key] = [last, key, root]
+        finally:
+            root[self._PREV] = last
 
-    def __ne__(self, other):
-        return not self == other
+    def _end_key(self, last=True):
+        """Return the last (or the first if last is False) key of the linked list."""
+        index = self._PREV if last else self._NEXT
+        return self._items[index][self._KEY]
 
     def _remove_mapped_key(self, key):
         """Remove the given key both from the linked list and the items map."""
@@ -186,6 +400,105 @@ class TwoWayOrderedDict(dict):
             yield curr[self._KEY]
             curr = curr[index]
 
+    def _iterate_values(self, reverse=False):
+        """Iterate over the dictionary values."""
+        # Read the storage directly, no __getitem__ dispatch
+        return map(dict.__getitem__, repeat(self), self._iterate(reverse))
+
+    def _iterate_items(self, reverse=False):
+        """Iterate over the (key, value) pairs of the dictionary."""
+        getitem = dict.__getitem__
+
+        for key in self._iterate(reverse):
+            yield key, getitem(self, key)
+
+    def clear(self):
+        self._items = item = []
+        # Cycled double linked list [previous, key, next]
+        self._items += [item, None, item]
+        # Map linked list items into keys to speed up lookup
+        self._items_map = {}
+        dict.clear(self)
+
+
+if os.environ.get("TWODICT_PURE_PYTHON"):
+    _TwoWayOrderedDictBase = _PyTwoWayOrderedDictBase
+else:
+    try:
+        from _twodict import TwoWayOrderedDictBase as _TwoWayOrderedDictBase
+    except ImportError:
+        _TwoWayOrderedDictBase = _PyTwoWayOrderedDictBase
+
+
+class TwoWayOrderedDict(_TwoWayOrderedDictBase):
+
+    """Custom data structure which implements a two way ordered dictionary.
+
+    Custom dictionary that supports key:value relationships AND value:key
+    relationships. It also remembers the order in which the items were inserted
+    and supports almost all the features of the build-in dict.
+
+    Examples:
+        Unordered initialization::
+
+            >>> tdict = TwoWayOrderedDict(a=1, b=2, c=3)
+
+        Ordered initialization::
+
+            >>> tdict = TwoWayOrderedDict([('a', 1), ('b', 2), ('c', 3)])
+
+        Simple usage::
+
+            >>> tdict = TwoWayOrderedDict()
+            >>> tdict['a'] = 1
+            >>> tdict['b'] = 2
+            >>> tdict['c'] = 3
+
+            >>> tdict['a']  # Outputs 1
+            >>> tdict[1]  # Outputs 'a'
+
+            >>> del tdict[2]
+
+            >>> print(tdict)
+            TwoWayOrderedDict([('a', 1), ('c', 3)])
+
+    """
+
+    # Subclasses that override __setitem__ but can take collision free
+    # batches through _bulk_store() & _bulk_stored()
+    _bulk_safe = False
+
+    def __init__(self, *args, **kwargs):
+        super(TwoWayOrderedDict, self).__init__()
+
+        self.clear()
+        self.update(*args, **kwargs)
+
+    def __repr__(self):
+        return '%s(%r)' % (self.__class__.__name__, list(self.items()))
+
+    def __eq__(self, other):
+        if not isinstance(other, self.__class__):
+            return False
+
+        if len(self) != len(other):
+            return False
+
+        # Same number of pairs, so every pair of self must be a pair of
+        # other. Check them one by one straight from the storage and stop
+        # at the first difference
+        getitem = dict.__getitem__
+        other_keys = other._items_map
+
+        for key in self._iterate():
+            if key not in other_keys or getitem(self, key) != getitem(other, key):
+                return False
+
+        return True
+
+    def __ne__(self, other):
+        return not self == other
+
     def items(self):
         return DictItemsView(self)
 
@@ -195,6 +508,80 @@ class TwoWayOrderedDict(dict):
     def keys(self):
         return DictKeysView(self)
 
+    def get_many(self, items, default=_DEFAULT_OBJECT, out=None):
+        """Look up a batch of keys and/or values in a single call.
+
+        Args:
+            items (iterable): Keys and/or values to look up. When NumPy is
+                installed a NumPy array is also accepted.
+
+            default (object): Result for the missing items. When it's not
+                given a KeyError is raised instead.
+
+            out (sequence): Preallocated sequence (list, NumPy array) to
+                write the results into. Must support slice assignment.
+
+        Returns:
+            The out sequence if given, a NumPy array if items is a NumPy
+            array (integer if possible, else object) or a list otherwise.
+
+        Raises:
+            KeyError: If an item does not exist and no default is given.
+
+        """
+        as_array = _is_numpy_array(items)
+
+        if as_array:
+            items = items.tolist()
+
+        if default is _DEFAULT_OBJECT:
+            result = list(map(self.__getitem__, items))
+        else:
+            result = list(map(self.get, items, repeat(default)))
+
+        return self._batch_result(result, out, as_array)
+
+    def forward_many(self, keys, default=_DEFAULT_OBJECT, out=None):
+        """Same as get_many() but resolves only keys into values."""
+        return self._directional_many(keys, self.keys().__contains__, default, out)
+
+    def inverse_many(self, values, default=_DEFAULT_OBJECT, out=None):
+        """Same as get_many() but resolves only values into keys."""
+        return self._directional_many(values, self.values().__contains__, default, out)
+
+    def _directional_many(self, items, accept, default, out):
+        """Look up the items that pass the accept check, the rest are missing."""
+        as_array = _is_numpy_array(items)
+
+        if as_array:
+            items = items.tolist()
+
+        getitem = self.__getitem__
+        result = []
+        append = result.append
+
+        for item in items:
+            if accept(item):
+                append(getitem(item))
+            elif default is _DEFAULT_OBJECT:
+                raise KeyError(item)
+            else:
+                append(default)
+
+        return self._batch_result(result, out, as_array)
+
+    @staticmethod
+    def _batch_result(result, out, as_array):
+        """Return the result list in the format requested by the caller."""
+        if out is not None:
+            out[:len(result)] = result
+            return out
+
+        if as_array:
+            return _to_numpy_array(result)
+
+        return result
+
     def pop(self, key, default=_DEFAULT_OBJECT):
         try:
             value = self[key]
@@ -225,48 +612,5767 @@ class TwoWayOrderedDict(dict):
         if not self:
             raise KeyError('popitem(): dictionary is empty')
 
-        index = self._PREV if last else self._NEXT
-
-        _, key, _ = self._items[index]
+        key = self._end_key(last)
         value = self.pop(key)
 
         return key, value
 
-    def update(self, *args, **kwargs):
-        if len(args) > 1:
-            raise TypeError("expected at most 1 arguments, got {0}".format(len(args)))
+    def move_to_end(self, key, last=True):
+        """Move an existing item to either end of the dictionary.
 
-        for item in args:
-            if isinstance(item, dict):
-                item = item.items()
+        Args:
+            key (object): Key or value of the item to move.
 
-            for key, value in item:
-                self[key] = value
+            last (boolean): When True the item is moved to the end.
+                When False the item is moved to the beginning.
 
-        for key, value in kwargs.items():
-            self[key] = value
+        Raises:
+            KeyError: If the key does not exist.
 
-    def setdefault(self, key, default=None):
-        try:
-            return self[key]
-        except KeyError:
-            self[key] = default
-            return default
+        """
+        self._move_key(self._node_key(key), last)
 
-    def copy(self):
-        return self.__class__(self.items())
+    def move_before(self, key, anchor):
+        """Move an existing item right before the anchor item.
 
-    def clear(self):
-        self._items = item = []
-        # Cycled double linked list [previous, key, next]
-        self._items += [item, None, item]
-        # Map linked list items into keys to speed up lookup
-        self._items_map = {}
-        dict.clear(self)
+        Args:
+            key (object): Key or value of the item to move.
 
-    @staticmethod
-    def __not_implemented():
-        raise NotImplementedError("Please use the equivalent items(), keys(), values() methods")
+            anchor (object): Key or value of the item to move before.
 
-    if sys.version_info < (3, 0) and sys.version_info >= (2, 2):
-        iteritems = iterkeys = itervalues = viewitems = viewkeys = viewvalues = __not_implemented
+        Raises:
+            KeyError: If the key or the anchor does not exist.
+
+        """
+        self._move_key_next_to(self._node_key(key), self._node_key(anchor), after=False)
+
+    def move_after(self, key, anchor):
+        """Same as move_before() but moves the item right after the anchor."""
+        self._move_key_next_to(self._node_key(key), self._node_key(anchor), after=True)
+
+    def index_of(self, key):
+        """Return the position of an item in the dictionary.
+
+        Args:
+            key (object): Key or value of the item.
+
+        Raises:
+            KeyError: If the key does not exist.
+
+        Note:
+            The linked list is walked, so this is O(n). The
+            IndexedTwoWayOrderedDict answers in O(log n).
+
+        """
+        return self._key_index(self._node_key(key))
+
+    def item_at(self, index):
+        """Return the (key, value) pair at the given position.
+
+        Args:
+            index (int): Position of the item, negative values count
+                from the end like list indexes do.
+
+        Raises:
+            IndexError: If the index is out of range.
+
+        """
+        length = len(self)
+
+        if index < 0:
+            index += length
+
+        if not 0 <= index < length:
+            raise IndexError("TwoWayOrderedDict index out of range")
+
+        key = self._key_at(index)
+        return key, dict.__getitem__(self, key)
+
+    def islice(self, start=0, stop=None):
+        """Return an iterator over the (key, value) pairs from start to stop.
+
+        The positions are interpreted like the bounds of a list slice.
+
+        """
+        start, stop, _ = slice(start, stop).indices(len(self))
+        keys = self._iterate_slice(start, max(start, stop))
+
+        return ((key, dict.__getitem__(self, key)) for key in keys)
+
+    def _key_index(self, key):
+        """Return the position of an existing key."""
+        for index, item in enumerate(self._iterate()):
+            if item == key:
+                return index
+
+    def _key_at(self, index):
+        """Return the key at a valid, non negative position."""
+        length = len(self)
+
+        # Walk from the nearest end
+        if index < length // 2:
+            return next(islice(self._iterate(), index, None))
+
+        return next(islice(self._iterate(reverse=True), length - index - 1, None))
+
+    def _iterate_slice(self, start, stop):
+        """Iterate over the keys from start to stop (valid, non negative positions)."""
+        return islice(self._iterate(), start, stop)
+
+    def _node_key(self, item):
+        """Return the key of the linked list node that holds the given key or value."""
+        return item if item in self._items_map else dict.__getitem__(self, item)
+
+    def _move_key(self, key, last=True):
+        """Move an existing key to the end (or the beginning) of the linked list."""
+        node = self._items_map[key]
+        root = self._items
+        index, other = (self._PREV, self._NEXT) if last else (self._NEXT, self._PREV)
+
+        if root[index] is node:
+            return
+
+        prev_item, _, next_item = node
+        prev_item[self._NEXT] = next_item
+        next_item[self._PREV] = prev_item
+
+        end = root[index]
+        node[index] = end
+        node[other] = root
+        end[other] = root[index] = node
+
+    def _move_key_next_to(self, key, anchor, after=True):
+        """Move an existing key right after (or before) the anchor key."""
+        node = self._items_map[key]
+        anchor_node = self._items_map[anchor]
+
+        if node is anchor_node:
+            return
+
+        prev_item, _, next_item = node
+        prev_item[self._NEXT] = next_item
+        next_item[self._PREV] = prev_item
+
+        if after:
+            prev_item, next_item = anchor_node, anchor_node[self._NEXT]
+        else:
+            prev_item, next_item = anchor_node[self._PREV], anchor_node
+
+        node[self._PREV] = prev_item
+        node[self._NEXT] = next_item
+        prev_item[self._NEXT] = next_item[self._PREV] = node
+
+    def update(self, *args, **kwargs):
+        """Update the dictionary with the key:value pairs from args & kwargs.
+
+        Batches that don't collide with themselves or with the current items
+        are loaded in bulk, everything else goes through __setitem__. Both
+        paths leave the dictionary in exactly the same state as assigning
+        the pairs one by one.
+
+        """
+        if len(args) > 1:
+            raise TypeError("expected at most 1 arguments, got {0}".format(len(args)))
+
+        for item in args:
+            if isinstance(item, dict):
+                item = item.items()
+
+            self._bulk_update(item)
+
+        self._bulk_update(kwargs.items())
+
+    def _bulk_update(self, pairs):
+        """Insert the given pairs, use a single sweep when there are no collisions."""
+        pairs = list(pairs)
+
+        # Subclasses that hook __setitem__ must see every assignment,
+        # unless they follow the bulk loads through _bulk_stored()
+        if self._bulk_safe or self.__class__.__setitem__ == TwoWayOrderedDict.__setitem__:
+            try:
+                forward = dict(pairs)
+            except (TypeError, ValueError):
+                # Let __setitem__ raise at the exact same pair
+                forward = {}
+
+            if not self._has_collisions(forward, len(pairs)):
+                self._bulk_store(forward, forward if _ORDERED_DICTS else [key for key, _ in pairs])
+
+                if self._bulk_safe:
+                    self._bulk_stored(pairs)
+
+                return
+
+        for key, value in pairs:
+            self[key] = value
+
+    def _bulk_update_columns(self, keys, values):
+        """Same as _bulk_update(zip(keys, values)) without building the pairs."""
+        if len(keys) == len(values) and (self._bulk_safe or
+                                         self.__class__.__setitem__ == TwoWayOrderedDict.__setitem__):
+            try:
+                forward = dict(zip(keys, values))
+            except TypeError:
+                forward = {}
+
+            if not self._has_collisions(forward, len(keys)):
+                self._bulk_store(forward, keys)
+
+                if self._bulk_safe:
+                    self._bulk_stored(list(zip(keys, values)))
+
+                return
+
+        self._bulk_update(zip(keys, values))
+
+    def _bulk_stored(self, pairs):
+        """Called with the list of pairs after a collision free batch was stored in bulk.
+
+        Only called when _bulk_safe is set: subclasses that override
+        __setitem__ set it and keep their own state in sync here instead
+        of sending every pair through __setitem__.
+
+        """
+
+    def _bulk_store(self, forward, keys):
+        """Store the collision free forward dict, keys holds the order of the new keys."""
+        dict.update(self, zip(forward.values(), forward.keys()))
+        dict.update(self, forward)
+        self._extend_keys(keys)
+
+    def _has_collisions(self, forward, size):
+        """Check if a batch of size pairs (given as a dict) would evict or overwrite any item."""
+        backward = _inverse_batch(forward, size)
+
+        if backward is None:
+            return True
+
+        keys = _viewkeys(self)
+        return not (keys.isdisjoint(forward) and keys.isdisjoint(backward))
+
+    def apply_deltas(self, deltas, version=None):
+        """Replay the delta records of a JournaledTwoWayOrderedDict.
+
+        Runs of "set" records go through update() so they can be loaded in
+        bulk. Deletions of missing keys are ignored, so replaying the same
+        records twice is harmless.
+
+        Args:
+            deltas (iterable): (version, operation, key, value) records
+                as returned by JournaledTwoWayOrderedDict.deltas_since().
+
+            version (int): Version of the dictionary before the records.
+
+        Returns:
+            The version of the last record, the given version if there
+            were no records.
+
+        """
+        pairs = []
+
+        for version, operation, key, value in deltas:
+            if operation == "set":
+                pairs.append((key, value))
+                continue
+
+            if pairs:
+                self.update(pairs)
+                pairs = []
+
+            if operation in ("delete", "evict"):
+                self.pop(key, None)
+            elif operation == "clear":
+                self.clear()
+            elif operation == "move_to_end":
+                self.move_to_end(key, value)
+            elif operation == "move_before":
+                self.move_before(key, value)
+            elif operation == "move_after":
+                self.move_after(key, value)
+            else:
+                raise ValueError("Unknown delta operation: {0!r}".format(operation))
+
+        if pairs:
+            self.update(pairs)
+
+        return version
+
+    @classmethod
+    def from_pairs_stream(cls, fileobj, sep="\t", converters=None, chunk_size=_STREAM_CHUNK_SIZE,
+                          encoding="utf-8", progress=None, factory=None):
+        """Build a dictionary from a file of sep separated key:value lines.
+
+        The file is read in chunks, every chunk is parsed into a keys & a
+        values column and loaded with the bulk path, so besides the
+        dictionary only one chunk is held in memory. The result is the
+        same as assigning the pairs one by one. Empty lines are skipped.
+
+        Args:
+            fileobj (file object): Text or binary file to read.
+
+            sep (string): Separator between the key and the value, the
+                value is the rest of the line.
+
+            converters (tuple): (key_converter, value_converter) callables
+                applied to the str fields, None keeps a field as str.
+
+            chunk_size (int): Bytes (or characters) read at a time.
+
+            encoding (string): Encoding of binary files.
+
+            progress (callable): Called after every chunk with the number
+                of pairs and the number of bytes (or characters) read.
+
+            factory (callable): Creates the empty dictionary instead of
+                cls(), for the classes that need arguments, for example
+                functools.partial(BoundedTwoWayOrderedDict, 100).
+
+        Raises:
+            ValueError: If a non empty line has no separator.
+
+            TypeError: If cls() can't be called without arguments and no
+                factory is given.
+
+        Examples:
+            Load a TSV file of integer ids::
+
+                >>> with open('ids.tsv', 'rb') as fileobj:
+                ...     tdict = TwoWayOrderedDict.from_pairs_stream(fileobj, converters=(int, int))
+
+        """
+        tdict = _new_empty(cls if factory is None else factory)
+        converters = converters or (None, None)
+        remainder = None
+        pairs = size = lines = 0
+
+        while True:
+            chunk = fileobj.read(chunk_size)
+
+            if not chunk:
+                break
+
+            size += len(chunk)
+
+            if remainder:
+                chunk = remainder + chunk
+
+            # Parse only the complete lines, multi-byte characters are
+            # never split in between
+            end = chunk.rfind(b"\n" if isinstance(chunk, bytes) else "\n") + 1
+            remainder = chunk[end:]
+
+            if end:
+                loaded, lines = tdict._load_lines(chunk[:end], sep, converters, encoding, lines)
+                pairs += loaded
+
+            if progress is not None:
+                progress(pairs, size)
+
+        if remainder:
+            remainder += b"\n" if isinstance(remainder, bytes) else "\n"
+            loaded, lines = tdict._load_lines(remainder, sep, converters, encoding, lines)
+            pairs += loaded
+
+            if progress is not None:
+                progress(pairs, size)
+
+        return tdict
+
+    def _load_lines(self, text, sep, converters, encoding, lines):
+        """Load the newline terminated lines, return the pairs & the lines so far."""
+        if not isinstance(text, _TEXT_TYPE):
+            text = text.decode(encoding)
+
+        if "\r" in text:
+            text = text.replace("\r\n", "\n")
+
+        text_lines = text.split("\n")
+        text_lines.pop()
+
+        # (key, sep, value) rows, transposed into columns at C speed
+        rows = [line.partition(sep) for line in text_lines if line]
+        keys, seps, values = zip(*rows) if rows else ((), (), ())
+
+        if "" in seps:
+            for number, line in enumerate(text_lines, lines + 1):
+                if line and sep not in line:
+                    raise ValueError("No separator on line {0}: {1!r}".format(number, line))
+
+        key_converter, value_converter = converters
+
+        if key_converter is not None:
+            keys = list(map(key_converter, keys))
+
+        if value_converter is not None:
+            values = list(map(value_converter, values))
+
+        self._bulk_update_columns(list(keys), list(values))
+        return len(rows), lines + len(text_lines)
+
+    def to_stream(self, fileobj, sep="\t", converters=None, batch_size=_STREAM_BATCH_SIZE,
+                  encoding="utf-8", progress=None):
+        """Write the pairs in order as sep separated lines, see from_pairs_stream().
+
+        The lines are formatted and written batch_size pairs at a time.
+
+        Args:
+            fileobj (file object): Text or binary file to write.
+
+            converters (tuple): (key_converter, value_converter) callables
+                that format the keys & the values (default str).
+
+            progress (callable): Called after every batch with the number
+                of pairs and the number of bytes (or characters) written.
+
+        Returns:
+            The number of pairs written.
+
+        Raises:
+            ValueError: If a formatted key or value contains sep or a
+                newline, the file would not read back the same pairs.
+
+        """
+        binary = not isinstance(fileobj, io.TextIOBase)
+        pairs = size = 0
+
+        for count, chunk in self._stream_chunks(sep, converters, batch_size):
+            if binary:
+                chunk = chunk.encode(encoding)
+
+            fileobj.write(chunk)
+            pairs += count
+            size += len(chunk)
+
+            if progress is not None:
+                progress(pairs, size)
+
+        return pairs
+
+    def _stream_chunks(self, sep, converters, batch_size):
+        """Generator of the (pairs, text) chunks of the to_stream() lines."""
+        key_converter, value_converter = converters or (None, None)
+        key_converter = key_converter or _TEXT_TYPE
+        value_converter = value_converter or _TEXT_TYPE
+
+        items = self._iterate_items()
+
+        while True:
+            batch = list(islice(items, batch_size))
+
+            if not batch:
+                return
+
+            keys = map(key_converter, [key for key, _ in batch])
+            values = map(value_converter, [value for _, value in batch])
+
+            chunk = "\n".join([key + sep + value for key, value in zip(keys, values)]) + "\n"
+
+            if chunk.count(sep) != len(batch) or chunk.count("\n") != len(batch):
+                raise ValueError("Keys and values can't contain the separator or newlines")
+
+            yield len(batch), chunk
+
+    def setdefault(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            self[key] = default
+            return default
+
+    def copy(self):
+        """Return a shallow copy of the dictionary.
+
+        The dict storage and the order of the keys are cloned directly
+        instead of replaying every assignment.
+
+        """
+        tdict = self.__class__()
+        dict.update(tdict, _viewitems(self))
+        tdict._extend_keys(self._iterate())
+        return tdict
+
+    def __reduce__(self):
+        # Pickle every pair once (instead of both the key:value & value:key
+        # entries plus the linked list) and restore it through the bulk path
+        return _from_columns, (self.__class__, list(self.keys()), list(self.values()))
+
+    @staticmethod
+    def __not_implemented():
+        raise NotImplementedError("Please use the equivalent items(), keys(), values() methods")
+
+    if sys.version_info < (3, 0) and sys.version_info >= (2, 2):
+        iteritems = iterkeys = itervalues = viewitems = viewkeys = viewvalues = __not_implemented
+
+
+def _new_empty(factory):
+    """Return factory(), explain the error of the classes that need arguments."""
+    try:
+        return factory()
+    except TypeError as error:
+        raise TypeError("can't create an empty mapping with {0!r} ({1}), pass a callable "
+                        "that does, e.g. functools.partial(cls, ...)".format(factory, error))
+
+
+def _from_columns(factory, keys, values):
+    """Create a factory() mapping from the ordered keys & values columns."""
+    tdict = _new_empty(factory)
+
+    if isinstance(tdict, TwoWayOrderedDict):
+        tdict._bulk_update_columns(keys, values)
+    else:
+        tdict.update(zip(keys, values))
+
+    return tdict
+
+
+class CompactTwoWayOrderedDict(TwoWayOrderedDict):
+
+    """TwoWayOrderedDict that keeps the order in contiguous storage.
+
+    Instead of the cyclic doubly linked list of [prev, key, next] lists this
+    class keeps the keys in a dense Python list and maps every key to its
+    slot in that list (similar to the compact dict layout of CPython).
+    Removed keys leave a tombstone behind and the list is compacted once the
+    tombstones outnumber the live entries, so deletions are amortized O(1).
+
+    The public behaviour is identical to the TwoWayOrderedDict, only the
+    ordering structures (_items and _items_map) change: they take less
+    memory per key and iterate faster. The dict storage is the same.
+
+    """
+
+    # Compact only when there are at least that many tombstones
+    _MIN_DELETED = 8
+
+    def _append_key(self, key):
+        self._items_map[key] = len(self._items)
+        self._items.append(key)
+
+    def _extend_keys(self, keys):
+        items = self._items
+        start = len(items)
+        items.extend(keys)
+        self._items_map.update(zip(items[start:], range(start, len(items))))
+
+    def _end_key(self, last=True):
+        if last:
+            return self._items[-1]
+
+        items = self._items
+        index = self._head
+
+        while items[index] is _DELETED_OBJECT:
+            index += 1
+
+        self._head = index
+        return items[index]
+
+    def _remove_mapped_key(self, key):
+        if key in self._items_map:
+            index = self._items_map.pop(key)
+            items = self._items
+            items[index] = _DELETED_OBJECT
+
+            # Keep the last slot alive so that popitem() is O(1)
+            while items and items[-1] is _DELETED_OBJECT:
+                items.pop()
+
+            if self._head > len(items):
+                self._head = len(items)
+
+            deleted = len(items) - len(self._items_map)
+
+            if deleted > self._MIN_DELETED and deleted > len(self._items_map):
+                self._compact()
+
+    def _move_key(self, key, last=True):
+        self._remove_mapped_key(key)
+
+        if last:
+            self._append_key(key)
+        elif self._head:
+            # The slots before the head are all tombstones, reuse the last one
+            self._head -= 1
+            self._items[self._head] = key
+            self._items_map[key] = self._head
+        else:
+            self._compact()
+            self._items.insert(0, key)
+            self._compact()
+
+    def _move_key_next_to(self, key, anchor, after=True):
+        # Unlike the linked list this is O(n), every following key shifts
+        if key == anchor:
+            return
+
+        self._remove_mapped_key(key)
+        self._compact()
+        self._items.insert(self._items_map[anchor] + (1 if after else 0), key)
+        self._compact()
+
+    def _compact(self):
+        """Remove the tombstones and re-index the keys."""
+        self._items = [key for key in self._items if key is not _DELETED_OBJECT]
+        self._items_map = dict((key, index) for index, key in enumerate(self._items))
+        self._head = 0
+
+    def _iterate(self, reverse=False):
+        items = reversed(self._items) if reverse else self._items
+
+        for key in items:
+            if key is not _DELETED_OBJECT:
+                yield key
+
+    def clear(self):
+        # Dense list of keys, removed keys are replaced by tombstones
+        self._items = []
+        # Map keys into their index on the _items list
+        self._items_map = {}
+        # Index of the first slot that might hold a live key
+        self._head = 0
+        dict.clear(self)
+
+
+class IndexedTwoWayOrderedDict(CompactTwoWayOrderedDict):
+
+    """CompactTwoWayOrderedDict with O(log n) positional operations.
+
+    A Fenwick (binary indexed) tree counts the live slots of the dense key
+    list, so index_of(), item_at() and the start of islice() are answered
+    with O(log n) prefix sums instead of walking the keys. Assignments and
+    deletions stay O(1): new slots and removed keys are only recorded and
+    the tree catches up on the next positional operation, at O(log n) per
+    recorded change. Compacting the key list drops the tree, it's rebuilt
+    on demand in O(n).
+
+    Note:
+        The first positional operation after many assignments pays for
+        building the tree.
+
+    """
+
+    def _remove_mapped_key(self, key):
+        index = self._items_map.get(key)
+
+        super(IndexedTwoWayOrderedDict, self)._remove_mapped_key(key)
+
+        if index is not None and index < self._indexed:
+            self._changes.append((index, -1))
+
+        # Trailing tombstones are popped, keep only the tree nodes of the
+        # remaining slots since the popped ones will be reused
+        if len(self._items) < self._indexed:
+            self._indexed = len(self._items)
+            del self._tree[self._indexed + 1:]
+
+    def _move_key(self, key, last=True):
+        super(IndexedTwoWayOrderedDict, self)._move_key(key, last)
+
+        # The key might have been placed in a tombstone before the head
+        index = self._items_map[key]
+
+        if index < self._indexed:
+            self._changes.append((index, 1))
+
+    def _compact(self):
+        super(IndexedTwoWayOrderedDict, self)._compact()
+        self._reset_index()
+
+    def _reset_index(self):
+        # 1-based Fenwick tree over the first _indexed slots of _items
+        self._tree = [0]
+        self._indexed = 0
+        # Pending (slot, delta) changes of the indexed slots
+        self._changes = []
+
+    def _sync_index(self):
+        """Apply the pending changes and index the new slots."""
+        tree = self._tree
+        indexed = self._indexed
+
+        for index, delta in self._changes:
+            if index < indexed:
+                index += 1
+
+                while index <= indexed:
+                    tree[index] += delta
+                    index += index & -index
+
+        self._changes = []
+
+        items = self._items
+
+        for index in range(indexed + 1, len(items) + 1):
+            # Node index covers the slots (index - lowbit(index), index]
+            count = 0 if items[index - 1] is _DELETED_OBJECT else 1
+            child = index - 1
+            low = index - (index & -index)
+
+            while child > low:
+                count += tree[child]
+                child -= child & -child
+
+            tree.append(count)
+
+        self._indexed = len(items)
+
+    def _key_index(self, key):
+        self._sync_index()
+
+        tree = self._tree
+        index = self._items_map[key]
+        position = 0
+
+        while index:
+            position += tree[index]
+            index -= index & -index
+
+        return position
+
+    def _slot_at(self, position):
+        """Return the slot of the live key at the given position."""
+        self._sync_index()
+
+        tree = self._tree
+        slot = 0
+        bit = 1 << (self._indexed.bit_length() - 1) if self._indexed else 0
+
+        # Find the largest prefix with no more than position live slots
+        while bit:
+            node = slot + bit
+
+            if node <= self._indexed and tree[node] <= position:
+                slot = node
+                position -= tree[node]
+
+            bit >>= 1
+
+        return slot
+
+    def _key_at(self, index):
+        return self._items[self._slot_at(index)]
+
+    def _iterate_slice(self, start, stop):
+        items = self._items
+        slot = self._slot_at(start)
+        count = stop - start
+
+        while count > 0:
+            key = items[slot]
+
+            if key is not _DELETED_OBJECT:
+                yield key
+                count -= 1
+
+            slot += 1
+
+    def clear(self):
+        super(IndexedTwoWayOrderedDict, self).clear()
+        self._reset_index()
+
+
+class BidirectionalMap(MutableMapping):
+
+    """Two way ordered mapping that keeps keys and values apart.
+
+    Unlike the TwoWayOrderedDict, keys and values live in two different
+    dictionaries (forward & inverse) so a value can be equal to an unrelated
+    key without evicting it and every assignment costs a couple of dict
+    operations. The value:key relationships are available through the
+    inverse attribute, which shares the storage with the original mapping.
+
+    Examples:
+        Simple usage::
+
+            >>> bmap = BidirectionalMap([('a', 1), ('b', 'a')])
+
+            >>> bmap['a']  # Outputs 1
+            >>> bmap.inverse[1]  # Outputs 'a'
+            >>> bmap.inverse['a']  # Outputs 'b'
+
+            >>> del bmap.inverse[1]
+
+            >>> print(bmap)
+            BidirectionalMap([('b', 'a')])
+
+    """
+
+    def __init__(self, *args, **kwargs):
+        self._forward = _OrderedDict()
+        self._inverse = _OrderedDict()
+        self._inverse_map = None
+
+        self.update(*args, **kwargs)
+
+    @classmethod
+    def _from_dicts(cls, forward, inverse):
+        """Create a new mapping on top of the given dictionaries without copying them."""
+        bmap = cls.__new__(cls)
+        bmap._forward = forward
+        bmap._inverse = inverse
+        bmap._inverse_map = None
+        return bmap
+
+    @property
+    def inverse(self):
+        """Mapping of value:key relationships that shares storage with self.
+
+        Note:
+            The inverse mapping iterates over the values in the order they
+            were last assigned.
+
+        """
+        if self._inverse_map is None:
+            self._inverse_map = self._from_dicts(self._inverse, self._forward)
+            self._inverse_map._inverse_map = self
+
+        return self._inverse_map
+
+    def __getitem__(self, key):
+        return self._forward[key]
+
+    def __setitem__(self, key, value):
+        forward, inverse = self._forward, self._inverse
+
+        old_value = forward.get(key, _DEFAULT_OBJECT)
+
+        if old_value is not _DEFAULT_OBJECT:
+            del inverse[old_value]
+
+        old_key = inverse.pop(value, _DEFAULT_OBJECT)
+
+        if old_key is not _DEFAULT_OBJECT and old_key != key:
+            del forward[old_key]
+
+        forward[key] = value
+        inverse[value] = key
+
+    def __delitem__(self, key):
+        del self._inverse[self._forward.pop(key)]
+
+    def __contains__(self, key):
+        return key in self._forward
+
+    def __len__(self):
+        return len(self._forward)
+
+    def __iter__(self):
+        return iter(self._forward)
+
+    def __reversed__(self):
+        return reversed(self._forward)
+
+    def __repr__(self):
+        return '%s(%r)' % (self.__class__.__name__, list(self.items()))
+
+    def __eq__(self, other):
+        if not isinstance(other, self.__class__):
+            return False
+
+        # dict.__eq__ ignores the order of the OrderedDict, like the
+        # TwoWayOrderedDict equality
+        return dict.__eq__(self._forward, other._forward)
+
+    def __ne__(self, other):
+        return not self == other
+
+    def keys(self):
+        return _viewkeys(self._forward)
+
+    def items(self):
+        return _viewitems(self._forward)
+
+    def values(self):
+        return BidirectionalValuesView(self)
+
+    def popitem(self, last=True):
+        """Remove and return a (key, value) pair from the mapping.
+
+        Args:
+            last (boolean): When True popitem() will remove the last item.
+                When False popitem() will remove the first item.
+
+        Raises:
+            KeyError: If the mapping is empty.
+
+        """
+        if not self._forward:
+            raise KeyError('popitem(): dictionary is empty')
+
+        key = next(reversed(self._forward) if last else iter(self._forward))
+        return key, self.pop(key)
+
+    def copy(self):
+        return self._from_dicts(self._forward.copy(), self._inverse.copy())
+
+    def clear(self):
+        self._forward.clear()
+        self._inverse.clear()
+
+
+########## Binary serialization ##########
+#
+# File layout (all the numbers are little endian):
+#
+#   header:  b"2WOD", uint8 format version, uint64 number of items
+#   columns: the keys column followed by the values column
+#
+# Each column starts with an uint8 kind and the uint64 size of its payload:
+#
+#   _COLUMN_INT:     uint8 item size (1, 2, 4 or 8) followed by an array of
+#                    signed integers of that size
+#   _COLUMN_STR:     the strings joined with NUL and encoded as UTF-8, used
+#                    only when none of the strings contains a NUL character
+#   _COLUMN_RECORDS: one tagged record per item, see _dump_record()
+
+_MAGIC = b"2WOD"
+
+_FORMAT_VERSION = 1
+
+_HEADER = struct.Struct("<4sBQ")
+
+_COLUMN_HEADER = struct.Struct("<BQ")
+
+_COLUMN_RECORDS, _COLUMN_INT, _COLUMN_STR = range(3)
+
+_INT64 = struct.Struct("<q")
+
+_FLOAT = struct.Struct("<d")
+
+_SIZE = struct.Struct("<Q")
+
+_TEXT_TYPE = type(u"")
+
+# Item size -> array typecode of the signed integer types
+_INT_TYPECODES = dict((array(typecode).itemsize, typecode) for typecode in "qlihb")
+
+
+def _int_column(values):
+    """Return the payload of an int column or None if values are not all int64."""
+    if not all(type(value) is int for value in values):
+        return None
+
+    low, high = (min(values), max(values)) if values else (0, 0)
+
+    for size in (1, 2, 4, 8):
+        limit = 2 ** (size * 8 - 1)
+
+        if size in _INT_TYPECODES and -limit <= low and high < limit:
+            column = array(_INT_TYPECODES[size], values)
+
+            if sys.byteorder == "big":
+                column.byteswap()
+
+            return struct.pack("<B", size) + column.tobytes()
+
+    return None
+
+
+def _dump_record(obj, parts):
+    """Append the tagged record of obj to parts."""
+    obj_type = type(obj)
+
+    if obj is None:
+        parts.append(b"N")
+    elif obj_type is bool:
+        parts.append(b"T" if obj else b"F")
+    elif obj_type is int and -2 ** 63 <= obj < 2 ** 63:
+        parts.append(b"i" + _INT64.pack(obj))
+    elif obj_type is float:
+        parts.append(b"d" + _FLOAT.pack(obj))
+    elif obj_type is _TEXT_TYPE:
+        data = obj.encode("utf-8", "surrogatepass")
+        parts.append(b"s" + _SIZE.pack(len(data)) + data)
+    elif obj_type is bytes:
+        parts.append(b"b" + _SIZE.pack(len(obj)) + obj)
+    else:
+        data = pickle.dumps(obj, pickle.HIGHEST_PROTOCOL)
+        parts.append(b"p" + _SIZE.pack(len(data)) + data)
+
+
+def _dump_column(values):
+    """Return the column kind and payload for the given values."""
+    payload = _int_column(values)
+
+    if payload is not None:
+        return _COLUMN_INT, payload
+
+    if all(type(value) is _TEXT_TYPE for value in values):
+        text = u"\0".join(values)
+
+        if text.count(u"\0") == max(len(values) - 1, 0):
+            return _COLUMN_STR, text.encode("utf-8", "surrogatepass")
+
+    parts = []
+
+    for value in values:
+        _dump_record(value, parts)
+
+    return _COLUMN_RECORDS, b"".join(parts)
+
+
+def _load_record(data, offset):
+    """Parse the tagged record at offset, return the object and the next offset."""
+    tag = data[offset:offset + 1]
+    offset += 1
+
+    if tag == b"N":
+        return None, offset
+
+    if tag == b"T":
+        return True, offset
+
+    if tag == b"F":
+        return False, offset
+
+    if tag == b"i":
+        return _INT64.unpack_from(data, offset)[0], offset + _INT64.size
+
+    if tag == b"d":
+        return _FLOAT.unpack_from(data, offset)[0], offset + _FLOAT.size
+
+    if tag not in (b"s", b"b", b"p"):
+        raise ValueError("invalid record tag {0!r}".format(tag))
+
+    size = _SIZE.unpack_from(data, offset)[0]
+    offset += _SIZE.size
+    chunk = data[offset:offset + size]
+    offset += size
+
+    if tag == b"s":
+        return chunk.decode("utf-8", "surrogatepass"), offset
+
+    if tag == b"b":
+        return chunk, offset
+
+    return pickle.loads(chunk), offset
+
+
+def _load_records(data, count):
+    """Parse count tagged records from data."""
+    values = []
+    append = values.append
+    offset = 0
+
+    for _ in range(count):
+        value, offset = _load_record(data, offset)
+        append(value)
+
+    return values
+
+
+def _load_column(fileobj, count):
+    """Read the next column with count values from fileobj."""
+    kind, size = _COLUMN_HEADER.unpack(_read_exactly(fileobj, _COLUMN_HEADER.size))
+    data = _read_exactly(fileobj, size)
+
+    if kind == _COLUMN_RECORDS:
+        return _load_records(data, count)
+
+    if kind == _COLUMN_STR:
+        return data.decode("utf-8", "surrogatepass").split(u"\0") if count else []
+
+    if kind == _COLUMN_INT and data and ord(data[:1]) in _INT_TYPECODES:
+        column = array(_INT_TYPECODES[ord(data[:1])])
+        column.frombytes(data[1:])
+
+        if sys.byteorder == "big":
+            column.byteswap()
+
+        return column.tolist()
+
+    raise ValueError("invalid column kind {0}".format(kind))
+
+
+def _read_exactly(fileobj, size):
+    data = fileobj.read(size)
+
+    if len(data) != size:
+        raise ValueError("unexpected end of file")
+
+    return data
+
+
+def dump(tdict, fileobj):
+    """Write tdict into the binary file object fileobj.
+
+    The pairs are stored once, in order, as a keys and a values column.
+    Columns that contain only int64 numbers or only strings are written as
+    flat arrays which are much faster to load (and smaller), anything else is stored as
+    tagged records (objects of unknown types are pickled).
+
+    Args:
+        tdict (TwoWayOrderedDict): Mapping to serialize.
+
+        fileobj (file): File object opened in binary write mode.
+
+    """
+    keys = list(tdict.keys())
+    values = list(tdict.values())
+
+    fileobj.write(_HEADER.pack(_MAGIC, _FORMAT_VERSION, len(keys)))
+
+    for column in (keys, values):
+        kind, payload = _dump_column(column)
+
+        fileobj.write(_COLUMN_HEADER.pack(kind, len(payload)))
+        fileobj.write(payload)
+
+
+def load(fileobj, cls=TwoWayOrderedDict):
+    """Read a mapping written by dump() from the binary file object fileobj.
+
+    Args:
+        fileobj (file): File object opened in binary read mode.
+
+        cls (type or callable): Class of the returned mapping, classes that
+            need arguments (BoundedTwoWayOrderedDict) can be passed as a
+            callable that creates an empty instance, for example
+            functools.partial(BoundedTwoWayOrderedDict, 100).
+
+    Warning:
+        Objects of unknown types are unpickled, never load data received
+        from an untrusted source.
+
+    Raises:
+        ValueError: If fileobj does not contain a valid dump.
+
+    """
+    magic, version, count = _HEADER.unpack(_read_exactly(fileobj, _HEADER.size))
+
+    if magic != _MAGIC:
+        raise ValueError("not a twodict dump")
+
+    if version != _FORMAT_VERSION:
+        raise ValueError("unsupported format version {0}".format(version))
+
+    keys = _load_column(fileobj, count)
+    values = _load_column(fileobj, count)
+
+    if isinstance(cls, type) and not issubclass(cls, TwoWayOrderedDict):
+        return cls(zip(keys, values))
+
+    return _from_columns(cls, keys, values)
+
+
+########## Typed dictionaries ##########
+
+class _DenseIndex(object):
+
+    """Maps integers to slots, through a plain array for the dense integers.
+
+    Integers in [0, len(slots)) are stored in the slots array (slot + 1,
+    0 = missing) so a lookup is a single index. The array grows to fit
+    integers up to about twice its size (plus the size of a batch), anything
+    else (negative or far away integers) goes to the sparse dict.
+
+    """
+
+    # The array always grows to fit at least that many integers
+    _MIN_SIZE = 1024
+
+    def __init__(self):
+        self.slots = array("q")
+        self.sparse = {}
+
+    def get(self, number, default=-1):
+        if 0 <= number < len(self.slots):
+            return self.slots[number] - 1
+
+        return self.sparse.get(number, default)
+
+    def __setitem__(self, number, slot):
+        size = len(self.slots)
+
+        if size <= number < 2 * size + self._MIN_SIZE:
+            self._grow(max(number + 1, 2 * size, self._MIN_SIZE))
+            size = len(self.slots)
+
+        if 0 <= number < size:
+            self.slots[number] = slot + 1
+        else:
+            self.sparse[number] = slot
+
+    def update(self, pairs):
+        pairs = list(pairs)
+        size = len(self.slots)
+        high = max([number for number, _ in pairs] or [-1])
+
+        # Grow once for the whole batch
+        if size <= high < 2 * (size + len(pairs)) + self._MIN_SIZE:
+            self._grow(max(high + 1, 2 * size, self._MIN_SIZE))
+            size = len(self.slots)
+
+        slots, sparse = self.slots, self.sparse
+
+        for number, slot in pairs:
+            if 0 <= number < size:
+                slots[number] = slot + 1
+            else:
+                sparse[number] = slot
+
+    def pop(self, number):
+        if 0 <= number < len(self.slots):
+            self.slots[number] = 0
+        else:
+            del self.sparse[number]
+
+    def _grow(self, size):
+        old_size = len(self.slots)
+        self.slots.extend(array("q", [0]) * (size - old_size))
+
+        # Move the sparse integers that are dense now
+        for number in [number for number in self.sparse if old_size <= number < size]:
+            self.slots[number] = self.sparse.pop(number) + 1
+
+
+class TypedKeysView(_HashedSetOperations, KeysView):
+
+    def __repr__(self):
+        return "dict_keys({data})".format(data=list(self))
+
+    def __contains__(self, key):
+        return self._mapping._find(key, _KEY_SIDE) >= 0
+
+    def __iter__(self):
+        return self._mapping._iterate(_KEY_SIDE)
+
+    def __reversed__(self):
+        return self._mapping._iterate(_KEY_SIDE, reverse=True)
+
+
+class TypedValuesView(_HashedSetOperations, ValuesView):
+
+    def __repr__(self):
+        return "dict_values({data})".format(data=list(self))
+
+    def __contains__(self, value):
+        return self._mapping._find(value, _VALUE_SIDE) >= 0
+
+    def __iter__(self):
+        return self._mapping._iterate(_VALUE_SIDE)
+
+    def __reversed__(self):
+        return self._mapping._iterate(_VALUE_SIDE, reverse=True)
+
+
+class TypedItemsView(_HashedSetOperations, ItemsView):
+
+    def __repr__(self):
+        return "dict_items({data})".format(data=list(self))
+
+    def __contains__(self, item):
+        if not isinstance(item, tuple) or len(item) != 2:
+            return False
+
+        slot = self._mapping._find(item[0], _KEY_SIDE)
+        return slot >= 0 and self._mapping._values[slot] == item[1]
+
+    def __iter__(self):
+        return zip(self._mapping._iterate(_KEY_SIDE), self._mapping._iterate(_VALUE_SIDE))
+
+    def __reversed__(self):
+        return zip(self._mapping._iterate(_KEY_SIDE, reverse=True),
+                   self._mapping._iterate(_VALUE_SIDE, reverse=True))
+
+
+class _TypedTwoWayOrderedDict(MutableMapping):
+
+    """Base class of the two way ordered mappings with typed columns.
+
+    The pairs live in two parallel columns (the keys & the values) in
+    insertion order plus a bytearray of live flags, removed pairs leave a
+    dead slot behind and the columns are compacted once the dead slots
+    outnumber the live ones (like in the CompactTwoWayOrderedDict). Each
+    side has an index that maps its objects to their slot.
+
+    Subclasses set the column types and the indexes.
+
+    """
+
+    # Compact only when there are at least that many dead slots
+    _MIN_DELETED = 8
+
+    # Accepted type of the keys & the values
+    _types = (int, int)
+
+    def __init__(self, data=()):
+        self.clear()
+        self.update(data)
+
+    def _new_column(self, side):
+        """Return an empty column for the given side."""
+        return array("q")
+
+    def _new_index(self, side):
+        """Return an empty index for the given side."""
+        return _DenseIndex()
+
+    def _find(self, obj, side):
+        """Return the slot of obj on the given side or -1."""
+        # Objects of the wrong type can't be on that side
+        if not isinstance(obj, self._types[side]):
+            return -1
+
+        return self._indexes[side].get(obj, -1)
+
+    def _check(self, obj, side):
+        if not isinstance(obj, self._types[side]):
+            raise TypeError("{0} {1} must be of type {2}, not {3}".format(
+                self.__class__.__name__, ("keys", "values")[side], self._types[side].__name__, type(obj).__name__))
+
+        # Checked up front, a failed append would misalign the columns
+        if self._types[side] is int and not -2 ** 63 <= obj < 2 ** 63:
+            raise OverflowError("{0} {1} must fit in a signed 64 bit integer, got {2}".format(
+                self.__class__.__name__, ("keys", "values")[side], obj))
+
+    def update(self, *args, **kwargs):
+        """Update the mapping with the key:value pairs from args & kwargs.
+
+        Batches of new pairs that don't collide with each other or with the
+        current pairs are appended in bulk, everything else goes through
+        __setitem__.
+
+        """
+        if len(args) > 1:
+            raise TypeError("expected at most 1 arguments, got {0}".format(len(args)))
+
+        for item in args:
+            if isinstance(item, Mapping):
+                item = item.items()
+
+            self._bulk_update(item)
+
+        self._bulk_update(kwargs.items())
+
+    def _bulk_update(self, pairs):
+        pairs = list(pairs)
+        keys, values = [key for key, _ in pairs], [value for _, value in pairs]
+
+        if self._has_collisions(keys, values):
+            for key, value in pairs:
+                self[key] = value
+
+            return
+
+        self._check_exports()
+
+        start = len(self._alive)
+        self._keys.extend(keys)
+        self._values.extend(values)
+        self._alive.extend(b"\x01" * len(keys))
+        self._count += len(keys)
+
+        for side, column in ((_KEY_SIDE, keys), (_VALUE_SIDE, values)):
+            self._indexes[side].update(zip(column, range(start, start + len(column))))
+
+    def _has_collisions(self, keys, values):
+        """Check if the batch of pairs would remove or overwrite any pair (or has the wrong types)."""
+        key_type, value_type = self._types
+
+        if not (all(isinstance(key, key_type) for key in keys) and all(isinstance(value, value_type) for value in values)):
+            return True
+
+        # Out of range ints raise from __setitem__ before touching the columns
+        for column, column_type in ((keys, key_type), (values, value_type)):
+            if column_type is int and column and not (-2 ** 63 <= min(column) and max(column) < 2 ** 63):
+                return True
+
+        batch = set(keys)
+        batch.update(values)
+
+        if len(batch) != len(keys) + len(values):
+            return True
+
+        find = self._find
+        return bool(self._count) and any(find(obj, _KEY_SIDE) >= 0 or find(obj, _VALUE_SIDE) >= 0 for obj in batch)
+
+    def _remove(self, slot):
+        keys, values = self._keys, self._values
+
+        self._indexes[_KEY_SIDE].pop(keys[slot])
+        self._indexes[_VALUE_SIDE].pop(values[slot])
+        self._alive[slot] = 0
+        self._count -= 1
+
+        # Drop the dead slots at the end so that popitem() is O(1)
+        while self._alive and not self._alive[-1]:
+            self._alive.pop()
+            keys.pop()
+            values.pop()
+
+        if self._head > len(self._alive):
+            self._head = len(self._alive)
+
+        deleted = len(self._alive) - self._count
+
+        if deleted > self._MIN_DELETED and deleted > self._count:
+            self._compact()
+
+    def _compact(self):
+        """Remove the dead slots and re-index the pairs."""
+        keys = self._new_column(_KEY_SIDE)
+        values = self._new_column(_VALUE_SIDE)
+        keys.extend(compress(self._keys, self._alive))
+        values.extend(compress(self._values, self._alive))
+
+        self._keys, self._values = keys, values
+        self._exported = []
+        self._alive = bytearray(b"\x01") * len(keys)
+        self._head = 0
+        self._indexes = (self._new_index(_KEY_SIDE), self._new_index(_VALUE_SIDE))
+
+        for side, column in ((_KEY_SIDE, keys), (_VALUE_SIDE, values)):
+            index = self._indexes[side]
+
+            for slot, obj in enumerate(column):
+                index[obj] = slot
+
+    def _first_slot(self):
+        alive = self._alive
+
+        while not alive[self._head]:
+            self._head += 1
+
+        return self._head
+
+    def _iterate(self, side, reverse=False):
+        """Iterate over the live keys (or values) in order."""
+        column = self._keys if side == _KEY_SIDE else self._values
+
+        if reverse:
+            return compress(reversed(column), reversed(self._alive))
+
+        return compress(column, self._alive)
+
+    def __getitem__(self, item):
+        slot = self._find(item, _KEY_SIDE)
+
+        if slot >= 0:
+            return self._values[slot]
+
+        slot = self._find(item, _VALUE_SIDE)
+
+        if slot >= 0:
+            return self._keys[slot]
+
+        raise KeyError(item)
+
+    def __setitem__(self, key, value):
+        self._check(key, _KEY_SIDE)
+        self._check(value, _VALUE_SIDE)
+        self._check_exports()
+
+        # Same rules as the TwoWayOrderedDict: an existing key keeps its
+        # place, any other pair that contains key or value is removed
+        current = self._find(key, _KEY_SIDE)
+
+        for obj, side in ((key, _VALUE_SIDE), (value, _KEY_SIDE), (value, _VALUE_SIDE)):
+            slot = self._find(obj, side)
+
+            if slot >= 0 and slot != current:
+                self._remove(slot)
+                # A removal might compact the columns
+                current = self._find(key, _KEY_SIDE)
+
+        if current >= 0:
+            self._indexes[_VALUE_SIDE].pop(self._values[current])
+            self._values[current] = value
+        else:
+            current = len(self._alive)
+            self._keys.append(key)
+            self._values.append(value)
+            self._alive.append(1)
+            self._indexes[_KEY_SIDE][key] = current
+            self._count += 1
+
+        self._indexes[_VALUE_SIDE][value] = current
+
+    def __delitem__(self, item):
+        slot = self._find(item, _KEY_SIDE)
+
+        if slot < 0:
+            slot = self._find(item, _VALUE_SIDE)
+
+        if slot < 0:
+            raise KeyError(item)
+
+        self._check_exports()
+        self._remove(slot)
+
+    def __contains__(self, item):
+        return self._find(item, _KEY_SIDE) >= 0 or self._find(item, _VALUE_SIDE) >= 0
+
+    def __len__(self):
+        return self._count
+
+    def __iter__(self):
+        return self._iterate(_KEY_SIDE)
+
+    def __reversed__(self):
+        return self._iterate(_KEY_SIDE, reverse=True)
+
+    def __repr__(self):
+        return '%s(%r)' % (self.__class__.__name__, list(self.items()))
+
+    def __eq__(self, other):
+        if not isinstance(other, self.__class__):
+            return False
+
+        contains = other.items().__contains__
+        return len(self) == len(other) and all(contains(item) for item in self.items())
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __reduce__(self):
+        return self.__class__, (list(self.items()),)
+
+    def keys(self):
+        return TypedKeysView(self)
+
+    def values(self):
+        return TypedValuesView(self)
+
+    def items(self):
+        return TypedItemsView(self)
+
+    def popitem(self, last=True):
+        """Remove and return the last (or the first if last is False) pair."""
+        if not self._count:
+            raise KeyError('popitem(): dictionary is empty')
+
+        self._check_exports()
+
+        slot = len(self._alive) - 1 if last else self._first_slot()
+        item = self._keys[slot], self._values[slot]
+        self._remove(slot)
+
+        return item
+
+    def copy(self):
+        return self.__class__(self.items())
+
+    def clear(self):
+        self._keys = self._new_column(_KEY_SIDE)
+        self._values = self._new_column(_VALUE_SIDE)
+        # 1 for the live slots, 0 for the removed pairs
+        self._alive = bytearray()
+        # Index of the first slot that might be alive
+        self._head = 0
+        self._count = 0
+        self._indexes = (self._new_index(_KEY_SIDE), self._new_index(_VALUE_SIDE))
+        # Columns that might have memoryviews alive
+        self._exported = []
+
+    def values_buffer(self):
+        """Return the values column, in insertion order, as a zero-copy memoryview.
+
+        Note:
+            The dictionary can't be modified (BufferError) while the view
+            is alive, release it (e.g. with a with statement) when done.
+
+        """
+        return self._export("_values")
+
+    def _export(self, column_name):
+        """Return a memoryview of the compacted column."""
+        if self._count != len(self._alive):
+            self._compact()
+
+        column = getattr(self, column_name)
+        self._exported.append(column)
+
+        return memoryview(column)
+
+    def _check_exports(self):
+        """Raise BufferError while a memoryview of a column is alive."""
+        for column in self._exported:
+            # Resizing an array fails while it has exported buffers
+            column.append(0)
+            column.pop()
+
+        self._exported = []
+
+
+class StrIntTwoWayOrderedDict(_TypedTwoWayOrderedDict):
+
+    """Two way ordered mapping of str keys to int values (e.g. label <-> id).
+
+    The values are stored unboxed in an array('q') column and the reverse
+    direction of dense ids (small non negative ints) is a plain array index
+    from the id to the slot of its label, only ids far from the others fall
+    back to a dict. Lookups by key go through a regular str -> slot dict.
+
+    Keys must be str and values must be int in [-2**63, 2**63) otherwise
+    the assignment raises TypeError (OverflowError). Lookups of objects of
+    other types raise KeyError, so unlike the TwoWayOrderedDict 1.0 doesn't
+    find the id 1.
+
+    Examples:
+        Label <-> dense id mapping::
+
+            >>> labels = StrIntTwoWayOrderedDict([('cat', 0), ('dog', 1)])
+            >>> labels[1]  # Outputs 'dog'
+
+            >>> with labels.values_buffer() as ids:
+            ...     numpy.frombuffer(ids, dtype=numpy.int64)
+
+    """
+
+    _types = (_TEXT_TYPE, int)
+
+    def _new_column(self, side):
+        return [] if side == _KEY_SIDE else array("q")
+
+    def _new_index(self, side):
+        return {} if side == _KEY_SIDE else _DenseIndex()
+
+    def __getitem__(self, item):
+        # Keys & values never collide, dispatch on the type instead of
+        # trying both sides
+        if type(item) is int:
+            slots = self._indexes[_VALUE_SIDE].slots
+
+            # Dense ids: a plain array index
+            if 0 <= item < len(slots):
+                slot = slots[item] - 1
+            else:
+                slot = self._indexes[_VALUE_SIDE].sparse.get(item, -1)
+
+            if slot >= 0:
+                return self._keys[slot]
+        elif type(item) is _TEXT_TYPE:
+            slot = self._indexes[_KEY_SIDE].get(item, -1)
+
+            if slot >= 0:
+                return self._values[slot]
+        else:
+            return super(StrIntTwoWayOrderedDict, self).__getitem__(item)
+
+        raise KeyError(item)
+
+
+class IntTwoWayOrderedDict(_TypedTwoWayOrderedDict):
+
+    """Two way ordered mapping of int keys to int values (e.g. id <-> id).
+
+    Both columns are array('q') and both directions use dense array
+    indexes (see StrIntTwoWayOrderedDict), so a pair of dense ids takes a
+    fraction of the memory of the two dict entries, the two boxed ints and
+    the linked list node of the TwoWayOrderedDict.
+
+    Keys & values share the same space like in the TwoWayOrderedDict:
+    a lookup tries the keys first and then the values.
+
+    """
+
+    def keys_buffer(self):
+        """Return the keys column, in insertion order, as a zero-copy memoryview.
+
+        Note:
+            Same restrictions as values_buffer().
+
+        """
+        return self._export("_keys")
+
+
+########## Memory mapped frozen dictionary ##########
+#
+# File layout (all the numbers are little endian):
+#
+#   header:  b"2WOF", uint8 format version, uint64 number of items, uint64
+#            number of slots per hash table (power of two)
+#   entries: uint64 offsets of the key & value records for each item in
+#            insertion order, relative to the start of the records
+#   forward: hash table of the keys, one (uint64 hash, uint64 entry index + 1)
+#            pair per slot, open addressing with linear probing, 0 = empty
+#   inverse: hash table of the values, same layout as the forward table
+#   records: the tagged records of the keys & values, see _dump_record()
+
+_FROZEN_MAGIC = b"2WOF"
+
+_FROZEN_HEADER = struct.Struct("<4sB3xQQ")
+
+_PAIR = struct.Struct("<QQ")
+
+_KEY_SIDE, _VALUE_SIDE = 0, 1
+
+
+def _encode_record(obj):
+    """Return the tagged record of obj."""
+    parts = []
+    _dump_record(obj, parts)
+    return parts[0]
+
+
+def _stable_hash(obj, record=None):
+    """Hash of obj that is the same in every process (unlike hash() of str).
+
+    Numbers that compare equal (True, 1, 1.0) get the same hash, every other
+    object is hashed by its record (or by its pickle for unknown types).
+
+    """
+    # Unhashable objects can't be keys or values, same as dict lookups
+    hash(obj)
+
+    if type(obj) is bool or (type(obj) is float and obj.is_integer()):
+        obj, record = int(obj), None
+
+    if record is None:
+        record = _encode_record(obj)
+
+    return zlib.crc32(record) & 0xffffffff
+
+
+def _build_hash_table(hashes, size):
+    """Return the open addressing table of the given hashes as an array."""
+    table = array("Q", [0]) * (size * 2)
+    mask = size - 1
+
+    for index, obj_hash in enumerate(hashes):
+        slot = obj_hash & mask
+
+        while table[slot * 2 + 1]:
+            slot = (slot + 1) & mask
+
+        table[slot * 2] = obj_hash
+        table[slot * 2 + 1] = index + 1
+
+    return table
+
+
+class FrozenKeysView(_HashedSetOperations, KeysView):
+
+    def __repr__(self):
+        return "dict_keys({data})".format(data=list(self))
+
+    def __contains__(self, key):
+        return self._mapping._find(key, _KEY_SIDE) >= 0
+
+
+class FrozenValuesView(_HashedSetOperations, ValuesView):
+
+    def __repr__(self):
+        return "dict_values({data})".format(data=list(self))
+
+    def __contains__(self, value):
+        return self._mapping._find(value, _VALUE_SIDE) >= 0
+
+    def __iter__(self):
+        return self._mapping._iterate(_VALUE_SIDE)
+
+
+class FrozenItemsView(_HashedSetOperations, ItemsView):
+
+    def __repr__(self):
+        return "dict_items({data})".format(data=list(self))
+
+    def __contains__(self, item):
+        if not isinstance(item, tuple) or len(item) != 2:
+            return False
+
+        index = self._mapping._find(item[0], _KEY_SIDE)
+        return index >= 0 and self._mapping._record(index, _VALUE_SIDE) == item[1]
+
+    def __iter__(self):
+        mapping = self._mapping
+        return zip(mapping._iterate(_KEY_SIDE), mapping._iterate(_VALUE_SIDE))
+
+
+class FrozenTwoWayOrderedDict(Mapping):
+
+    """Read only TwoWayOrderedDict that lives in a memory mapped file.
+
+    The items, their order and a hash table for each direction are stored
+    in a file that is opened with mmap, so lookups (in both directions),
+    ordered iteration and len() work directly on the shared pages. Every
+    process that opens the same file shares the memory of the OS page cache
+    and opening it is instant no matter how many items it holds.
+
+    Examples:
+        Build the file once::
+
+            >>> tdict = TwoWayOrderedDict([('a', 1), ('b', 2)])
+            >>> FrozenTwoWayOrderedDict.build(tdict, 'labels.2wof')
+
+        Open it from any process::
+
+            >>> frozen = FrozenTwoWayOrderedDict('labels.2wof')
+
+            >>> frozen['a']  # Outputs 1
+            >>> frozen[2]  # Outputs 'b'
+
+    Note:
+        Keys & values are compared with == like in the TwoWayOrderedDict but
+        they are hashed by their serialized form, so objects of types other
+        than None, bool, int, float, str & bytes are found only when they
+        pickle to the same bytes.
+
+    Warning:
+        Objects of unknown types are stored pickled, never open files
+        received from an untrusted source.
+
+    """
+
+    def __init__(self, path):
+        self._path = path
+
+        with open(path, "rb") as fileobj:
+            self._mmap = mmap.mmap(fileobj.fileno(), 0, access=mmap.ACCESS_READ)
+
+        try:
+            magic, version, count, size = _FROZEN_HEADER.unpack_from(self._mmap, 0)
+        except struct.error:
+            magic = version = None
+
+        if magic != _FROZEN_MAGIC:
+            self._mmap.close()
+            raise ValueError("not a frozen twodict file")
+
+        if version != _FORMAT_VERSION:
+            self._mmap.close()
+            raise ValueError("unsupported format version {0}".format(version))
+
+        self._count = count
+        self._mask = size - 1
+
+        self._entries = _FROZEN_HEADER.size
+        self._tables = (self._entries + count * _PAIR.size,
+                        self._entries + (count + size) * _PAIR.size)
+        self._records = self._entries + (count + size * 2) * _PAIR.size
+
+    @classmethod
+    def build(cls, tdict, path):
+        """Write the items of tdict into path and return the frozen dictionary.
+
+        Args:
+            tdict (TwoWayOrderedDict): Mapping to freeze.
+
+            path (string): File to write, it will be overwritten.
+
+        """
+        records = []
+        offsets = array("Q")
+        hashes = ([], [])
+        offset = 0
+
+        for item in tdict.items():
+            for side, obj in enumerate(item):
+                _dump_record(obj, records)
+
+                offsets.append(offset)
+                offset += len(records[-1])
+                hashes[side].append(_stable_hash(obj, records[-1]))
+
+        # Keep the load factor of the tables under 50%
+        size = 8
+
+        while size < len(offsets):
+            size *= 2
+
+        tables = [_build_hash_table(side_hashes, size) for side_hashes in hashes]
+
+        if sys.byteorder == "big":
+            for column in [offsets] + tables:
+                column.byteswap()
+
+        with open(path, "wb") as fileobj:
+            fileobj.write(_FROZEN_HEADER.pack(_FROZEN_MAGIC, _FORMAT_VERSION, len(offsets) // 2, size))
+            fileobj.write(offsets.tobytes())
+
+            for table in tables:
+                fileobj.write(table.tobytes())
+
+            fileobj.write(b"".join(records))
+
+        return cls(path)
+
+    def _record(self, index, side):
+        """Return the key (or value) of the item at index."""
+        offset = _PAIR.unpack_from(self._mmap, self._entries + index * _PAIR.size)[side]
+        return _load_record(self._mmap, self._records + offset)[0]
+
+    def _find(self, obj, side):
+        """Return the index of the item whose key (or value) is obj, else -1."""
+        data, mask, table = self._mmap, self._mask, self._tables[side]
+
+        obj_hash = _stable_hash(obj)
+        slot = obj_hash & mask
+
+        while True:
+            slot_hash, index = _PAIR.unpack_from(data, table + slot * _PAIR.size)
+
+            if not index:
+                return -1
+
+            if slot_hash == obj_hash and self._record(index - 1, side) == obj:
+                return index - 1
+
+            slot = (slot + 1) & mask
+
+    def _iterate(self, side, reverse=False):
+        """Generator that iterates over the keys (or values) in order."""
+        indexes = range(self._count - 1, -1, -1) if reverse else range(self._count)
+
+        for index in indexes:
+            yield self._record(index, side)
+
+    def __getitem__(self, key):
+        index = self._find(key, _KEY_SIDE)
+
+        if index >= 0:
+            return self._record(index, _VALUE_SIDE)
+
+        index = self._find(key, _VALUE_SIDE)
+
+        if index >= 0:
+            return self._record(index, _KEY_SIDE)
+
+        raise KeyError(key)
+
+    def __contains__(self, key):
+        return self._find(key, _KEY_SIDE) >= 0 or self._find(key, _VALUE_SIDE) >= 0
+
+    def __len__(self):
+        return self._count
+
+    def __iter__(self):
+        return self._iterate(_KEY_SIDE)
+
+    def __reversed__(self):
+        return self._iterate(_KEY_SIDE, reverse=True)
+
+    def __repr__(self):
+        return '%s(%r)' % (self.__class__.__name__, list(self.items()))
+
+    def __eq__(self, other):
+        if not isinstance(other, self.__class__):
+            return False
+
+        contains = other.items().__contains__
+        return len(self) == len(other) and all(contains(item) for item in self.items())
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __reduce__(self):
+        # Other processes map the same file instead of copying the items
+        return self.__class__, (self._path,)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def keys(self):
+        return FrozenKeysView(self)
+
+    def values(self):
+        return FrozenValuesView(self)
+
+    def items(self):
+        return FrozenItemsView(self)
+
+    def close(self):
+        """Unmap the file, the dictionary can't be used afterwards."""
+        self._mmap.close()
+
+
+########## Shared memory dictionary ##########
+#
+# Block layout (all the numbers are little endian):
+#
+#   header:  b"2WOS", uint8 format version, uint64 capacity (max number of
+#            items), uint64 number of slots per hash table (power of two),
+#            uint64 key size, uint64 value size
+#   state:   uint64 sequence (odd while a write is in progress), uint64
+#            number of items, uint64 number of used entries, uint64 number
+#            of deleted slots in the hash tables
+#   entries: the ordering array, capacity entries in insertion order. Each
+#            entry holds an uint8 state, the uint32 hashes of the key & the
+#            value and the tagged records (see _dump_record()) of the key &
+#            the value padded to key size & value size bytes
+#   forward: hash table of the keys, one (uint64 hash, uint64 entry index + 1)
+#            pair per slot, open addressing with linear probing, 0 = empty,
+#            _DELETED_SLOT = deleted
+#   inverse: hash table of the values, same layout as the forward table
+
+_SHARED_MAGIC = b"2WOS"
+
+_SHARED_HEADER = struct.Struct("<4sB3xQQQQ")
+
+_SHARED_STATE = struct.Struct("<QQQQ")
+
+_SHARED_ENTRY = struct.Struct("<B3xII")
+
+_DELETED_SLOT = 2 ** 64 - 1
+
+_LIVE_ENTRY, _DEAD_ENTRY = 1, 2
+
+# Blocks created by this process (or the process it was forked from), the
+# resource tracker registration of those belongs to the creator
+_CREATED_BLOCKS = set()
+
+
+class SharedKeysView(_HashedSetOperations, KeysView):
+
+    def __repr__(self):
+        return "dict_keys({data})".format(data=list(self))
+
+    def __contains__(self, key):
+        return self._mapping._read(self._mapping._find, key, _KEY_SIDE) >= 0
+
+    def __iter__(self):
+        return iter([key for key, _ in self._mapping._snapshot()])
+
+
+class SharedValuesView(_HashedSetOperations, ValuesView):
+
+    def __repr__(self):
+        return "dict_values({data})".format(data=list(self))
+
+    def __contains__(self, value):
+        return self._mapping._read(self._mapping._find, value, _VALUE_SIDE) >= 0
+
+    def __iter__(self):
+        return iter([value for _, value in self._mapping._snapshot()])
+
+
+class SharedItemsView(_HashedSetOperations, ItemsView):
+
+    def __repr__(self):
+        return "dict_items({data})".format(data=list(self))
+
+    def __contains__(self, item):
+        if not isinstance(item, tuple) or len(item) != 2:
+            return False
+
+        return self._mapping._read(self._mapping._has_item, item[0], item[1])
+
+    def __iter__(self):
+        return iter(self._mapping._snapshot())
+
+
+class SharedTwoWayOrderedDict(MutableMapping):
+
+    """TwoWayOrderedDict that lives in a multiprocessing shared memory block.
+
+    Both directions are kept in open addressing hash tables and the order in
+    an array of fixed size entries, all inside a single shared memory block,
+    so every process that attaches to it reads the current items instead of
+    a stale copy. Keys & values are stored in place as tagged records of at
+    most key_size & value_size bytes.
+
+    A single process (or one process at a time) may write. Readers never
+    block: the writer makes a sequence number odd while it changes the
+    block and even again when it's done, a reader that overlaps with a write
+    simply retries (seqlock). Iteration reads a consistent snapshot of the
+    items.
+
+    Attaching is instant no matter how many items the block holds, but
+    every lookup decodes records so it's much slower than a lookup in a
+    private copy.
+
+    Examples:
+        Create the block in the writer process::
+
+            >>> tdict = SharedTwoWayOrderedDict.create(100000, [('a', 1)])
+            >>> tdict['b'] = 2
+
+        Pass it to the workers, they attach to the same block::
+
+            >>> pool.map(worker, [tdict] * 4)
+
+        Release the block once every process is done with it::
+
+            >>> tdict.close()
+            >>> tdict.unlink()
+
+    Note:
+        Keys & values are compared with == but hashed by their serialized
+        form like in the FrozenTwoWayOrderedDict, so objects of types other
+        than None, bool, int, float, str & bytes are found only when they
+        pickle to the same bytes.
+
+        Readers spin while a write is in progress, a writer that dies in
+        the middle of a write leaves the block unreadable.
+
+    Warning:
+        Objects of unknown types are stored pickled, never attach to blocks
+        created by untrusted processes.
+
+    """
+
+    def __init__(self, name):
+        if shared_memory is None:
+            raise NotImplementedError("multiprocessing.shared_memory requires Python 3.8+")
+
+        # The creator owns the block, don't let the resource tracker of
+        # this process unlink it at exit
+        try:
+            shm = shared_memory.SharedMemory(name, track=False)
+            tracked = False
+        except TypeError:
+            # Python < 3.13 registers every attached block (on POSIX)
+            shm = shared_memory.SharedMemory(name)
+            tracked = os.name == "posix"
+
+        self._open(shm)
+
+        if tracked and shm._name not in _CREATED_BLOCKS:
+            resource_tracker.unregister(shm._name, "shared_memory")
+
+    @classmethod
+    def create(cls, capacity, items=(), key_size=64, value_size=64, name=None):
+        """Create a new shared memory block and return its dictionary.
+
+        Args:
+            capacity (int): Maximum number of items.
+
+            items (mapping or iterable): Initial key:value pairs.
+
+            key_size (int): Maximum size of the key records in bytes,
+                e.g. a str takes 9 bytes plus its UTF-8 encoding and an
+                int takes 9 bytes.
+
+            value_size (int): Same as key_size for the values.
+
+            name (string): Name of the block, a random name if None.
+
+        """
+        if shared_memory is None:
+            raise NotImplementedError("multiprocessing.shared_memory requires Python 3.8+")
+
+        if capacity < 1:
+            raise ValueError("capacity must be positive")
+
+        # The items take at most half of the slots, the tables are rebuilt
+        # once the items & the deleted slots take three quarters of them
+        slots = 8
+
+        while slots < capacity * 2:
+            slots *= 2
+
+        entry_size = (_SHARED_ENTRY.size + key_size + value_size + 7) // 8 * 8
+        size = (_SHARED_HEADER.size + _SHARED_STATE.size + capacity * entry_size +
+                slots * _PAIR.size * 2)
+
+        shm = shared_memory.SharedMemory(name, create=True, size=size)
+        _CREATED_BLOCKS.add(shm._name)
+        _SHARED_HEADER.pack_into(shm.buf, 0, _SHARED_MAGIC, _FORMAT_VERSION,
+                                 capacity, slots, key_size, value_size)
+
+        tdict = cls.__new__(cls)
+        tdict._open(shm)
+        tdict._clear()
+        tdict.update(items)
+
+        return tdict
+
+    def _open(self, shm):
+        self._shm = shm
+        self._buf = shm.buf
+
+        try:
+            magic, version, capacity, slots, key_size, value_size = _SHARED_HEADER.unpack_from(self._buf, 0)
+        except struct.error:
+            magic = version = None
+
+        if magic != _SHARED_MAGIC:
+            self.close()
+            raise ValueError("not a shared twodict block")
+
+        if version != _FORMAT_VERSION:
+            self.close()
+            raise ValueError("unsupported format version {0}".format(version))
+
+        self._capacity = capacity
+        self._mask = slots - 1
+        self._sizes = (key_size, value_size)
+        self._entry_size = (_SHARED_ENTRY.size + key_size + value_size + 7) // 8 * 8
+
+        self._state = _SHARED_HEADER.size
+        self._entries = self._state + _SHARED_STATE.size
+        self._tables = (self._entries + capacity * self._entry_size,
+                        self._entries + capacity * self._entry_size + slots * _PAIR.size)
+
+    @property
+    def name(self):
+        """Name of the shared memory block."""
+        return self._shm.name
+
+    ########## Sequence lock ##########
+
+    def _sequence(self):
+        return _SIZE.unpack_from(self._buf, self._state)[0]
+
+    def _read(self, func, *args):
+        """Run the read only func, retry while it overlaps with a write."""
+        while True:
+            sequence = self._sequence()
+
+            if sequence & 1:
+                continue
+
+            try:
+                result = func(*args)
+            except Exception:
+                # Garbage read in the middle of a write, otherwise a real error
+                if sequence == self._sequence():
+                    raise
+
+                continue
+
+            if sequence == self._sequence():
+                return result
+
+    def _write(self, func, *args):
+        """Run func with the sequence odd, only one writer at a time."""
+        sequence = self._sequence()
+        _SIZE.pack_into(self._buf, self._state, sequence + 1)
+
+        try:
+            return func(*args)
+        finally:
+            self._reclaim()
+            _SIZE.pack_into(self._buf, self._state, sequence + 2)
+
+    ########## Low level access ##########
+
+    def _counters(self):
+        """Return the number of items and the number of used entries."""
+        return _SHARED_STATE.unpack_from(self._buf, self._state)[1:3]
+
+    def _set_counters(self, count, used):
+        _SHARED_STATE.pack_into(self._buf, self._state, self._sequence(), count, used, self._deleted())
+
+    def _deleted(self):
+        """Return the number of deleted slots in both hash tables."""
+        return _SHARED_STATE.unpack_from(self._buf, self._state)[3]
+
+    def _set_deleted(self, deleted):
+        _SIZE.pack_into(self._buf, self._state + _SHARED_STATE.size - _SIZE.size, deleted)
+
+    def _entry(self, index):
+        """Return the state and the hashes of the entry at index."""
+        return _SHARED_ENTRY.unpack_from(self._buf, self._entries + index * self._entry_size)
+
+    def _offset(self, index, side):
+        """Return the offset of the key (or value) record of the entry at index."""
+        offset = self._entries + index * self._entry_size + _SHARED_ENTRY.size
+
+        if side == _VALUE_SIDE:
+            offset += self._sizes[_KEY_SIDE]
+
+        return offset
+
+    def _record(self, index, side):
+        """Return the key (or value) of the entry at index."""
+        offset = self._offset(index, side)
+        return _load_record(bytes(self._buf[offset:offset + self._sizes[side]]), 0)[0]
+
+    def _find(self, obj, side, record=None):
+        """Return the index of the live entry whose key (or value) is obj, else -1."""
+        if record is None:
+            record = _encode_record(obj)
+
+        return self._probe(_stable_hash(obj, record), side, obj, record)[1]
+
+    def _probe(self, obj_hash, side, obj=None, record=None, index=None):
+        """Find the slot of obj (or of the entry index) in the side table.
+
+        Returns:
+            The (slot, entry index) pair or (free slot, -1) if not found.
+
+        """
+        data, mask, table = self._buf, self._mask, self._tables[side]
+        slot = obj_hash & mask
+        free = None
+
+        for _ in range(mask + 1):
+            slot_hash, stored = _PAIR.unpack_from(data, table + slot * _PAIR.size)
+
+            if not stored:
+                return (slot if free is None else free), -1
+
+            if stored == _DELETED_SLOT:
+                if free is None:
+                    free = slot
+            elif slot_hash == obj_hash:
+                if index is not None:
+                    if stored - 1 == index:
+                        return slot, index
+                else:
+                    # Records are self delimiting, equal bytes mean equal
+                    # objects. Else compare the objects (e.g. 1 == 1.0)
+                    offset = self._offset(stored - 1, side)
+
+                    if data[offset:offset + len(record)] == record or self._record(stored - 1, side) == obj:
+                        return slot, stored - 1
+
+            slot = (slot + 1) & mask
+
+        # Scanned the whole table, _reclaim() keeps empty slots around
+        return free, -1
+
+    def _contains(self, obj):
+        record = _encode_record(obj)
+        return self._find(obj, _KEY_SIDE, record) >= 0 or self._find(obj, _VALUE_SIDE, record) >= 0
+
+    def _has_item(self, key, value):
+        index = self._find(key, _KEY_SIDE)
+        return index >= 0 and self._record(index, _VALUE_SIDE) == value
+
+    def _lookup(self, key):
+        record = _encode_record(key)
+        index = self._find(key, _KEY_SIDE, record)
+
+        if index >= 0:
+            return self._record(index, _VALUE_SIDE)
+
+        index = self._find(key, _VALUE_SIDE, record)
+
+        if index >= 0:
+            return self._record(index, _KEY_SIDE)
+
+        raise KeyError(key)
+
+    def _snapshot(self):
+        """Return a consistent list of the items in order."""
+        return self._read(self._items_list)
+
+    def _items_list(self):
+        _, used = self._counters()
+        items = []
+
+        for index in range(used):
+            if self._entry(index)[0] == _LIVE_ENTRY:
+                items.append((self._record(index, _KEY_SIDE), self._record(index, _VALUE_SIDE)))
+
+        return items
+
+    ########## Writer ##########
+
+    def _encode(self, obj, side):
+        """Return the record & the hash of obj, check that the record fits."""
+        record = _encode_record(obj)
+
+        if len(record) > self._sizes[side]:
+            raise ValueError("{0} record of {1} bytes exceeds the {2} bytes limit".format(
+                "key" if side == _KEY_SIDE else "value", len(record), self._sizes[side]))
+
+        return record, _stable_hash(obj, record)
+
+    def _store(self, index, side, record, obj_hash):
+        """Write the record of a key (or value) into the entry and its table."""
+        offset = self._offset(index, side)
+        self._buf[offset:offset + len(record)] = record
+
+        slot = self._probe(obj_hash, side, index=index)[0]
+        _PAIR.pack_into(self._buf, self._tables[side] + slot * _PAIR.size, obj_hash, index + 1)
+
+    def _unlink(self, index, side, obj_hash):
+        """Remove the table slot of the key (or value) of the entry at index."""
+        slot = self._probe(obj_hash, side, index=index)[0]
+        _PAIR.pack_into(self._buf, self._tables[side] + slot * _PAIR.size, obj_hash, _DELETED_SLOT)
+        self._set_deleted(self._deleted() + 1)
+
+    def _remove(self, index):
+        """Remove the live entry at index."""
+        _, key_hash, value_hash = self._entry(index)
+
+        self._unlink(index, _KEY_SIDE, key_hash)
+        self._unlink(index, _VALUE_SIDE, value_hash)
+        _SHARED_ENTRY.pack_into(self._buf, self._entries + index * self._entry_size,
+                                _DEAD_ENTRY, key_hash, value_hash)
+
+        count, used = self._counters()
+        self._set_counters(count - 1, used)
+
+    def _assign(self, key, value):
+        key_record, key_hash = self._encode(key, _KEY_SIDE)
+        value_record, value_hash = self._encode(value, _VALUE_SIDE)
+
+        # Same rules as the TwoWayOrderedDict: an existing key keeps its
+        # place, any other pair that contains key or value is removed
+        current = self._find(key, _KEY_SIDE, key_record)
+
+        for index in set([self._find(key, _VALUE_SIDE, key_record), self._find(value, _KEY_SIDE, value_record),
+                          self._find(value, _VALUE_SIDE, value_record)]):
+            if index >= 0 and index != current:
+                self._remove(index)
+
+        if current >= 0:
+            _, _, old_hash = self._entry(current)
+            self._unlink(current, _VALUE_SIDE, old_hash)
+            self._store(current, _VALUE_SIDE, value_record, value_hash)
+            _SHARED_ENTRY.pack_into(self._buf, self._entries + current * self._entry_size,
+                                    _LIVE_ENTRY, key_hash, value_hash)
+            return
+
+        count, used = self._counters()
+
+        if count == self._capacity:
+            raise ValueError("SharedTwoWayOrderedDict is full ({0} items)".format(count))
+
+        if used == self._capacity:
+            self._compact()
+            count, used = self._counters()
+
+        self._store(used, _KEY_SIDE, key_record, key_hash)
+        self._store(used, _VALUE_SIDE, value_record, value_hash)
+        _SHARED_ENTRY.pack_into(self._buf, self._entries + used * self._entry_size,
+                                _LIVE_ENTRY, key_hash, value_hash)
+        self._set_counters(count + 1, used + 1)
+
+    def _compact(self):
+        """Move the live entries to the front and rebuild the tables."""
+        _, used = self._counters()
+        size = self._entry_size
+        count = 0
+
+        for index in range(used):
+            if self._entry(index)[0] == _LIVE_ENTRY:
+                if index != count:
+                    source = self._entries + index * size
+                    target = self._entries + count * size
+                    self._buf[target:target + size] = self._buf[source:source + size]
+
+                count += 1
+
+        self._clear_tables()
+
+        for index in range(count):
+            _, key_hash, value_hash = self._entry(index)
+
+            for side, obj_hash in ((_KEY_SIDE, key_hash), (_VALUE_SIDE, value_hash)):
+                slot = self._probe(obj_hash, side)[0]
+                _PAIR.pack_into(self._buf, self._tables[side] + slot * _PAIR.size, obj_hash, index + 1)
+
+        self._set_counters(count, count)
+
+    def _reclaim(self):
+        """Rebuild the tables once the deleted slots could fill them up."""
+        count, _ = self._counters()
+
+        if count + self._deleted() > (self._mask + 1) * 3 // 4:
+            self._compact()
+
+    def _clear_tables(self):
+        start = self._tables[0]
+        end = self._tables[1] + (self._mask + 1) * _PAIR.size
+        self._buf[start:end] = bytes(end - start)
+        self._set_deleted(0)
+
+    def _clear(self):
+        self._clear_tables()
+        self._set_counters(0, 0)
+
+    def _pop_end(self, last):
+        _, used = self._counters()
+        indexes = range(used - 1, -1, -1) if last else range(used)
+
+        for index in indexes:
+            if self._entry(index)[0] == _LIVE_ENTRY:
+                item = self._record(index, _KEY_SIDE), self._record(index, _VALUE_SIDE)
+                self._remove(index)
+                return item
+
+        raise KeyError('popitem(): dictionary is empty')
+
+    def _delete(self, key):
+        index = self._find(key, _KEY_SIDE)
+
+        if index < 0:
+            index = self._find(key, _VALUE_SIDE)
+
+        if index < 0:
+            raise KeyError(key)
+
+        self._remove(index)
+
+    ########## Public interface ##########
+
+    def __getitem__(self, key):
+        return self._read(self._lookup, key)
+
+    def __setitem__(self, key, value):
+        self._write(self._assign, key, value)
+
+    def __delitem__(self, key):
+        self._write(self._delete, key)
+
+    def __contains__(self, key):
+        return self._read(self._contains, key)
+
+    def __len__(self):
+        return self._read(self._counters)[0]
+
+    def __iter__(self):
+        return iter([key for key, _ in self._snapshot()])
+
+    def __reversed__(self):
+        return reversed([key for key, _ in self._snapshot()])
+
+    def __repr__(self):
+        return '%s(%r)' % (self.__class__.__name__, self._snapshot())
+
+    def __eq__(self, other):
+        if not isinstance(other, self.__class__):
+            return False
+
+        return dict(self._snapshot()) == dict(other._read(other._snapshot))
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __reduce__(self):
+        # Other processes attach to the same block instead of copying the items
+        return self.__class__, (self.name,)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def keys(self):
+        return SharedKeysView(self)
+
+    def values(self):
+        return SharedValuesView(self)
+
+    def items(self):
+        return SharedItemsView(self)
+
+    def popitem(self, last=True):
+        return self._write(self._pop_end, last)
+
+    def clear(self):
+        self._write(self._clear)
+
+    def copy(self):
+        """Return a TwoWayOrderedDict with a snapshot of the items."""
+        return TwoWayOrderedDict(self._snapshot())
+
+    def close(self):
+        """Detach from the block, the dictionary can't be used afterwards."""
+        self._buf = None
+        self._shm.close()
+
+    def unlink(self):
+        """Destroy the block, call it once after every process closed it."""
+        if os.name == "posix" and getattr(self._shm, "_track", True):
+            # An attached dictionary that shares the resource tracker (like
+            # a spawned worker) might have dropped the registration, which
+            # SharedMemory.unlink() removes again
+            resource_tracker.register(self._shm._name, "shared_memory")
+
+        _CREATED_BLOCKS.discard(self._shm._name)
+        self._shm.unlink()
+
+
+########## Disk backed dictionary ##########
+
+# Schema of the sqlite3 database:
+#
+#   pairs:  one row per pair, the position (INTEGER PRIMARY KEY) gives the
+#           insertion order. key & value hold the tagged records (see
+#           _dump_record()) and key_hash & value_hash their _stable_hash()
+#   indexes: pairs_key on key_hash for the forward lookups and pairs_value
+#           on value_hash for the reverse lookups
+#
+# PRAGMA user_version holds the _DISK_FORMAT_VERSION
+
+_DISK_FORMAT_VERSION = 1
+
+_DISK_SCHEMA = """
+CREATE TABLE IF NOT EXISTS pairs (
+    position INTEGER PRIMARY KEY,
+    key_hash INTEGER NOT NULL,
+    key BLOB NOT NULL,
+    value_hash INTEGER NOT NULL,
+    value BLOB NOT NULL
+);
+CREATE INDEX IF NOT EXISTS pairs_key ON pairs (key_hash);
+CREATE INDEX IF NOT EXISTS pairs_value ON pairs (value_hash);
+"""
+
+_DISK_FIND = {
+    _KEY_SIDE: "SELECT position, key, value FROM pairs WHERE key_hash = ?",
+    _VALUE_SIDE: "SELECT position, key, value FROM pairs WHERE value_hash = ?"
+}
+
+_DISK_PAGE = {
+    False: "SELECT position, key, value FROM pairs WHERE position > ? ORDER BY position LIMIT ?",
+    True: "SELECT position, key, value FROM pairs WHERE position < ? ORDER BY position DESC LIMIT ?"
+}
+
+
+# Pairs per bulk insert, the hashes of a batch fit in the 999 parameters
+# that old SQLite versions allow per statement
+_DISK_BATCH = 480
+
+
+def _decode_record(record):
+    return _load_record(record, 0)[0]
+
+
+class DiskKeysView(_HashedSetOperations, KeysView):
+
+    def __repr__(self):
+        return "dict_keys({data})".format(data=list(self))
+
+    def __contains__(self, key):
+        return self._mapping._find(key, _KEY_SIDE) is not None
+
+    def __iter__(self):
+        return (key for key, _ in self._mapping._iterate())
+
+    def __reversed__(self):
+        return (key for key, _ in self._mapping._iterate(reverse=True))
+
+
+class DiskValuesView(_HashedSetOperations, ValuesView):
+
+    def __repr__(self):
+        return "dict_values({data})".format(data=list(self))
+
+    def __contains__(self, value):
+        return self._mapping._find(value, _VALUE_SIDE) is not None
+
+    def __iter__(self):
+        return (value for _, value in self._mapping._iterate())
+
+    def __reversed__(self):
+        return (value for _, value in self._mapping._iterate(reverse=True))
+
+
+class DiskItemsView(_HashedSetOperations, ItemsView):
+
+    def __repr__(self):
+        return "dict_items({data})".format(data=list(self))
+
+    def __contains__(self, item):
+        if not isinstance(item, tuple) or len(item) != 2:
+            return False
+
+        row = self._mapping._find(item[0], _KEY_SIDE)
+        return row is not None and _decode_record(row[2]) == item[1]
+
+    def __iter__(self):
+        return self._mapping._iterate()
+
+    def __reversed__(self):
+        return self._mapping._iterate(reverse=True)
+
+
+class DiskTwoWayOrderedDict(MutableMapping):
+
+    """TwoWayOrderedDict stored in a sqlite3 database, for maps larger than RAM.
+
+    Each pair is a row of the database with an index for the forward and
+    an index for the reverse lookups, the row id keeps the insertion order.
+    Recently used pairs stay in memory in a BoundedTwoWayOrderedDict (the
+    hot cache) so repeated lookups don't touch the database at all.
+
+    Writes go straight to the database inside a transaction that is
+    committed every batch_size writes (batched write-back), by flush() and
+    by close(). Iteration reads the rows page by page, so it never holds
+    more than a page of pairs in memory, and it's not affected by writes
+    in between.
+
+    update() inserts batches of pairs that don't collide with each other
+    or with the stored pairs in a single statement.
+
+    Args:
+        path (string): Database file, an existing database is opened with
+            its pairs. The default "" creates a private temporary database
+            that SQLite deletes when the dictionary is closed.
+
+        data (mapping or iterable): Initial key:value pairs.
+
+        cache_size (int): Number of pairs kept in the hot cache.
+
+        batch_size (int): Number of writes per transaction.
+
+    Examples:
+        Load the pairs into a database file::
+
+            >>> with DiskTwoWayOrderedDict("ids.db") as ids:
+            ...     ids.update(pairs)
+            ...     ids[1234]  # Reverse lookup
+
+    Note:
+        Keys & values are compared with == but hashed by their serialized
+        form like in the FrozenTwoWayOrderedDict, so objects of types other
+        than None, bool, int, float, str & bytes are found only when they
+        pickle to the same bytes.
+
+    Warning:
+        Objects of unknown types are stored pickled, never open databases
+        from untrusted sources.
+
+    """
+
+    def __init__(self, path="", data=(), cache_size=10000, batch_size=1000):
+        if sqlite3 is None:
+            raise NotImplementedError("DiskTwoWayOrderedDict requires the sqlite3 module")
+
+        if batch_size < 1:
+            raise ValueError("batch_size must be positive")
+
+        self.path = path
+        self.batch_size = batch_size
+
+        self._db = sqlite3.connect(path, isolation_level=None)
+        self._closed = False
+        version = self._db.execute("PRAGMA user_version").fetchone()[0]
+
+        if version not in (0, _DISK_FORMAT_VERSION):
+            self._db.close()
+            raise ValueError("unsupported format version {0}".format(version))
+
+        self._db.executescript(_DISK_SCHEMA)
+        self._db.execute("PRAGMA user_version = {0}".format(_DISK_FORMAT_VERSION))
+
+        self._cache = BoundedTwoWayOrderedDict(cache_size)
+        self._count = self._db.execute("SELECT COUNT(*) FROM pairs").fetchone()[0]
+        # Number of writes in the open transaction
+        self._pending = 0
+
+        self.update(data)
+
+    def _begin(self):
+        """Open the transaction of the next writes."""
+        if not self._db.in_transaction:
+            self._db.execute("BEGIN")
+
+    def _written(self):
+        """Count a write, commit the transaction every batch_size writes."""
+        self._pending += 1
+
+        if self._pending >= self.batch_size:
+            self.flush()
+
+    def _find(self, obj, side):
+        """Return the (position, key record, value record) row of obj on the given side or None."""
+        for row in self._db.execute(_DISK_FIND[side], (_stable_hash(obj),)):
+            # Different objects might have the same hash
+            if _decode_record(row[side + 1]) == obj:
+                return row
+
+        return None
+
+    def _find_pair(self, obj):
+        """Return the row where obj is the key or the value or None."""
+        row = self._find(obj, _KEY_SIDE)
+        return row if row is not None else self._find(obj, _VALUE_SIDE)
+
+    def _remove(self, row):
+        self._db.execute("DELETE FROM pairs WHERE position = ?", (row[0],))
+        self._cache.pop(_decode_record(row[1]), None)
+        self._count -= 1
+
+    def _bulk_insert(self, pairs):
+        """Insert the given pairs in one statement when they don't collide with any pair."""
+        try:
+            forward = dict(pairs)
+        except (TypeError, ValueError):
+            forward = {}
+
+        # Collisions inside the batch itself
+        if _inverse_batch(forward, len(pairs)) is None:
+            return False
+
+        rows = []
+        hashes = set()
+
+        for key, value in pairs:
+            key_record, value_record = _encode_record(key), _encode_record(value)
+            key_hash, value_hash = _stable_hash(key, key_record), _stable_hash(value, value_record)
+
+            rows.append((key_hash, sqlite3.Binary(key_record), value_hash, sqlite3.Binary(value_record)))
+            hashes.update((key_hash, value_hash))
+
+        # Collisions with the stored pairs
+        objects = set(forward)
+        objects.update(forward.values())
+        placeholders = ", ".join("?" * len(hashes))
+
+        for column in ("key", "value"):
+            query = "SELECT {0} FROM pairs WHERE {0}_hash IN ({1})".format(column, placeholders)
+
+            for (record,) in self._db.execute(query, tuple(hashes)):
+                if _decode_record(record) in objects:
+                    return False
+
+        self._begin()
+        self._db.executemany("INSERT INTO pairs (key_hash, key, value_hash, value) VALUES (?, ?, ?, ?)", rows)
+        self._count += len(rows)
+        self._pending += len(rows) - 1
+        self._written()
+
+        return True
+
+    def update(self, *args, **kwargs):
+        """Update the dictionary with the key:value pairs from args & kwargs.
+
+        Batches of pairs that don't collide with each other or with the
+        stored pairs are inserted with a single statement, everything else
+        goes through __setitem__.
+
+        """
+        if len(args) > 1:
+            raise TypeError("expected at most 1 arguments, got {0}".format(len(args)))
+
+        data = args[0] if args else ()
+
+        if isinstance(data, Mapping):
+            data = data.items()
+        elif hasattr(data, "keys"):
+            data = [(key, data[key]) for key in data.keys()]
+
+        pairs = iter(data)
+
+        while True:
+            batch = list(islice(pairs, _DISK_BATCH))
+
+            if not batch:
+                break
+
+            # Pairs that collide with each other or with the stored pairs
+            # go through __setitem__ one by one
+            if not self._bulk_insert(batch):
+                for key, value in batch:
+                    self[key] = value
+
+        for key, value in kwargs.items():
+            self[key] = value
+
+    def _iterate(self, reverse=False, page_size=1000):
+        """Generator of the (key, value) pairs, reads page_size rows at a time."""
+        position = 2 ** 63 - 1 if reverse else -2 ** 63
+
+        while True:
+            rows = self._db.execute(_DISK_PAGE[reverse], (position, page_size)).fetchall()
+
+            for row in rows:
+                yield _decode_record(row[1]), _decode_record(row[2])
+
+            if len(rows) < page_size:
+                return
+
+            position = rows[-1][0]
+
+    def __getitem__(self, key):
+        try:
+            return self._cache[key]
+        except KeyError:
+            pass
+
+        row = self._find(key, _KEY_SIDE)
+
+        if row is not None:
+            value = _decode_record(row[2])
+            self._cache[key] = value
+            return value
+
+        row = self._find(key, _VALUE_SIDE)
+
+        if row is None:
+            raise KeyError(key)
+
+        mapped_key = _decode_record(row[1])
+        self._cache[mapped_key] = key
+        return mapped_key
+
+    def __setitem__(self, key, value):
+        key_hash, value_hash = _stable_hash(key), _stable_hash(value)
+
+        # Same rules as the TwoWayOrderedDict: an existing key keeps its
+        # place, any other pair that contains key or value is removed
+        current = self._find(key, _KEY_SIDE)
+        self._begin()
+        positions = set([current[0]]) if current is not None else set()
+
+        for row in (self._find(key, _VALUE_SIDE), self._find(value, _KEY_SIDE), self._find(value, _VALUE_SIDE)):
+            if row is not None and row[0] not in positions:
+                positions.add(row[0])
+                self._remove(row)
+
+        value_record = sqlite3.Binary(_encode_record(value))
+
+        if current is not None:
+            self._db.execute("UPDATE pairs SET value_hash = ?, value = ? WHERE position = ?",
+                             (value_hash, value_record, current[0]))
+        else:
+            self._db.execute("INSERT INTO pairs (key_hash, key, value_hash, value) VALUES (?, ?, ?, ?)",
+                             (key_hash, sqlite3.Binary(_encode_record(key)), value_hash, value_record))
+            self._count += 1
+
+        # Also drops the cached pairs that the assignment removed
+        self._cache[key] = value
+        self._written()
+
+    def __delitem__(self, key):
+        row = self._find_pair(key)
+
+        if row is None:
+            raise KeyError(key)
+
+        self._begin()
+        self._remove(row)
+        self._written()
+
+    def __len__(self):
+        return self._count
+
+    def __iter__(self):
+        return (key for key, _ in self._iterate())
+
+    def __reversed__(self):
+        return (key for key, _ in self._iterate(reverse=True))
+
+    def __repr__(self):
+        return "{0}({1!r}, {2} items)".format(self.__class__.__name__, self.path, self._count)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def keys(self):
+        return DiskKeysView(self)
+
+    def values(self):
+        return DiskValuesView(self)
+
+    def items(self):
+        return DiskItemsView(self)
+
+    def popitem(self, last=True):
+        row = self._db.execute("SELECT position, key, value FROM pairs ORDER BY position {0} LIMIT 1".format(
+            "DESC" if last else "ASC")).fetchone()
+
+        if row is None:
+            raise KeyError('popitem(): dictionary is empty')
+
+        self._begin()
+        self._remove(row)
+        self._written()
+
+        return _decode_record(row[1]), _decode_record(row[2])
+
+    def clear(self):
+        self._begin()
+        self._db.execute("DELETE FROM pairs")
+        self._cache.clear()
+        self._count = 0
+        self._written()
+
+    def copy(self):
+        """Return a TwoWayOrderedDict with all the pairs (they must fit in memory)."""
+        return TwoWayOrderedDict(self._iterate())
+
+    def flush(self):
+        """Commit the pending writes."""
+        if self._db.in_transaction:
+            self._db.execute("COMMIT")
+
+        self._pending = 0
+
+    def close(self):
+        """Commit the pending writes and close the database, closing twice is allowed."""
+        if self._closed:
+            return
+
+        self.flush()
+        self._db.close()
+        self._cache.clear()
+        self._closed = True
+
+
+########## Thread safe dictionary ##########
+
+class ConcurrentKeysView(DictKeysView):
+
+    def __contains__(self, key):
+        return self._mapping._read(DictKeysView.__contains__, self, key)
+
+    def __reversed__(self):
+        return reversed(self._mapping)
+
+
+class ConcurrentValuesView(DictValuesView):
+
+    def __contains__(self, value):
+        return self._mapping._read(DictValuesView.__contains__, self, value)
+
+    def __iter__(self):
+        return iter([value for _, value in self._mapping._snapshot()])
+
+    def __reversed__(self):
+        return reversed([value for _, value in self._mapping._snapshot()])
+
+
+class ConcurrentItemsView(DictItemsView):
+
+    def __contains__(self, item):
+        return self._mapping._read(DictItemsView.__contains__, self, item)
+
+    def __iter__(self):
+        return iter(self._mapping._snapshot())
+
+    def __reversed__(self):
+        return reversed(self._mapping._snapshot())
+
+
+class ConcurrentTwoWayOrderedDict(TwoWayOrderedDict):
+
+    """TwoWayOrderedDict that can be shared between threads.
+
+    Writers are serialized by a reentrant lock and every compound operation
+    (update, pop, popitem, setdefault, clear) runs as a single atomic write.
+    Lookups never take the lock: like a seqlock, every write makes the
+    version odd while it's in progress and even again when it's done, a
+    lookup that overlaps with a write is retried under the lock. Iteration
+    works on a snapshot of the items taken under the lock, so it's never
+    affected by concurrent writes.
+
+    Note:
+        Operations don't scale with the number of threads because of the
+        GIL, but they don't collapse under contention either.
+
+    """
+
+    def __init__(self, *args, **kwargs):
+        self._lock = threading.RLock()
+        # Odd while a write is in progress
+        self._version = 0
+        self._write_depth = 0
+
+        super(ConcurrentTwoWayOrderedDict, self).__init__(*args, **kwargs)
+
+    def _begin_write(self):
+        """Must be called with the lock held."""
+        self._write_depth += 1
+
+        if self._write_depth == 1:
+            self._version += 1
+
+    def _end_write(self):
+        self._write_depth -= 1
+
+        if not self._write_depth:
+            self._version += 1
+
+    def _write(self, func, *args):
+        """Run func as a single atomic write."""
+        with self._lock:
+            self._begin_write()
+
+            try:
+                return func(*args)
+            finally:
+                self._end_write()
+
+    def _read(self, func, *args):
+        """Run the read only func, retry under the lock if a write overlapped with it."""
+        version = self._version
+
+        if not version & 1:
+            try:
+                result = func(*args)
+            except Exception:
+                if version == self._version:
+                    raise
+            else:
+                if version == self._version:
+                    return result
+
+        with self._lock:
+            return func(*args)
+
+    def _snapshot(self):
+        """Return a consistent list with all the items."""
+        with self._lock:
+            return [(key, dict.__getitem__(self, key)) for key in self._iterate()]
+
+    def __getitem__(self, key):
+        return self._read(dict.__getitem__, self, key)
+
+    def __contains__(self, key):
+        return self._read(dict.__contains__, self, key)
+
+    def __setitem__(self, key, value):
+        self._write(TwoWayOrderedDict.__setitem__, self, key, value)
+
+    def __delitem__(self, key):
+        self._write(TwoWayOrderedDict.__delitem__, self, key)
+
+    def __iter__(self):
+        return iter([key for key, _ in self._snapshot()])
+
+    def __reversed__(self):
+        with self._lock:
+            return iter(list(self._iterate(reverse=True)))
+
+    def __eq__(self, other):
+        if not isinstance(other, self.__class__):
+            return False
+
+        items = other._snapshot()
+
+        with self._lock:
+            contains = TwoWayOrderedDict.items(self).__contains__
+            return len(self) == len(items) and all(contains(item) for item in items)
+
+    def __reduce__(self):
+        items = self._snapshot()
+        return _from_columns, (self.__class__, [key for key, _ in items], [value for _, value in items])
+
+    def get(self, key, default=None):
+        return self._read(dict.get, self, key, default)
+
+    def keys(self):
+        return ConcurrentKeysView(self)
+
+    def values(self):
+        return ConcurrentValuesView(self)
+
+    def items(self):
+        return ConcurrentItemsView(self)
+
+    def pop(self, key, default=_DEFAULT_OBJECT):
+        return self._write(TwoWayOrderedDict.pop, self, key, default)
+
+    def popitem(self, last=True):
+        return self._write(TwoWayOrderedDict.popitem, self, last)
+
+    def setdefault(self, key, default=None):
+        return self._write(TwoWayOrderedDict.setdefault, self, key, default)
+
+    def index_of(self, key):
+        with self._lock:
+            return super(ConcurrentTwoWayOrderedDict, self).index_of(key)
+
+    def item_at(self, index):
+        with self._lock:
+            return super(ConcurrentTwoWayOrderedDict, self).item_at(index)
+
+    def islice(self, start=0, stop=None):
+        with self._lock:
+            return iter(list(super(ConcurrentTwoWayOrderedDict, self).islice(start, stop)))
+
+    def move_to_end(self, key, last=True):
+        self._write(TwoWayOrderedDict.move_to_end, self, key, last)
+
+    def move_before(self, key, anchor):
+        self._write(TwoWayOrderedDict.move_before, self, key, anchor)
+
+    def move_after(self, key, anchor):
+        self._write(TwoWayOrderedDict.move_after, self, key, anchor)
+
+    def update(self, *args, **kwargs):
+        with self._lock:
+            self._begin_write()
+
+            try:
+                TwoWayOrderedDict.update(self, *args, **kwargs)
+            finally:
+                self._end_write()
+
+    def copy(self):
+        with self._lock:
+            return super(ConcurrentTwoWayOrderedDict, self).copy()
+
+    def clear(self):
+        # Called by TwoWayOrderedDict.__init__ before update()
+        self._write(TwoWayOrderedDict.clear, self)
+
+
+########## Bounded dictionary ##########
+
+class BoundedTwoWayOrderedDict(TwoWayOrderedDict):
+
+    """TwoWayOrderedDict that holds at most maxsize pairs (e.g. for caches).
+
+    Every lookup, either by key or by value, and every assignment counts as
+    an access of the pair and moves it at the end of the linked list, so
+    the dictionary iterates from the least to the most recently used pair.
+    When an assignment adds a pair beyond maxsize a pair is evicted:
+
+        * LRU: the least recently used pair (the first one in the list).
+        * LFU: the least frequently used pair, ties are broken by recency.
+
+    Both touching and evicting a pair are O(1). Membership tests and
+    iteration are not accesses.
+
+    Args:
+        maxsize (int): Maximum number of key:value pairs.
+
+        data (mapping or iterable): Initial key:value pairs.
+
+        policy (string): BoundedTwoWayOrderedDict.LRU or .LFU
+
+        on_evict (callable): Called as on_evict(key, value) after a pair
+            has been evicted. Not called for deletions or for the pairs
+            implicitly removed by an assignment.
+
+    Attributes:
+        hits (int): Number of successful lookups.
+
+        misses (int): Number of failed lookups.
+
+        evictions (int): Number of pairs evicted.
+
+    Examples:
+        Session token <-> user id cache::
+
+            >>> sessions = BoundedTwoWayOrderedDict(2)
+            >>> sessions['token1'] = 1
+            >>> sessions['token2'] = 2
+            >>> sessions[1]  # Outputs 'token1'
+            >>> sessions['token3'] = 3  # Evicts ('token2', 2)
+
+    """
+
+    LRU = "lru"
+    LFU = "lfu"
+
+    def __init__(self, maxsize, data=(), policy=LRU, on_evict=None):
+        if maxsize < 1:
+            raise ValueError("maxsize must be positive")
+
+        if policy not in (self.LRU, self.LFU):
+            raise ValueError("Unknown policy: {0!r}".format(policy))
+
+        self.maxsize = maxsize
+        self.policy = policy
+        self.on_evict = on_evict
+
+        self.hits = self.misses = self.evictions = 0
+
+        super(BoundedTwoWayOrderedDict, self).__init__(data)
+
+    def __getitem__(self, key):
+        try:
+            value = dict.__getitem__(self, key)
+        except KeyError:
+            self.misses += 1
+            raise
+
+        self.hits += 1
+        self._touch(key if key in self._items_map else value)
+
+        return value
+
+    def __setitem__(self, key, value):
+        if self.policy == self.LFU:
+            # Keys of the pairs that the assignment might remove implicitly
+            affected = []
+
+            for item in (key, value):
+                if item in self:
+                    node_key = self._node_key(item)
+
+                    if node_key not in affected:
+                        affected.append(node_key)
+
+            _TwoWayOrderedDictBase.__setitem__(self, key, value)
+
+            for node_key in affected:
+                if node_key not in self._items_map:
+                    self._forget(node_key)
+
+            # The new key is not counted yet so it can't be evicted
+            if len(self) > self.maxsize:
+                self._evict()
+
+            self._touch(key)
+        elif key in self._items_map:
+            # Existing keys don't grow the dictionary
+            _TwoWayOrderedDictBase.__setitem__(self, key, value)
+            self._move_key(key)
+        else:
+            # New keys are appended at the end of the linked list
+            _TwoWayOrderedDictBase.__setitem__(self, key, value)
+
+            if len(self) > self.maxsize:
+                self._evict()
+
+    def __delitem__(self, key):
+        node_key = self._node_key(key)
+
+        super(BoundedTwoWayOrderedDict, self).__delitem__(key)
+
+        if self.policy == self.LFU:
+            self._forget(node_key)
+
+    def __reduce__(self):
+        # The access frequencies are not preserved
+        return self.__class__, (self.maxsize, list(self.items()), self.policy)
+
+    def _touch(self, key):
+        """Mark the pair of the given key as used."""
+        self._move_key(key)
+
+        if self.policy == self.LFU:
+            count = self._counts.get(key, 0)
+
+            if count:
+                bucket = self._buckets[count]
+                del bucket[key]
+
+                if not bucket:
+                    del self._buckets[count]
+
+                    if self._min_count == count:
+                        self._min_count += 1
+            else:
+                self._min_count = 1
+
+            self._counts[key] = count + 1
+
+            bucket = self._buckets.get(count + 1)
+
+            if bucket is None:
+                bucket = self._buckets[count + 1] = OrderedDict()
+
+            bucket[key] = None
+
+    def _forget(self, key):
+        """Drop the access count of a removed key."""
+        count = self._counts.pop(key)
+        bucket = self._buckets[count]
+        del bucket[key]
+
+        # The minimum count is fixed lazily by _evict()
+        if not bucket:
+            del self._buckets[count]
+
+    def _evict(self):
+        """Remove the pair picked by the eviction policy."""
+        if self.policy == self.LFU:
+            if self._min_count not in self._buckets:
+                self._min_count = min(self._buckets)
+
+            bucket = self._buckets[self._min_count]
+            key = bucket.popitem(last=False)[0]
+
+            if not bucket:
+                del self._buckets[self._min_count]
+
+            del self._counts[key]
+        else:
+            key = self._end_key(last=False)
+
+        # Remove the pair through the storage core instead of going
+        # through pop(), __getitem__ and __delitem__
+        value = dict.__getitem__(self, key)
+        _TwoWayOrderedDictBase.__delitem__(self, key)
+
+        self.evictions += 1
+
+        if self.on_evict is not None:
+            self.on_evict(key, value)
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def pop(self, key, default=_DEFAULT_OBJECT):
+        # Removing a pair is not an access
+        if key not in self:
+            if default is _DEFAULT_OBJECT:
+                raise KeyError(key)
+
+            return default
+
+        value = dict.__getitem__(self, key)
+        del self[key]
+
+        return value
+
+    def copy(self):
+        tdict = self.__class__(self.maxsize, policy=self.policy, on_evict=self.on_evict)
+        dict.update(tdict, _viewitems(self))
+        tdict._extend_keys(self._iterate())
+
+        if self.policy == self.LFU:
+            tdict._counts = self._counts.copy()
+            tdict._buckets = dict((count, bucket.copy()) for count, bucket in self._buckets.items())
+            tdict._min_count = self._min_count
+
+        return tdict
+
+    def clear(self):
+        super(BoundedTwoWayOrderedDict, self).clear()
+
+        if self.policy == self.LFU:
+            # key -> access count, access count -> keys from least to most recent
+            self._counts = {}
+            self._buckets = {}
+            self._min_count = 0
+
+
+########## Journaled dictionary ##########
+
+class JournaledTwoWayOrderedDict(TwoWayOrderedDict):
+
+    """TwoWayOrderedDict that records every mutation for replication.
+
+    Every logical mutation is appended to a journal as a compact
+    (version, operation, key, value) tuple with a monotonically increasing
+    version. The operations are:
+
+        * "set": key:value was assigned.
+        * "evict": the key:value pair was removed implicitly by the
+          assignment that follows it (key/value collisions).
+        * "delete": the key:value pair was deleted (del, pop, popitem).
+        * "clear": every pair was removed, key & value are None.
+        * "move_to_end": the item was moved, value holds the last flag.
+        * "move_before", "move_after": the item was moved, value holds the
+          key of the anchor.
+
+    Keys always refer to the key (not the value) of a pair. A replica that
+    holds the items as of some version catches up by calling
+    replica.apply_deltas(master.deltas_since(version), version), so the
+    sync cost is proportional to the churn instead of the size.
+
+    Attributes:
+        version (int): Version of the last recorded mutation, 0 if none.
+
+        max_deltas (int): The journal keeps at least the max_deltas most
+            recent records (None for an unbounded journal).
+
+    Examples:
+        Replicate a dictionary::
+
+            >>> master = JournaledTwoWayOrderedDict([('a', 1)])
+            >>> replica, version = TwoWayOrderedDict(master.items()), master.version
+            >>> master['b'] = 'a'
+            >>> version = replica.apply_deltas(master.deltas_since(version), version)
+
+            >>> master.deltas_since(1)
+            [(2, 'evict', 'a', 1), (3, 'set', 'b', 'a')]
+
+    """
+
+    max_deltas = 1000000
+
+    _bulk_safe = True
+
+    def __init__(self, *args, **kwargs):
+        self.version = 0
+        self._journal = []
+
+        super(JournaledTwoWayOrderedDict, self).__init__(*args, **kwargs)
+
+    def __setitem__(self, key, value):
+        if key not in self and value not in self:
+            super(JournaledTwoWayOrderedDict, self).__setitem__(key, value)
+            self._record("set", key, value)
+            return
+
+        # Pairs that the assignment might remove implicitly
+        affected = []
+
+        for item in (key, value):
+            if item in self:
+                node_key = self._node_key(item)
+
+                if node_key not in [pair[0] for pair in affected]:
+                    affected.append((node_key, dict.__getitem__(self, node_key)))
+
+        super(JournaledTwoWayOrderedDict, self).__setitem__(key, value)
+
+        for node_key, old_value in affected:
+            if node_key not in self._items_map:
+                self._record("evict", node_key, old_value)
+
+        self._record("set", key, value)
+
+    def __delitem__(self, key):
+        node_key = self._node_key(key)
+        value = dict.__getitem__(self, node_key)
+
+        super(JournaledTwoWayOrderedDict, self).__delitem__(key)
+
+        self._record("delete", node_key, value)
+
+    def _bulk_stored(self, pairs):
+        self._record_many("set", pairs)
+
+    def _record(self, operation, key, value):
+        self.version += 1
+        self._journal.append((self.version, operation, key, value))
+
+        if self.max_deltas is not None and len(self._journal) > 2 * self.max_deltas:
+            self._trim()
+
+    def _record_many(self, operation, pairs):
+        start = self.version + 1
+        self.version += len(pairs)
+        self._journal.extend((version, operation, key, value)
+                             for version, (key, value) in enumerate(pairs, start))
+        self._trim()
+
+    def _trim(self):
+        # Trim in chunks (once the journal doubles) to keep the appends
+        # amortized O(1)
+        if self.max_deltas is not None and len(self._journal) > 2 * self.max_deltas:
+            del self._journal[:-self.max_deltas]
+
+    def deltas_since(self, version):
+        """Return the list of the records after the given version.
+
+        Raises:
+            ValueError: If some of the records have been trimmed, the
+                replica must start over from a full copy.
+
+        """
+        # The journal holds consecutive versions
+        start = version - (self.version - len(self._journal))
+
+        if start < 0 or version > self.version:
+            raise ValueError("Deltas since version {0} are not available".format(version))
+
+        return self._journal[start:]
+
+    def move_to_end(self, key, last=True):
+        node_key = self._node_key(key)
+        super(JournaledTwoWayOrderedDict, self).move_to_end(key, last)
+        self._record("move_to_end", node_key, last)
+
+    def move_before(self, key, anchor):
+        node_key, anchor_key = self._node_key(key), self._node_key(anchor)
+        super(JournaledTwoWayOrderedDict, self).move_before(key, anchor)
+        self._record("move_before", node_key, anchor_key)
+
+    def move_after(self, key, anchor):
+        node_key, anchor_key = self._node_key(key), self._node_key(anchor)
+        super(JournaledTwoWayOrderedDict, self).move_after(key, anchor)
+        self._record("move_after", node_key, anchor_key)
+
+    def copy(self):
+        # Replay the items so the journal of the copy describes its state
+        tdict = self.__class__()
+        tdict.max_deltas = self.max_deltas
+        tdict.update(self.items())
+        return tdict
+
+    def clear(self):
+        # Called by TwoWayOrderedDict.__init__ on an empty dictionary
+        if dict.__len__(self):
+            self._record("clear", None, None)
+
+        super(JournaledTwoWayOrderedDict, self).clear()
+
+
+########## Instrumented dictionary ##########
+
+_timer = getattr(time, "perf_counter", time.time)
+
+
+class InstrumentedTwoWayOrderedDict(TwoWayOrderedDict):
+
+    """TwoWayOrderedDict that counts its operations, for troubleshooting.
+
+    Every operation is counted by name and __setitem__ also counts the
+    collision branch it takes, plus the pairs it removes implicitly:
+
+        * set.key_exists:     the key is already a key (updated in place)
+        * set.key_is_value:   the key is the value of another pair
+        * set.value_exists:   the value is already a key or a value
+        * set.self_mapped:    a {'a': 'a'} pair is assigned or overwritten
+        * implicit_evictions: pairs removed by assignments
+
+    Compound operations also count the operations they are made of (e.g.
+    pop() counts a pop, a getitem and a delitem) and iterate counts every
+    iteration, including the internal ones. Collision free update() batches
+    still go through the bulk path and are counted as update.bulk_pairs.
+
+    With sample_every=N one out of every N calls of each operation is timed
+    as well. Iterations are timed until the iterator is exhausted, so the
+    time includes the work of the caller between the items.
+
+    The counters slow down every operation, the TwoWayOrderedDict itself
+    is not affected. Use this class only where the numbers are needed.
+
+    Args:
+        data (mapping or iterable): Initial key:value pairs, not counted.
+
+        sample_every (int): Time one out of every sample_every calls of
+            each operation, 0 disables the timings.
+
+    Examples:
+        Count the implicit evictions::
+
+            >>> tdict = InstrumentedTwoWayOrderedDict(sample_every=100)
+            >>> tdict['a'] = 1
+            >>> tdict['b'] = 'a'  # Removes ('a', 1)
+            >>> tdict.stats()['counts']['implicit_evictions']  # Outputs 1
+
+    """
+
+    _bulk_safe = True
+
+    def __init__(self, data=(), sample_every=0):
+        if sample_every < 0:
+            raise ValueError("sample_every can't be negative")
+
+        self.sample_every = sample_every
+        self.reset_stats()
+
+        super(InstrumentedTwoWayOrderedDict, self).__init__(data)
+
+        self.reset_stats()
+
+    def reset_stats(self):
+        """Zero all the counters and the timings."""
+        self._counts = Counter()
+        # Operation name -> [samples, total seconds, max seconds]
+        self._timings = {}
+
+    def stats(self):
+        """Return a snapshot of the counters and the timings.
+
+        Returns:
+            A dict with the "counts" {name: count} and the "timings"
+            {name: {"samples", "total", "mean", "max"}} in seconds.
+
+        """
+        timings = {}
+
+        for name, (samples, total, longest) in self._timings.items():
+            timings[name] = {"samples": samples, "total": total, "mean": total / samples, "max": longest}
+
+        return {"counts": dict(self._counts), "timings": timings}
+
+    def _add_timing(self, name, elapsed):
+        timing = self._timings.setdefault(name, [0, 0.0, 0.0])
+        timing[0] += 1
+        timing[1] += elapsed
+        timing[2] = max(timing[2], elapsed)
+
+    def _sampled(self, name):
+        """Count a call of the operation name, return True if it must be timed."""
+        self._counts[name] += 1
+        return bool(self.sample_every) and not self._counts[name] % self.sample_every
+
+    def _call(self, name, func, *args, **kwargs):
+        """Count a call of func, time it if it's sampled."""
+        if not self._sampled(name):
+            return func(*args, **kwargs)
+
+        start = _timer()
+
+        try:
+            return func(*args, **kwargs)
+        finally:
+            self._add_timing(name, _timer() - start)
+
+    def _timed(self, iterator):
+        start = _timer()
+
+        try:
+            for item in iterator:
+                yield item
+        finally:
+            self._add_timing("iterate", _timer() - start)
+
+    def __getitem__(self, key):
+        # Lookups & assignments are the hot paths, count them inline
+        counts = self._counts
+        counts["getitem"] += 1
+
+        try:
+            if self.sample_every and not counts["getitem"] % self.sample_every:
+                start = _timer()
+
+                try:
+                    return dict.__getitem__(self, key)
+                finally:
+                    self._add_timing("getitem", _timer() - start)
+
+            return dict.__getitem__(self, key)
+        except KeyError:
+            counts["getitem.miss"] += 1
+            raise
+
+    def __setitem__(self, key, value):
+        counts = self._counts
+        counts["setitem"] += 1
+        items_map = self._items_map
+        size = len(items_map)
+        key_exists = key in items_map
+
+        if key_exists:
+            counts["set.key_exists"] += 1
+        elif dict.__contains__(self, key):
+            counts["set.key_is_value"] += 1
+
+        if dict.__contains__(self, value):
+            counts["set.value_exists"] += 1
+
+        if key == value or (key_exists and dict.__getitem__(self, key) == key):
+            counts["set.self_mapped"] += 1
+
+        if self.sample_every and not counts["setitem"] % self.sample_every:
+            start = _timer()
+            _TwoWayOrderedDictBase.__setitem__(self, key, value)
+            self._add_timing("setitem", _timer() - start)
+        else:
+            _TwoWayOrderedDictBase.__setitem__(self, key, value)
+
+        evictions = size + (0 if key_exists else 1) - len(items_map)
+
+        if evictions > 0:
+            counts["implicit_evictions"] += evictions
+
+    def __delitem__(self, key):
+        self._call("delitem", super(InstrumentedTwoWayOrderedDict, self).__delitem__, key)
+
+    def __contains__(self, key):
+        return self._call("contains", dict.__contains__, self, key)
+
+    def __iter__(self):
+        return self._iterate()
+
+    def __reversed__(self):
+        return self._iterate(reverse=True)
+
+    def _iterate(self, reverse=False):
+        iterator = super(InstrumentedTwoWayOrderedDict, self)._iterate(reverse)
+        return self._timed(iterator) if self._sampled("iterate") else iterator
+
+    def _bulk_stored(self, pairs):
+        self._counts["update.bulk_pairs"] += len(pairs)
+
+    def get(self, key, default=None):
+        value = self._call("get", dict.get, self, key, _DEFAULT_OBJECT)
+
+        if value is _DEFAULT_OBJECT:
+            self._counts["get.miss"] += 1
+            return default
+
+        return value
+
+    def update(self, *args, **kwargs):
+        self._call("update", super(InstrumentedTwoWayOrderedDict, self).update, *args, **kwargs)
+
+    def pop(self, key, default=_DEFAULT_OBJECT):
+        return self._call("pop", super(InstrumentedTwoWayOrderedDict, self).pop, key, default)
+
+    def popitem(self, last=True):
+        return self._call("popitem", super(InstrumentedTwoWayOrderedDict, self).popitem, last)
+
+    def clear(self):
+        self._call("clear", super(InstrumentedTwoWayOrderedDict, self).clear)
+
+    def copy(self):
+        tdict = super(InstrumentedTwoWayOrderedDict, self).copy()
+        tdict.sample_every = self.sample_every
+        return tdict
+
+    def __reduce__(self):
+        return self.__class__, (list(self.items()), self.sample_every)
+
+
+########## Secondary indexes ##########
+
+class _SortedList(object):
+
+    """Sorted list split in sublists of at most 2 * load items.
+
+    Insertions and removals bisect the list of the sublist maxes and then
+    the sublist, so they only shift the items of a single sublist. A
+    Fenwick tree over the sublist lengths answers the positional queries,
+    it's dropped when sublists are split or removed and rebuilt on demand.
+
+    """
+
+    def __init__(self, load=512):
+        self._load = load
+        self._lists = []
+        self._maxes = []
+        self._len = 0
+        # 1-based Fenwick tree over the sublist lengths, None when stale
+        self._tree = None
+
+    def __len__(self):
+        return self._len
+
+    def __iter__(self):
+        for sublist in self._lists:
+            for item in sublist:
+                yield item
+
+    def __reversed__(self):
+        for sublist in reversed(self._lists):
+            for item in reversed(sublist):
+                yield item
+
+    def add(self, item):
+        lists, maxes = self._lists, self._maxes
+
+        if not lists:
+            lists.append([item])
+            maxes.append(item)
+        else:
+            index = bisect_left(maxes, item)
+
+            if index == len(maxes):
+                index -= 1
+                lists[index].append(item)
+            else:
+                insort(lists[index], item)
+
+            maxes[index] = lists[index][-1]
+
+            if len(lists[index]) > 2 * self._load:
+                sublist = lists[index]
+                lists[index:index + 1] = [sublist[:self._load], sublist[self._load:]]
+                maxes[index:index + 1] = [sublist[self._load - 1], sublist[-1]]
+                self._tree = None
+            else:
+                self._update_tree(index, 1)
+
+        self._len += 1
+
+    def update(self, items):
+        """Add all the items, rebuild the sublists when the batch is large.
+
+        The batch is sorted and checked first, so items that can't be
+        compared raise TypeError before the list changes.
+
+        """
+        items = sorted(items)
+
+        if items:
+            self.check(items[0])
+
+        if len(items) * 8 < self._len:
+            for item in items:
+                self.add(item)
+
+            return
+
+        items.extend(self)
+        items.sort()
+
+        load = self._load
+        self._lists = [items[start:start + load] for start in range(0, len(items), load)]
+        self._maxes = [sublist[-1] for sublist in self._lists]
+        self._len = len(items)
+        self._tree = None
+
+    def check(self, item):
+        """Compare item with the sublist maxes, raises TypeError if they can't be compared."""
+        bisect_left(self._maxes, item)
+
+    def remove(self, item):
+        lists, maxes = self._lists, self._maxes
+        index = bisect_left(maxes, item)
+        sublist = lists[index]
+        del sublist[bisect_left(sublist, item)]
+
+        if sublist:
+            maxes[index] = sublist[-1]
+            self._update_tree(index, -1)
+        else:
+            del lists[index]
+            del maxes[index]
+            self._tree = None
+
+        self._len -= 1
+
+    def clear(self):
+        self._lists, self._maxes, self._len, self._tree = [], [], 0, None
+
+    def _update_tree(self, index, delta):
+        tree = self._tree
+
+        if tree is not None:
+            index += 1
+
+            while index < len(tree):
+                tree[index] += delta
+                index += index & -index
+
+    def _build_tree(self):
+        tree = [0]
+        tree.extend(len(sublist) for sublist in self._lists)
+
+        # Node index covers the sublists (index - lowbit(index), index]
+        for index in range(1, len(tree)):
+            parent = index + (index & -index)
+
+            if parent < len(tree):
+                tree[parent] += tree[index]
+
+        self._tree = tree
+        return tree
+
+    def _position(self, index, offset):
+        """Return the position of the item lists[index][offset]."""
+        tree = self._tree if self._tree is not None else self._build_tree()
+        position = offset
+
+        while index:
+            position += tree[index]
+            index -= index & -index
+
+        return position
+
+    def _locate(self, position):
+        """Return the (sublist index, offset) of the item at a valid position."""
+        tree = self._tree if self._tree is not None else self._build_tree()
+        index = 0
+        bit = 1 << (len(self._lists).bit_length() - 1)
+
+        # Find the largest prefix of sublists with no more than position items
+        while bit:
+            node = index + bit
+
+            if node < len(tree) and tree[node] <= position:
+                index = node
+                position -= tree[node]
+
+            bit >>= 1
+
+        return index, position
+
+    def bisect_left(self, item):
+        """Return the position of the first item >= item."""
+        index = bisect_left(self._maxes, item)
+
+        if index == len(self._maxes):
+            return self._len
+
+        return self._position(index, bisect_left(self._lists[index], item))
+
+    def bisect_right(self, item):
+        """Return the position of the first item > item."""
+        index = bisect_right(self._maxes, item)
+
+        if index == len(self._maxes):
+            return self._len
+
+        return self._position(index, bisect_right(self._lists[index], item))
+
+    def islice(self, start, stop, reverse=False):
+        """Iterate over the items from start to stop (valid, non negative positions)."""
+        if start >= stop:
+            return
+
+        lists = self._lists
+
+        if reverse:
+            index, offset = self._locate(stop - 1)
+            count = stop - start
+
+            while count > 0:
+                sublist = lists[index]
+                chunk = sublist[max(offset + 1 - count, 0):offset + 1]
+
+                for item in reversed(chunk):
+                    yield item
+
+                count -= len(chunk)
+                index -= 1
+                offset = len(lists[index]) - 1 if index >= 0 else 0
+        else:
+            index, offset = self._locate(start)
+            count = stop - start
+
+            while count > 0:
+                chunk = lists[index][offset:offset + count]
+
+                for item in chunk:
+                    yield item
+
+                count -= len(chunk)
+                index += 1
+                offset = 0
+
+    def irange(self, low, high, reverse=False):
+        """Iterate over the items with low <= item <= high (None = unbounded)."""
+        lists, maxes = self._lists, self._maxes
+
+        if reverse:
+            index = len(maxes) - 1 if high is None else min(bisect_right(maxes, high), len(maxes) - 1)
+
+            for number in range(index, -1, -1):
+                sublist = lists[number]
+                end = len(sublist) if high is None else bisect_right(sublist, high)
+
+                for item in reversed(sublist[:end]):
+                    if low is not None and item < low:
+                        return
+
+                    yield item
+        else:
+            index = 0 if low is None else bisect_left(maxes, low)
+
+            for number in range(index, len(maxes)):
+                sublist = lists[number]
+                start = 0 if low is None else bisect_left(sublist, low)
+
+                for item in sublist[start:]:
+                    if high is not None and item > high:
+                        return
+
+                    yield item
+
+                low = None
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += self._len
+
+        if not 0 <= index < self._len:
+            raise IndexError("sorted list index out of range")
+
+        index, offset = self._locate(index)
+        return self._lists[index][offset]
+
+
+class _SecondaryIndex(object):
+
+    """Base class of the secondary indexes of the MultiIndexTwoWayOrderedDict.
+
+    An index covers either the keys or the values of the pairs (on) and
+    maps key_func(key or value) to the key of the pair. Pairs for which
+    key_func returns None are not indexed.
+
+    """
+
+    KEYS = "keys"
+    VALUES = "values"
+
+    def __init__(self, on=KEYS, key_func=None):
+        if on not in (self.KEYS, self.VALUES):
+            raise ValueError("Unknown side: {0!r}".format(on))
+
+        self.on = on
+        self.key_func = key_func
+        self.clear()
+
+    def _index_key(self, key, value):
+        obj = key if self.on == self.KEYS else value
+        return obj if self.key_func is None else self.key_func(obj)
+
+    def new(self):
+        """Return an empty index with the same settings."""
+        return self.__class__(self.on, self.key_func)
+
+    def add(self, key, value):
+        """Index the key:value pair."""
+        raise NotImplementedError
+
+    def update(self, pairs):
+        """Index all the key:value pairs."""
+        for key, value in pairs:
+            self.add(key, value)
+
+    def check(self, pairs):
+        """Raise if any of the key:value pairs can't be indexed, the index doesn't change."""
+        for key, value in pairs:
+            self._index_key(key, value)
+
+    def discard(self, key, value):
+        """Remove the key:value pair from the index."""
+        raise NotImplementedError
+
+    def clear(self):
+        raise NotImplementedError
+
+
+class SortedIndex(_SecondaryIndex):
+
+    """Keeps the pairs sorted by key_func(key or value), for range queries.
+
+    Every indexed object (or its key_func result) must be comparable with
+    all the others. Insertions, removals and the start of a range query are
+    O(log n) (see _SortedList).
+
+    """
+
+    def clear(self):
+        self._sorted = _SortedList()
+        # Key -> entry in the sorted list, the sequence number breaks the
+        # ties so the keys themselves are never compared
+        self._entries = {}
+        self._sequence = 0
+
+    def add(self, key, value):
+        index_key = self._index_key(key, value)
+
+        if index_key is not None:
+            entry = (index_key, self._sequence, key)
+            self._sequence += 1
+            self._sorted.add(entry)
+            self._entries[key] = entry
+
+    def update(self, pairs):
+        entries = []
+
+        for key, value in pairs:
+            index_key = self._index_key(key, value)
+
+            if index_key is not None:
+                entries.append((index_key, self._sequence + len(entries), key))
+
+        # Raises TypeError before the index changes
+        self._sorted.update(entries)
+
+        self._sequence += len(entries)
+        self._entries.update((entry[2], entry) for entry in entries)
+
+    def check(self, pairs):
+        # One item tuples sort before the entries with the same index key,
+        # so only the index keys are compared
+        index_keys = [(self._index_key(key, value),) for key, value in pairs]
+        index_keys = sorted(index_key for index_key in index_keys if index_key[0] is not None)
+
+        if index_keys:
+            self._sorted.check(index_keys[0])
+
+    def discard(self, key, value):
+        entry = self._entries.pop(key, None)
+
+        if entry is not None:
+            self._sorted.remove(entry)
+
+    def __len__(self):
+        return len(self._sorted)
+
+    def range(self, low=None, high=None, inclusive=(True, True), reverse=False):
+        """Iterate over the keys of the pairs with low <= key_func(obj) <= high.
+
+        Args:
+            low (object): Lower bound, None for no lower bound.
+
+            high (object): Upper bound, None for no upper bound.
+
+            inclusive (tuple): Whether low & high are part of the range.
+
+            reverse (boolean): Iterate from high to low.
+
+        """
+        # Sequence numbers are >= 0, so (low, -1) sorts before every entry
+        # of low and (high, inf) after them
+        start = None if low is None else (low, -1 if inclusive[0] else float("inf"))
+        end = None if high is None else (high, float("inf") if inclusive[1] else -1)
+
+        for entry in self._sorted.irange(start, end, reverse):
+            yield entry[2]
+
+
+class PrefixIndex(_SecondaryIndex):
+
+    """Prefix trie of the str keys (or values), for startswith queries.
+
+    Objects that are not str (after key_func) are not indexed. Updates are
+    O(length of the string) and a query is O(length of the prefix) plus the
+    size of the subtree below it.
+
+    """
+
+    # Trie nodes are dicts of char -> child node, the pair keys of the
+    # strings that end at a node are stored under this key (ordered set)
+    _END = None
+
+    def clear(self):
+        self._root = {}
+        self._size = 0
+
+    def add(self, key, value):
+        text = self._index_key(key, value)
+
+        if isinstance(text, _TEXT_TYPE):
+            node = self._root
+
+            for char in text:
+                node = node.setdefault(char, {})
+
+            keys = node.setdefault(self._END, _OrderedDict())
+            self._size += key not in keys
+            keys[key] = None
+
+    def discard(self, key, value):
+        text = self._index_key(key, value)
+
+        if not isinstance(text, _TEXT_TYPE):
+            return
+
+        path = [self._root]
+
+        for char in text:
+            node = path[-1].get(char)
+
+            if node is None:
+                return
+
+            path.append(node)
+
+        keys = path[-1].get(self._END)
+
+        if keys is None or key not in keys:
+            return
+
+        del keys[key]
+        self._size -= 1
+
+        if keys:
+            return
+
+        del path[-1][self._END]
+
+        # Prune the nodes that lead to no strings anymore
+        for depth in range(len(text), 0, -1):
+            if path[depth]:
+                break
+
+            del path[depth - 1][text[depth - 1]]
+
+    def __len__(self):
+        return self._size
+
+    def startswith(self, prefix):
+        """Iterate over the keys of the pairs whose str starts with prefix, in lexicographic order."""
+        node = self._root
+
+        for char in prefix:
+            node = node.get(char)
+
+            if node is None:
+                return
+
+        stack = [node]
+
+        while stack:
+            node = stack.pop()
+
+            for key in node.get(self._END, ()):
+                yield key
+
+            stack.extend(node[char] for char in sorted((char for char in node if char is not self._END),
+                                                       reverse=True))
+
+
+class HashIndex(_SecondaryIndex):
+
+    """Groups the pairs by key_func(key or value), for exact lookups.
+
+    key_func is required. Updates and lookups are O(1), the keys of a
+    group keep their insertion order.
+
+    """
+
+    def __init__(self, key_func, on=_SecondaryIndex.KEYS):
+        super(HashIndex, self).__init__(on, key_func)
+
+    def new(self):
+        return self.__class__(self.key_func, self.on)
+
+    def clear(self):
+        # Hash key -> ordered set (dict) of pair keys
+        self._groups = {}
+        self._size = 0
+
+    def add(self, key, value):
+        hash_key = self._index_key(key, value)
+
+        if hash_key is not None:
+            group = self._groups.setdefault(hash_key, _OrderedDict())
+            self._size += key not in group
+            group[key] = None
+
+    def check(self, pairs):
+        for key, value in pairs:
+            hash(self._index_key(key, value))
+
+    def discard(self, key, value):
+        hash_key = self._index_key(key, value)
+        group = self._groups.get(hash_key)
+
+        if group is not None and key in group:
+            del group[key]
+            self._size -= 1
+
+            if not group:
+                del self._groups[hash_key]
+
+    def __len__(self):
+        return self._size
+
+    def lookup(self, hash_key):
+        """Return the list of the keys of the pairs with key_func(obj) == hash_key."""
+        return list(self._groups.get(hash_key, ()))
+
+
+class MultiIndexTwoWayOrderedDict(TwoWayOrderedDict):
+
+    """TwoWayOrderedDict with secondary indexes kept in sync.
+
+    Indexes are attached with add_index() and updated incrementally by
+    every assignment (including the pairs that it removes implicitly),
+    deletion and clear(), so range, prefix & grouping queries don't have to
+    scan the whole dictionary:
+
+        * SortedIndex: range(low, high) over the keys or the values
+        * PrefixIndex: startswith(prefix) over str keys or values
+        * HashIndex: lookup(hash_key) for any key_func
+
+    Every index slows down the assignments. Without indexes the dictionary
+    is as fast as the TwoWayOrderedDict.
+
+    Examples:
+        Range & prefix queries::
+
+            >>> tdict = MultiIndexTwoWayOrderedDict([('apple', 3), ('apricot', 7), ('banana', 5)])
+            >>> by_price = tdict.add_index('price', SortedIndex(on=SortedIndex.VALUES))
+            >>> by_name = tdict.add_index('name', PrefixIndex())
+
+            >>> list(by_price.range(4, 8))  # Outputs ['banana', 'apricot']
+            >>> list(by_name.startswith('ap'))  # Outputs ['apple', 'apricot']
+
+    """
+
+    _bulk_safe = True
+
+    def __init__(self, *args, **kwargs):
+        self._indexes = _OrderedDict()
+        super(MultiIndexTwoWayOrderedDict, self).__init__(*args, **kwargs)
+
+    @property
+    def indexes(self):
+        """Dict of the attached indexes by name."""
+        return dict(self._indexes)
+
+    def add_index(self, name, index):
+        """Attach the index under the given name, index the current pairs and return it."""
+        if name in self._indexes:
+            raise ValueError("Index {0!r} already exists".format(name))
+
+        index.clear()
+        index.update(self._iterate_items())
+
+        self._indexes[name] = index
+        return index
+
+    def remove_index(self, name):
+        """Detach and return the index with the given name."""
+        return self._indexes.pop(name)
+
+    def _check_pairs(self, pairs):
+        """Raise before the dictionary changes if an index can't take the pairs."""
+        for index in self._indexes.values():
+            index.check(pairs)
+
+    def _index_pair(self, key, value):
+        for index in self._indexes.values():
+            index.add(key, value)
+
+    def _unindex_pair(self, key, value):
+        for index in self._indexes.values():
+            index.discard(key, value)
+
+    def __setitem__(self, key, value):
+        if not self._indexes:
+            _TwoWayOrderedDictBase.__setitem__(self, key, value)
+            return
+
+        self._check_pairs([(key, value)])
+
+        # Pairs that the assignment might change or remove
+        affected = []
+
+        for item in (key, value):
+            if dict.__contains__(self, item):
+                node_key = self._node_key(item)
+
+                if node_key not in [pair[0] for pair in affected]:
+                    affected.append((node_key, dict.__getitem__(self, node_key)))
+
+        _TwoWayOrderedDictBase.__setitem__(self, key, value)
+
+        for node_key, old_value in affected:
+            self._unindex_pair(node_key, old_value)
+
+        self._index_pair(key, value)
+
+    def __delitem__(self, key):
+        if not self._indexes:
+            _TwoWayOrderedDictBase.__delitem__(self, key)
+            return
+
+        node_key = self._node_key(key)
+        value = dict.__getitem__(self, node_key)
+
+        _TwoWayOrderedDictBase.__delitem__(self, key)
+        self._unindex_pair(node_key, value)
+
+    def _bulk_update(self, pairs):
+        pairs = list(pairs)
+
+        # All or nothing, check the whole batch before any pair is stored
+        self._check_pairs(pairs)
+        super(MultiIndexTwoWayOrderedDict, self)._bulk_update(pairs)
+
+    def _bulk_update_columns(self, keys, values):
+        if self._indexes:
+            self._check_pairs(list(zip(keys, values)))
+
+        super(MultiIndexTwoWayOrderedDict, self)._bulk_update_columns(keys, values)
+
+    def _bulk_stored(self, pairs):
+        for index in self._indexes.values():
+            index.update(pairs)
+
+    def clear(self):
+        super(MultiIndexTwoWayOrderedDict, self).clear()
+
+        for index in self._indexes.values():
+            index.clear()
+
+    def copy(self):
+        tdict = super(MultiIndexTwoWayOrderedDict, self).copy()
+
+        for name, index in self._indexes.items():
+            tdict.add_index(name, index.new())
+
+        return tdict
+
+    def __reduce__(self):
+        return _from_indexes, (self.__class__, list(self.items()),
+                               [(name, index.new()) for name, index in self._indexes.items()])
+
+
+def _from_indexes(cls, items, indexes):
+    """Create a cls instance with the given items and (empty) indexes."""
+    tdict = cls(items)
+
+    for name, index in indexes:
+        tdict.add_index(name, index)
+
+    return tdict
+
+
+########## Sorted dictionary ##########
+
+class SortedTwoWayDict(TwoWayOrderedDict):
+
+    """Two way dictionary that keeps its pairs sorted by key or by value.
+
+    Instead of the insertion order the pairs are kept in the order of their
+    keys (by=KEYS) or of their values (by=VALUES) in a chunked sorted list
+    (see _SortedList). So ordered iteration doesn't sort anything and the
+    assignments, deletions, positional operations (index_of(), item_at(),
+    peekitem(), islice()) and the sorted lookups (bisect_left(),
+    bisect_right(), irange(), floor_item(), ceiling_item()) are O(log n).
+    Lookups by key or by value are plain dict lookups, like the
+    TwoWayOrderedDict.
+
+    All the keys (or the values) must be comparable with each other.
+    Objects that can't be compared raise TypeError before the dictionary
+    changes. The items can't be moved, move_to_end(), move_before() and
+    move_after() raise TypeError.
+
+    Args:
+        data (mapping or iterable): Initial key:value pairs.
+
+        by (string): Sort the pairs by their KEYS or by their VALUES.
+
+    Examples:
+        Sort by value::
+
+            >>> tdict = SortedTwoWayDict({'b': 3, 'a': 5, 'c': 1}, by=SortedTwoWayDict.VALUES)
+            >>> list(tdict.items())  # Outputs [('c', 1), ('b', 3), ('a', 5)]
+            >>> list(tdict.irange(2, 5))  # Outputs ['b', 'a']
+            >>> tdict.floor_item(4)  # Outputs ('b', 3)
+
+    """
+
+    KEYS = "keys"
+    VALUES = "values"
+
+    # _bulk_store() keeps the sorted list in sync
+    _bulk_safe = True
+
+    def __init__(self, data=(), by=KEYS):
+        if by not in (self.KEYS, self.VALUES):
+            raise ValueError("Unknown sort side: {0!r}".format(by))
+
+        self._by_values = by == self.VALUES
+        super(SortedTwoWayDict, self).__init__(data)
+
+    @property
+    def by(self):
+        """The side (KEYS or VALUES) that the pairs are sorted by."""
+        return self.VALUES if self._by_values else self.KEYS
+
+    def __setitem__(self, key, value):
+        entry = value if self._by_values else key
+
+        # Fail before the storage changes
+        self._items.check(entry)
+
+        _TwoWayOrderedDictBase.__setitem__(self, key, value)
+
+        if self._by_values:
+            # The key either kept its node (old value) or got a new one
+            items_map = self._items_map
+            old_entry = items_map[key]
+
+            if old_entry is not _DEFAULT_OBJECT:
+                self._items.remove(old_entry)
+
+            self._items.add(value)
+            items_map[key] = value
+
+    def _append_key(self, key):
+        if self._by_values:
+            # The value is stored after this call, __setitem__ sorts it
+            self._items_map[key] = _DEFAULT_OBJECT
+        else:
+            self._items.add(key)
+            self._items_map[key] = key
+
+    def _extend_keys(self, keys):
+        keys = list(keys)
+        entries = [dict.__getitem__(self, key) for key in keys] if self._by_values else keys
+
+        self._items.update(entries)
+        self._items_map.update(zip(keys, entries))
+
+    def _remove_mapped_key(self, key):
+        entry = self._items_map.pop(key, _DEFAULT_OBJECT)
+
+        if entry is not _DEFAULT_OBJECT:
+            self._items.remove(entry)
+
+    def _entry_key(self, entry):
+        """Return the key of the pair with the given sort entry."""
+        return dict.__getitem__(self, entry) if self._by_values else entry
+
+    def _end_key(self, last=True):
+        return self._entry_key(self._items[-1 if last else 0])
+
+    def _iterate(self, reverse=False):
+        entries = reversed(self._items) if reverse else iter(self._items)
+
+        if self._by_values:
+            return map(dict.__getitem__, repeat(self), entries)
+
+        return entries
+
+    def _iterate_slice(self, start, stop, reverse=False):
+        entries = self._items.islice(start, stop, reverse)
+
+        if self._by_values:
+            return map(dict.__getitem__, repeat(self), entries)
+
+        return entries
+
+    def _key_index(self, key):
+        return self._items.bisect_left(self._items_map[key])
+
+    def _key_at(self, index):
+        return self._entry_key(self._items[index])
+
+    def _item_at(self, position):
+        key = self._key_at(position)
+        return key, dict.__getitem__(self, key)
+
+    def move_to_end(self, key, last=True):
+        raise TypeError("SortedTwoWayDict is ordered by its sort key; pairs can't be moved")
+
+    def move_before(self, key, anchor):
+        raise TypeError("SortedTwoWayDict is ordered by its sort key; pairs can't be moved")
+
+    def move_after(self, key, anchor):
+        raise TypeError("SortedTwoWayDict is ordered by its sort key; pairs can't be moved")
+
+    def _bulk_store(self, forward, keys):
+        # Sort the new entries first, so incomparable ones raise TypeError
+        # before the storage changes
+        keys = list(keys)
+        entries = [forward[key] for key in keys] if self._by_values else keys
+
+        self._items.update(entries)
+        self._items_map.update(zip(keys, entries))
+
+        dict.update(self, zip(forward.values(), forward.keys()))
+        dict.update(self, forward)
+
+    def bisect_left(self, obj):
+        """Return the position of the first pair with key (or value) >= obj."""
+        return self._items.bisect_left(obj)
+
+    def bisect_right(self, obj):
+        """Return the position of the first pair with key (or value) > obj."""
+        return self._items.bisect_right(obj)
+
+    bisect = bisect_right
+
+    def irange(self, low=None, high=None, inclusive=(True, True), reverse=False):
+        """Iterate over the keys of the pairs with low <= key (or value) <= high.
+
+        Args:
+            low (object): Lower bound, None for no lower bound.
+
+            high (object): Upper bound, None for no upper bound.
+
+            inclusive (tuple): Whether low & high are part of the range.
+
+            reverse (boolean): Iterate from high to low.
+
+        """
+        items = self._items
+
+        if low is None:
+            start = 0
+        else:
+            start = items.bisect_left(low) if inclusive[0] else items.bisect_right(low)
+
+        if high is None:
+            stop = len(items)
+        else:
+            stop = items.bisect_right(high) if inclusive[1] else items.bisect_left(high)
+
+        return self._iterate_slice(start, max(start, stop), reverse)
+
+    def peekitem(self, index=-1):
+        """Return the (key, value) pair at the given sorted position without removing it.
+
+        Raises:
+            IndexError: If the index is out of range.
+
+        """
+        return self.item_at(index)
+
+    def floor_item(self, obj, strict=False):
+        """Return the pair with the greatest key (or value) <= obj.
+
+        Args:
+            obj (object): Object to compare the keys (or the values) with.
+
+            strict (boolean): Look for the greatest key (or value) < obj.
+
+        Returns:
+            The (key, value) pair or None if there's no such pair.
+
+        """
+        position = self._items.bisect_left(obj) if strict else self._items.bisect_right(obj)
+        return self._item_at(position - 1) if position else None
+
+    def ceiling_item(self, obj, strict=False):
+        """Same as floor_item() but returns the pair with the least key (or value) >= obj."""
+        position = self._items.bisect_right(obj) if strict else self._items.bisect_left(obj)
+        return self._item_at(position) if position < len(self._items) else None
+
+    def clear(self):
+        # Sort entries (keys or values) in order
+        self._items = _SortedList()
+        # Map keys into their sort entry
+        self._items_map = {}
+        dict.clear(self)
+
+    def copy(self):
+        tdict = self.__class__(by=self.by)
+        dict.update(tdict, _viewitems(self))
+        tdict._extend_keys(self._iterate())
+        return tdict
+
+    def __reduce__(self):
+        return self.__class__, (list(self.items()), self.by)
+
+
+########## Snapshots ##########
+
+class SnapshotKeysView(_HashedSetOperations, KeysView):
+
+    def __repr__(self):
+        return "dict_keys({data})".format(data=list(self))
+
+    def __reversed__(self):
+        return self._mapping._iterate(reverse=True)
+
+    def __contains__(self, key):
+        try:
+            return self._mapping._is_key(key)
+        except TypeError:
+            # Unhashable objects can't be part of the dictionary
+            return False
+
+
+class SnapshotValuesView(_HashedSetOperations, ValuesView):
+
+    def __repr__(self):
+        return "dict_values({data})".format(data=list(self))
+
+    def __iter__(self):
+        return map(self._mapping.__getitem__, self._mapping._iterate())
+
+    def __reversed__(self):
+        return map(self._mapping.__getitem__, self._mapping._iterate(reverse=True))
+
+    def __contains__(self, value):
+        try:
+            key = self._mapping[value]
+        except (KeyError, TypeError):
+            return False
+
+        # The object mapped to a value is its key, e.g. {'a': 'a'}
+        return self._mapping._is_key(key) and self._mapping[key] == value
+
+
+class SnapshotItemsView(_HashedSetOperations, ItemsView):
+
+    def __repr__(self):
+        return "dict_items({data})".format(data=list(self))
+
+    def __iter__(self):
+        return ((key, self._mapping[key]) for key in self._mapping._iterate())
+
+    def __reversed__(self):
+        return ((key, self._mapping[key]) for key in self._mapping._iterate(reverse=True))
+
+    def __contains__(self, item):
+        if not isinstance(item, tuple) or len(item) != 2:
+            return False
+
+        key, value = item
+
+        try:
+            if not self._mapping._is_key(key):
+                return False
+        except TypeError:
+            # Unhashable objects can't be part of the dictionary
+            return False
+
+        return self._mapping[key] == value
+
+
+class TwoWayOrderedDictSnapshot(Mapping):
+
+    """Read-only view of a SnapshotTwoWayOrderedDict as of snapshot().
+
+    The view shares the storage and the linked list nodes with the live
+    dictionary. Before the live dictionary changes a storage entry or a
+    node, it saves the old one in every snapshot that doesn't have it yet,
+    so a snapshot reads the saved copies first and the live structures
+    for everything else.
+
+    """
+
+    def __init__(self, tdict):
+        self._tdict = tdict
+        self._root = tdict._items
+        self._len = len(tdict)
+        # id(node) -> (node, copy of [prev, key, next]) before the first change
+        self._nodes = {}
+        # Object -> mapped object before the first change (_DEFAULT_OBJECT if missing)
+        self._storage = {}
+        # Object -> whether it was a key before the first change
+        self._keys = {}
+
+    def _save_nodes(self, nodes):
+        saved = self._nodes
+
+        for node in nodes:
+            if id(node) not in saved:
+                saved[id(node)] = (node, list(node))
+
+    def _save_storage(self, objects):
+        saved, keys, items_map = self._storage, self._keys, self._tdict._items_map
+
+        for obj in objects:
+            if obj not in saved:
+                saved[obj] = dict.get(self._tdict, obj, _DEFAULT_OBJECT)
+                keys[obj] = obj in items_map
+
+    def _save_missing(self, objects):
+        saved, keys = self._storage, self._keys
+
+        for obj in objects:
+            if obj not in saved:
+                saved[obj] = _DEFAULT_OBJECT
+                keys[obj] = False
+
+    def _detach(self):
+        """Copy the rest of the storage before the live dictionary clears it."""
+        storage = dict(_viewitems(self._tdict))
+
+        for obj, mapped in self._storage.items():
+            if mapped is _DEFAULT_OBJECT:
+                storage.pop(obj, None)
+            else:
+                storage[obj] = mapped
+
+        keys = dict.fromkeys(self._tdict._items_map, True)
+        keys.update(self._keys)
+
+        # The nodes are dropped by clear() and never change again
+        self._storage = storage
+        self._keys = keys
+        self._tdict = None
+
+    def _is_key(self, obj):
+        """Check if obj was a key when the snapshot was taken."""
+        if obj in self._keys:
+            return self._keys[obj]
+
+        return self._tdict is not None and obj in self._tdict._items_map
+
+    def __getitem__(self, item):
+        storage = self._storage
+
+        if item in storage:
+            mapped = storage[item]
+
+            if mapped is _DEFAULT_OBJECT:
+                raise KeyError(item)
+
+            return mapped
+
+        if self._tdict is None:
+            raise KeyError(item)
+
+        return dict.__getitem__(self._tdict, item)
+
+    def __contains__(self, item):
+        try:
+            self[item]
+        except KeyError:
+            return False
+
+        return True
+
+    def __len__(self):
+        return self._len
+
+    def __iter__(self):
+        return self._iterate()
+
+    def __reversed__(self):
+        return self._iterate(reverse=True)
+
+    def __repr__(self):
+        return '%s(%r)' % (self.__class__.__name__, list(self.items()))
+
+    def keys(self):
+        return SnapshotKeysView(self)
+
+    def values(self):
+        return SnapshotValuesView(self)
+
+    def items(self):
+        return SnapshotItemsView(self)
+
+    def _iterate(self, reverse=False):
+        index = _PyTwoWayOrderedDictBase._PREV if reverse else _PyTwoWayOrderedDictBase._NEXT
+        saved = self._nodes
+        root = self._root
+
+        links = saved[id(root)][1] if id(root) in saved else root
+        curr = links[index]
+
+        while curr is not root:
+            yield curr[_PyTwoWayOrderedDictBase._KEY]
+
+            links = saved[id(curr)][1] if id(curr) in saved else curr
+            curr = links[index]
+
+
+class SnapshotTwoWayOrderedDict(TwoWayOrderedDict):
+
+    """TwoWayOrderedDict with O(1) copy-on-write snapshots.
+
+    snapshot() returns a read-only Mapping that keeps the items & the order
+    as of the call, however the dictionary changes afterwards, so long
+    iterations don't have to copy() the whole dictionary first. Creating
+    a snapshot is O(1), while snapshots are alive every mutation saves the
+    storage entries and the linked list nodes that it's about to change
+    into them, so the cost is proportional to the changes instead of the
+    size. clear() copies the storage into the live snapshots, just like
+    clear() itself it's O(n).
+
+    The dictionary keeps weak references to its snapshots, once a snapshot
+    is dropped the mutations stop paying for it.
+
+    Examples:
+        Iterate while changing the dictionary::
+
+            >>> tdict = SnapshotTwoWayOrderedDict([('a', 1), ('b', 2)])
+            >>> for key, value in tdict.snapshot().items():
+            ...     del tdict[key]
+            ...     tdict[key + '!'] = value
+            >>> tdict  # Outputs SnapshotTwoWayOrderedDict([('a!', 1), ('b!', 2)])
+
+    """
+
+    _bulk_safe = True
+
+    def __init__(self, *args, **kwargs):
+        # Serial number -> live snapshot
+        self._snapshots = weakref.WeakValueDictionary()
+        self._serial = 0
+
+        super(SnapshotTwoWayOrderedDict, self).__init__(*args, **kwargs)
+
+    def snapshot(self):
+        """Return a read-only, consistent view of the current items."""
+        snapshot = TwoWayOrderedDictSnapshot(self)
+
+        self._serial += 1
+        self._snapshots[self._serial] = snapshot
+        return snapshot
+
+    def _save_nodes(self, *nodes):
+        for snapshot in self._snapshots.values():
+            snapshot._save_nodes(nodes)
+
+    def _save_storage(self, objects):
+        for snapshot in self._snapshots.values():
+            snapshot._save_storage(objects)
+
+    def __setitem__(self, key, value):
+        if self._snapshots:
+            # The key, the value and the objects mapped to them might change
+            get = dict.get
+            self._save_storage((key, value, get(self, key, key), get(self, value, value)))
+
+        _TwoWayOrderedDictBase.__setitem__(self, key, value)
+
+    def __delitem__(self, key):
+        if self._snapshots:
+            self._save_storage((key, dict.get(self, key, key)))
+
+        _TwoWayOrderedDictBase.__delitem__(self, key)
+
+    def _bulk_stored(self, pairs):
+        # A collision free batch holds only objects that were missing
+        for snapshot in self._snapshots.values():
+            snapshot._save_missing(obj for pair in pairs for obj in pair)
+
+    def _append_key(self, key):
+        if self._snapshots:
+            self._save_nodes(self._items, self._items[self._PREV])
+
+        super(SnapshotTwoWayOrderedDict, self)._append_key(key)
+
+    def _extend_keys(self, keys):
+        if self._snapshots:
+            self._save_nodes(self._items, self._items[self._PREV])
+
+        super(SnapshotTwoWayOrderedDict, self)._extend_keys(keys)
+
+    def _remove_mapped_key(self, key):
+        if self._snapshots and key in self._items_map:
+            node = self._items_map[key]
+            self._save_nodes(node[self._PREV], node[self._NEXT])
+
+        super(SnapshotTwoWayOrderedDict, self)._remove_mapped_key(key)
+
+    def _move_key(self, key, last=True):
+        if self._snapshots:
+            node, root = self._items_map[key], self._items
+            end = root[self._PREV if last else self._NEXT]
+            self._save_nodes(node, node[self._PREV], node[self._NEXT], root, end)
+
+        super(SnapshotTwoWayOrderedDict, self)._move_key(key, last)
+
+    def _move_key_next_to(self, key, anchor, after=True):
+        if self._snapshots:
+            node, anchor_node = self._items_map[key], self._items_map[anchor]
+            other = anchor_node[self._NEXT if after else self._PREV]
+            self._save_nodes(node, node[self._PREV], node[self._NEXT], anchor_node, other)
+
+        super(SnapshotTwoWayOrderedDict, self)._move_key_next_to(key, anchor, after)
+
+    def clear(self):
+        # The nodes are left untouched, only the storage must be copied
+        for snapshot in list(self._snapshots.values()):
+            snapshot._detach()
+
+        self._snapshots.clear()
+        super(SnapshotTwoWayOrderedDict, self).clear()
+
+
+########## Persistent dictionary ##########
+
+_HASH_MASK = (1 << 64) - 1
+
+# Bits of the hash (or of the slot) consumed by every trie level
+_TRIE_BITS = 5
+
+_TRIE_MASK = (1 << _TRIE_BITS) - 1
+
+# Rebuild a persistent dictionary with more dead slots than that & its size
+_MIN_DEAD_SLOTS = 32
+
+
+def _hamt_hash(obj):
+    return hash(obj) & _HASH_MASK
+
+
+def _popcount(number):
+    return bin(number).count("1")
+
+
+class _HamtNode(object):
+
+    """Node of a hash array mapped trie.
+
+    Bit i of the bitmap is set when the node holds an entry for the hash
+    chunk i, the entries are either (key, value) leaves or child nodes.
+
+    """
+
+    __slots__ = ("bitmap", "entries")
+
+    def __init__(self, bitmap, entries):
+        self.bitmap = bitmap
+        self.entries = entries
+
+
+class _HamtCollision(object):
+
+    """Leaves whose keys have the exact same hash."""
+
+    __slots__ = ("hash", "entries")
+
+    def __init__(self, key_hash, entries):
+        self.hash = key_hash
+        self.entries = entries
+
+
+_EMPTY_HAMT = _HamtNode(0, ())
+
+
+def _hamt_get(node, key, key_hash, default):
+    """Return the value of key in the trie, default if it's missing."""
+    shift = 0
+
+    while True:
+        if node.__class__ is _HamtCollision:
+            for leaf in node.entries:
+                if leaf[0] is key or leaf[0] == key:
+                    return leaf[1]
+
+            return default
+
+        bit = 1 << ((key_hash >> shift) & _TRIE_MASK)
+
+        if not node.bitmap & bit:
+            return default
+
+        entry = node.entries[_popcount(node.bitmap & (bit - 1))]
+
+        if entry.__class__ is tuple:
+            return entry[1] if entry[0] is key or entry[0] == key else default
+
+        node = entry
+        shift += _TRIE_BITS
+
+
+def _hamt_pair(shift, leaf, leaf_hash, other, other_hash):
+    """Return the subtrie that holds two leaves with different keys."""
+    if leaf_hash == other_hash:
+        return _HamtCollision(leaf_hash, (leaf, other))
+
+    chunk = (leaf_hash >> shift) & _TRIE_MASK
+    other_chunk = (other_hash >> shift) & _TRIE_MASK
+
+    if chunk == other_chunk:
+        return _HamtNode(1 << chunk, (_hamt_pair(shift + _TRIE_BITS, leaf, leaf_hash, other, other_hash),))
+
+    entries = (leaf, other) if chunk < other_chunk else (other, leaf)
+    return _HamtNode((1 << chunk) | (1 << other_chunk), entries)
+
+
+def _hamt_set(node, shift, key, key_hash, value):
+    """Return a copy of the trie with key mapped to value, the rest is shared."""
+    if node.__class__ is _HamtCollision:
+        if key_hash != node.hash:
+            # Push the collision one level down, next to the new leaf
+            node = _HamtNode(1 << ((node.hash >> shift) & _TRIE_MASK), (node,))
+            return _hamt_set(node, shift, key, key_hash, value)
+
+        entries = tuple(leaf for leaf in node.entries if not (leaf[0] is key or leaf[0] == key))
+        return _HamtCollision(key_hash, entries + ((key, value),))
+
+    bit = 1 << ((key_hash >> shift) & _TRIE_MASK)
+    index = _popcount(node.bitmap & (bit - 1))
+    entries = node.entries
+
+    if not node.bitmap & bit:
+        return _HamtNode(node.bitmap | bit, entries[:index] + ((key, value),) + entries[index:])
+
+    entry = entries[index]
+
+    if entry.__class__ is tuple:
+        if entry[0] is key or entry[0] == key:
+            entry = (key, value)
+        else:
+            entry = _hamt_pair(shift + _TRIE_BITS, entry, _hamt_hash(entry[0]), (key, value), key_hash)
+    else:
+        entry = _hamt_set(entry, shift + _TRIE_BITS, key, key_hash, value)
+
+    return _HamtNode(node.bitmap, entries[:index] + (entry,) + entries[index + 1:])
+
+
+def _hamt_delete(node, shift, key, key_hash):
+    """Return a copy of the trie without the (existing) key.
+
+    Subtries left with a single leaf are replaced by the leaf and empty
+    ones by None, except for the root.
+
+    """
+    if node.__class__ is _HamtCollision:
+        entries = tuple(leaf for leaf in node.entries if not (leaf[0] is key or leaf[0] == key))
+        return entries[0] if len(entries) == 1 else _HamtCollision(node.hash, entries)
+
+    bit = 1 << ((key_hash >> shift) & _TRIE_MASK)
+    index = _popcount(node.bitmap & (bit - 1))
+    entries = node.entries
+    entry = entries[index]
+
+    if entry.__class__ is tuple:
+        entry = None
+    else:
+        entry = _hamt_delete(entry, shift + _TRIE_BITS, key, key_hash)
+
+    if entry is not None:
+        return _HamtNode(node.bitmap, entries[:index] + (entry,) + entries[index + 1:])
+
+    entries = entries[:index] + entries[index + 1:]
+
+    if shift and not entries:
+        return None
+
+    if shift and len(entries) == 1 and entries[0].__class__ is tuple:
+        return entries[0]
+
+    return _HamtNode(node.bitmap & ~bit, entries)
+
+
+def _hamt_build(leaves, shift=0):
+    """Build a trie from a list of (hash, key, value) with distinct keys in O(n)."""
+    # The root is always a node
+    if shift and all(leaf[0] == leaves[0][0] for leaf in leaves):
+        return _HamtCollision(leaves[0][0], tuple((key, value) for _, key, value in leaves))
+
+    chunks = {}
+
+    for leaf in leaves:
+        chunks.setdefault((leaf[0] >> shift) & _TRIE_MASK, []).append(leaf)
+
+    bitmap = 0
+    entries = []
+
+    for chunk in sorted(chunks):
+        bitmap |= 1 << chunk
+        group = chunks[chunk]
+
+        if len(group) == 1:
+            entries.append(group[0][1:])
+        else:
+            entries.append(_hamt_build(group, shift + _TRIE_BITS))
+
+    return _HamtNode(bitmap, tuple(entries))
+
+
+def _vector_get(node, shift, index):
+    """Return the item at index of a persistent vector (trie of 32-tuples)."""
+    while shift:
+        node = node[(index >> shift) & _TRIE_MASK]
+        shift -= _TRIE_BITS
+
+    return node[index & _TRIE_MASK]
+
+
+def _vector_set(node, shift, index, item):
+    """Return a copy of the vector with item at index (or appended at index == size)."""
+    position = (index >> shift) & _TRIE_MASK
+
+    if shift:
+        child = node[position] if position < len(node) else ()
+        item = _vector_set(child, shift - _TRIE_BITS, index, item)
+
+    return node[:position] + (item,) + node[position + 1:]
+
+
+def _vector_build(items):
+    """Return the (root, shift) of a vector holding the items."""
+    width = 1 << _TRIE_BITS
+    nodes = [tuple(items[start:start + width]) for start in range(0, len(items), width)] or [()]
+    shift = 0
+
+    while len(nodes) > 1:
+        nodes = [tuple(nodes[start:start + width]) for start in range(0, len(nodes), width)]
+        shift += _TRIE_BITS
+
+    return nodes[0], shift
+
+
+def _vector_iterate(node, shift, reverse=False):
+    """Iterate over the items of the vector that are not None."""
+    stack = [(node, shift)]
+
+    while stack:
+        node, shift = stack.pop()
+
+        if shift:
+            # Pushed backwards so the first child is popped first
+            children = node if reverse else reversed(node)
+            stack.extend((child, shift - _TRIE_BITS) for child in children)
+        else:
+            for item in (reversed(node) if reverse else node):
+                if item is not None:
+                    yield item
+
+
+class PersistentKeysView(_HashedSetOperations, KeysView):
+
+    def __repr__(self):
+        return "dict_keys({data})".format(data=list(self))
+
+    def __contains__(self, key):
+        return self._mapping._find(key, _KEY_SIDE) >= 0
+
+
+class PersistentValuesView(_HashedSetOperations, ValuesView):
+
+    def __repr__(self):
+        return "dict_values({data})".format(data=list(self))
+
+    def __contains__(self, value):
+        return self._mapping._find(value, _VALUE_SIDE) >= 0
+
+    def __iter__(self):
+        return (value for _, value in self._mapping._iterate_items())
+
+
+class PersistentItemsView(_HashedSetOperations, ItemsView):
+
+    def __repr__(self):
+        return "dict_items({data})".format(data=list(self))
+
+    def __contains__(self, item):
+        if not isinstance(item, tuple) or len(item) != 2:
+            return False
+
+        slot = self._mapping._find(item[0], _KEY_SIDE)
+        return slot >= 0 and self._mapping._pair(slot)[1] == item[1]
+
+    def __iter__(self):
+        return self._mapping._iterate_items()
+
+
+class PersistentTwoWayOrderedDict(Mapping):
+
+    """Immutable TwoWayOrderedDict whose versions share their memory.
+
+    The pairs are kept in insertion order in a persistent vector (a trie of
+    32-tuples indexed by slot) and each direction has a hash array mapped
+    trie that maps the keys (or the values) to their slot. set(), delete()
+    and update() never change the dictionary, they return a new version
+    that copies only the O(log n) trie nodes on the changed paths and
+    shares everything else with the old version. Removed pairs leave an
+    empty slot behind, a version is rebuilt in O(n) once the empty slots
+    outnumber the pairs.
+
+    Lookups (in both directions) are O(log n) too. Conversion from and to
+    the TwoWayOrderedDict builds the tries bottom-up and loads the
+    TwoWayOrderedDict through its bulk path.
+
+    It pays off when many versions are kept, a single mutable
+    dictionary is still better served by the TwoWayOrderedDict.
+
+    Args:
+        Same as the TwoWayOrderedDict, the pairs are resolved by a
+        TwoWayOrderedDict first (unless one is given), so the result is
+        the same as assigning them one by one.
+
+    Examples:
+        Keep many versions::
+
+            >>> v1 = PersistentTwoWayOrderedDict([('a', 1), ('b', 2)])
+            >>> v2 = v1.set('c', 3)
+            >>> v3 = v2.delete(1)
+
+            >>> list(v1.items())  # Outputs [('a', 1), ('b', 2)]
+            >>> list(v3.items())  # Outputs [('b', 2), ('c', 3)]
+            >>> v3.to_tdict()  # Outputs TwoWayOrderedDict([('b', 2), ('c', 3)])
+
+    """
+
+    def __init__(self, *args, **kwargs):
+        if len(args) == 1 and not kwargs and isinstance(args[0], (TwoWayOrderedDict, PersistentTwoWayOrderedDict)):
+            # Already free of key/value collisions
+            pairs = list(args[0].items())
+        else:
+            pairs = list(TwoWayOrderedDict(*args, **kwargs).items())
+
+        self._build(pairs)
+
+    def _build(self, pairs):
+        """Build the tries of the collision free pairs bottom-up."""
+        self._order, self._shift = _vector_build(pairs)
+        self._size = self._count = len(pairs)
+
+        self._tries = [None, None]
+
+        for side in (_KEY_SIDE, _VALUE_SIDE):
+            leaves = [(_hamt_hash(pair[side]), pair[side], slot) for slot, pair in enumerate(pairs)]
+            self._tries[side] = _hamt_build(leaves)
+
+    def _clone(self):
+        tdict = self.__class__.__new__(self.__class__)
+        tdict.__dict__.update(self.__dict__)
+        tdict._tries = list(self._tries)
+        return tdict
+
+    def _find(self, obj, side):
+        """Return the slot of the pair whose key (or value) is obj, else -1."""
+        return _hamt_get(self._tries[side], obj, _hamt_hash(obj), -1)
+
+    def _pair(self, slot):
+        return _vector_get(self._order, self._shift, slot)
+
+    def _iterate_items(self, reverse=False):
+        return _vector_iterate(self._order, self._shift, reverse)
+
+    def _store(self, slot, pair):
+        """Set the pair of the slot, slot == _size appends it (on a clone)."""
+        if slot == 1 << (self._shift + _TRIE_BITS):
+            # The vector is full, add a level on top
+            self._order = (self._order,)
+            self._shift += _TRIE_BITS
+
+        self._order = _vector_set(self._order, self._shift, slot, pair)
+
+    def _remove(self, slot, keep_slot=False):
+        """Remove the pair of the slot from the tries (on a clone)."""
+        pair = self._pair(slot)
+
+        for side in (_KEY_SIDE, _VALUE_SIDE):
+            self._tries[side] = _hamt_delete(self._tries[side], 0, pair[side], _hamt_hash(pair[side]))
+
+        if not keep_slot:
+            self._store(slot, None)
+
+        self._count -= 1
+
+    def _compacted(self):
+        """Return self or, when most slots are empty, a rebuilt copy."""
+        dead = self._size - self._count
+
+        if dead > _MIN_DEAD_SLOTS and dead > self._count:
+            tdict = self.__class__.__new__(self.__class__)
+            tdict._build(list(self._iterate_items()))
+            return tdict
+
+        return self
+
+    def set(self, key, value):
+        """Return a new version with key:value assigned.
+
+        The pairs that hold the key or the value are removed first, exactly
+        like TwoWayOrderedDict.__setitem__() does, and an existing key keeps
+        its position.
+
+        """
+        key_hash, value_hash = _hamt_hash(key), _hamt_hash(value)
+        tdict = self._clone()
+
+        # The pair of the key keeps its slot, a pair that holds the key as
+        # its value is removed
+        slot = _hamt_get(tdict._tries[_KEY_SIDE], key, key_hash, -1)
+
+        if slot >= 0:
+            tdict._remove(slot, keep_slot=True)
+        else:
+            other = _hamt_get(tdict._tries[_VALUE_SIDE], key, key_hash, -1)
+
+            if other >= 0:
+                tdict._remove(other)
+
+        for side in (_KEY_SIDE, _VALUE_SIDE):
+            other = _hamt_get(tdict._tries[side], value, value_hash, -1)
+
+            if other >= 0:
+                tdict._remove(other)
+                break
+
+        if slot < 0:
+            slot = tdict._size
+            tdict._size += 1
+
+        tdict._store(slot, (key, value))
+        tdict._tries[_KEY_SIDE] = _hamt_set(tdict._tries[_KEY_SIDE], 0, key, key_hash, slot)
+        tdict._tries[_VALUE_SIDE] = _hamt_set(tdict._tries[_VALUE_SIDE], 0, value, value_hash, slot)
+        tdict._count += 1
+
+        return tdict._compacted()
+
+    def delete(self, key):
+        """Return a new version without the pair that holds the key (or value).
+
+        Raises:
+            KeyError: If the key does not exist.
+
+        """
+        slot = self._find(key, _KEY_SIDE)
+
+        if slot < 0:
+            slot = self._find(key, _VALUE_SIDE)
+
+        if slot < 0:
+            raise KeyError(key)
+
+        tdict = self._clone()
+        tdict._remove(slot)
+        return tdict._compacted()
+
+    def update(self, *args, **kwargs):
+        """Return a new version with the pairs of args & kwargs assigned."""
+        tdict = self
+
+        for key, value in TwoWayOrderedDict(*args, **kwargs).items():
+            tdict = tdict.set(key, value)
+
+        return tdict
+
+    def to_tdict(self, cls=TwoWayOrderedDict):
+        """Return a (mutable) cls() instance with the same pairs, loaded in bulk.
+
+        cls can be any callable that creates an empty TwoWayOrderedDict, for
+        example functools.partial(BoundedTwoWayOrderedDict, 100).
+
+        """
+        pairs = list(self._iterate_items())
+        return _from_columns(cls, [key for key, _ in pairs], [value for _, value in pairs])
+
+    def __getitem__(self, item):
+        slot = self._find(item, _KEY_SIDE)
+
+        if slot >= 0:
+            return self._pair(slot)[1]
+
+        slot = self._find(item, _VALUE_SIDE)
+
+        if slot >= 0:
+            return self._pair(slot)[0]
+
+        raise KeyError(item)
+
+    def __contains__(self, item):
+        return self._find(item, _KEY_SIDE) >= 0 or self._find(item, _VALUE_SIDE) >= 0
+
+    def __len__(self):
+        return self._count
+
+    def __iter__(self):
+        return (key for key, _ in self._iterate_items())
+
+    def __reversed__(self):
+        return (key for key, _ in self._iterate_items(reverse=True))
+
+    def __repr__(self):
+        return '%s(%r)' % (self.__class__.__name__, list(self.items()))
+
+    def __eq__(self, other):
+        if not isinstance(other, self.__class__):
+            return False
+
+        contains = other.items().__contains__
+        return len(self) == len(other) and all(contains(item) for item in self._iterate_items())
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __reduce__(self):
+        return self.__class__, (list(self._iterate_items()),)
+
+    def keys(self):
+        return PersistentKeysView(self)
+
+    def values(self):
+        return PersistentValuesView(self)
+
+    def items(self):
+        return PersistentItemsView(self)
+
+
+########## Asyncio facade ##########
+
+class _AsyncIterator(object):
+
+    """Async iterator that reads the source iterator in chunks.
+
+    The first chunk is read on the first __anext__(), every following chunk
+    is read on the next iteration of the event loop so other coroutines run
+    in between. The mapping must not change while it's iterated.
+
+    """
+
+    def __init__(self, adict, iterator):
+        self._adict = adict
+        self._iterator = iterator
+        self._version = adict._version
+        self._chunk = []
+        self._index = 0
+        self._started = False
+
+    def __aiter__(self):
+        return self
+
+    def _check_version(self):
+        if self._version != self._adict._version:
+            raise RuntimeError("AsyncTwoWayOrderedDict changed during iteration")
+
+    def _next_chunk(self):
+        self._check_version()
+        self._chunk = list(islice(self._iterator, self._adict.chunk_size))
+        self._index = 0
+
+    def _resume(self, future):
+        if future.cancelled():
+            return
+
+        try:
+            self._next_chunk()
+        except Exception as error:
+            future.set_exception(error)
+        else:
+            self._deliver(future)
+
+    def _deliver(self, future):
+        if self._index < len(self._chunk):
+            future.set_result(self._chunk[self._index])
+            self._index += 1
+        else:
+            future.set_exception(StopAsyncIteration())
+
+    def __anext__(self):
+        self._check_version()
+
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+
+        if self._index < len(self._chunk):
+            self._deliver(future)
+        elif not self._started:
+            self._started = True
+            self._next_chunk()
+            self._deliver(future)
+        elif len(self._chunk) < self._adict.chunk_size:
+            # The last chunk was not full, the iterator is exhausted
+            raise StopAsyncIteration
+        else:
+            loop.call_soon(self._resume, future)
+
+        return future
+
+
+class AsyncTwoWayOrderedDict(object):
+
+    """Asyncio facade over a TwoWayOrderedDict.
+
+    Single item operations are O(1) and run synchronously. The bulk
+    operations (aupdate, aclear, acopy, aiter_items) process chunk_size
+    items at a time and yield to the event loop between the chunks, so they
+    don't stall the other coroutines. aupdate, aclear and acopy hold the
+    lock while they run, acquire it with ``async with adict.lock`` to run
+    your own compound operations atomically (don't await any of them while
+    holding it, the lock is not reentrant).
+
+    The longest stalls left are full garbage collections and resizes of
+    the underlying dict, which can't be split in chunks.
+
+    Args:
+        data (mapping or iterable): Initial key:value pairs, added
+            synchronously.
+
+        chunk_size (int): Number of items processed between two yields
+            to the event loop.
+
+        cls (class or callable): Creates the underlying TwoWayOrderedDict
+            from data, acopy() calls it without arguments. Classes that
+            need more arguments can be passed as a callable, for example
+            functools.partial(BoundedTwoWayOrderedDict, 100).
+
+    Attributes:
+        lock (asyncio.Lock): Lock of the compound operations.
+
+        chunk_size (int): Number of items processed per chunk.
+
+    Examples:
+        Inside a coroutine::
+
+            >>> adict = AsyncTwoWayOrderedDict(chunk_size=500)
+            >>> await adict.aupdate(huge_list_of_pairs)
+            >>> async for key, value in adict.aiter_items():
+            ...     pass
+
+    Note:
+        The bulk operations are scheduled as soon as they are called, like
+        tasks, and return an asyncio.Future. They and the async iterators
+        must be used from a running event loop (RuntimeError otherwise).
+
+    """
+
+    def __init__(self, data=(), chunk_size=1000, cls=TwoWayOrderedDict):
+        if asyncio is None:
+            raise NotImplementedError("AsyncTwoWayOrderedDict requires asyncio")
+
+        if chunk_size < 1:
+            raise ValueError("chunk_size must be positive")
+
+        self.chunk_size = chunk_size
+        self.lock = asyncio.Lock()
+
+        self._factory = cls
+        self._tdict = cls(data)
+        # Changed by every write, checked between the chunks of an iteration
+        self._version = 0
+
+    def _schedule(self, job):
+        """Run the job generator one chunk per event loop iteration under the lock.
+
+        The last value that the job yields becomes the result of the
+        returned future.
+
+        """
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        state = [None]
+
+        def step(_=None):
+            if future.cancelled():
+                self.lock.release()
+                return
+
+            try:
+                state[0] = next(job)
+            except StopIteration:
+                self.lock.release()
+                future.set_result(state[0])
+            except Exception as error:
+                self.lock.release()
+                future.set_exception(error)
+            else:
+                loop.call_soon(step)
+
+        asyncio.ensure_future(self.lock.acquire()).add_done_callback(step)
+
+        return future
+
+    def __getitem__(self, key):
+        return self._tdict[key]
+
+    def __setitem__(self, key, value):
+        self._tdict[key] = value
+        self._version += 1
+
+    def __delitem__(self, key):
+        del self._tdict[key]
+        self._version += 1
+
+    def __contains__(self, item):
+        return item in self._tdict
+
+    def __len__(self):
+        return len(self._tdict)
+
+    def __repr__(self):
+        return "{0}({1} items)".format(self.__class__.__name__, len(self._tdict))
+
+    def get(self, key, default=None):
+        return self._tdict.get(key, default)
+
+    def pop(self, key, default=_DEFAULT_OBJECT):
+        self._version += 1
+
+        if default is _DEFAULT_OBJECT:
+            return self._tdict.pop(key)
+
+        return self._tdict.pop(key, default)
+
+    def popitem(self, last=True):
+        self._version += 1
+        return self._tdict.popitem(last)
+
+    def _update(self, data):
+        items = iter(data.items() if isinstance(data, Mapping) else data)
+
+        while True:
+            chunk = list(islice(items, self.chunk_size))
+
+            if not chunk:
+                break
+
+            self._tdict.update(chunk)
+            self._version += 1
+            yield
+
+    def _clear(self):
+        # The pairs are released from the end, popitem() is O(1) there
+        while self._tdict:
+            for _ in range(min(self.chunk_size, len(self._tdict))):
+                self._tdict.popitem()
+
+            self._version += 1
+            yield
+
+    def _copy(self):
+        version = self._version
+        items = self._tdict._iterate_items()
+        tdict = _new_empty(self._factory)
+
+        while True:
+            if self._version != version:
+                raise RuntimeError("AsyncTwoWayOrderedDict changed during copy")
+
+            chunk = list(islice(items, self.chunk_size))
+            tdict.update(chunk)
+            yield tdict
+
+            if len(chunk) < self.chunk_size:
+                break
+
+    def aupdate(self, data):
+        """Add the key:value pairs of data, chunk_size pairs at a time."""
+        return self._schedule(self._update(data))
+
+    def aclear(self):
+        """Remove all the pairs, chunk_size pairs at a time."""
+        return self._schedule(self._clear())
+
+    def acopy(self):
+        """Return a copy of the underlying mapping, built chunk_size pairs at a time."""
+        return self._schedule(self._copy())
+
+    def aiter_items(self, reverse=False):
+        """Async iterator over the (key, value) pairs."""
+        return _AsyncIterator(self, self._tdict._iterate_items(reverse))
+
+    def aiter_keys(self, reverse=False):
+        """Async iterator over the keys."""
+        return _AsyncIterator(self, self._tdict._iterate(reverse))
+
+    def __aiter__(self):
+        return self.aiter_keys()